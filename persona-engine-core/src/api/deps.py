@@ -0,0 +1,47 @@
+from typing import Optional
+from fastapi import Depends
+from starlette.requests import HTTPConnection
+
+from src.core.container import ServiceContainer
+from src.db.account_cache import AccountCache
+from src.memory.cache_manager import CacheManager
+from src.memory.rag_engine import RagEngine
+from src.memory.summarizer import ConversationSummarizer
+from src.middleware.rate_limit import RateLimiter
+from src.services.inference_client import InferenceClient
+from src.services.prompt_engine import PromptEngine
+from src.services.response_cache import ResponseCache
+
+# Works for both HTTP requests and WebSockets (HTTPConnection is their common base)
+def get_services(conn: HTTPConnection) -> ServiceContainer:
+    return conn.app.state.services
+
+def get_rag_engine(services: ServiceContainer = Depends(get_services)) -> RagEngine:
+    return services.rag
+
+def get_cache_manager(services: ServiceContainer = Depends(get_services)) -> CacheManager:
+    return services.cache
+
+def get_rate_limiter(services: ServiceContainer = Depends(get_services)) -> RateLimiter:
+    return services.limiter
+
+def get_prompt_engine(services: ServiceContainer = Depends(get_services)) -> PromptEngine:
+    return services.prompts
+
+def get_inference_client(services: ServiceContainer = Depends(get_services)) -> InferenceClient:
+    return services.inference
+
+def get_response_cache(services: ServiceContainer = Depends(get_services)) -> Optional[ResponseCache]:
+    return services.response_cache
+
+def get_summarizer(services: ServiceContainer = Depends(get_services)) -> Optional[ConversationSummarizer]:
+    return services.summarizer
+
+def get_accounts(services: ServiceContainer = Depends(get_services)) -> Optional[AccountCache]:
+    return services.accounts
+
+def get_safety_mesh(services: ServiceContainer = Depends(get_services)):
+    return services.safety_mesh
+
+def get_output_scanner(services: ServiceContainer = Depends(get_services)):
+    return services.output_scanner
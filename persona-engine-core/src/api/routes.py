@@ -4,20 +4,31 @@ import uuid
 import logging
 from typing import Optional
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, BackgroundTasks
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from starlette.websockets import WebSocketState
 
 # --- Internal Modules ---
 from src.core.config import settings
 from src.core.utils import fast_json_dumps
+from src.api.token_buffer import TokenBuffer
+from src.api.deps import (
+    get_rag_engine, get_cache_manager, get_rate_limiter, get_prompt_engine,
+    get_inference_client, get_safety_mesh, get_output_scanner, get_response_cache, get_summarizer,
+    get_accounts,
+)
 from src.services.prompt_engine import PromptEngine
-from src.services.inference_client import InferenceClient
+from src.services.inference_client import InferenceClient, ERROR_PREFIXES
+from src.services.response_cache import ResponseCache
+from src.services.turn_pipeline import TurnPipeline
 from src.memory.rag_engine import RagEngine
 from src.memory.cache_manager import CacheManager
+from src.memory.summarizer import ConversationSummarizer
+from src.db.account_cache import AccountCache
 # Phase 3 Safety Modules
 from src.manager import SafetyMesh  # The unified Safety Manager
 from src.guards.input_scanner import InputScanner # Needed for output streaming check
-from src.auth.deps import get_current_user
+from src.guards.output_monitor import OutputMonitor # Concurrent streaming output guard
+from src.auth.deps import get_current_user, oauth2_scheme
 from src.middleware.rate_limit import RateLimiter
 
 
@@ -27,36 +38,22 @@ logger = logging.getLogger("uvicorn")
 # Initialize Router
 router = APIRouter()
 
-# --- Optimization: Token Buffer ---
-class TokenBuffer:
-    """
-    Aggregates small tokens into chunks to reduce WebSocket frame overhead.
-    Nagle's algorithm adapted for LLM streaming.
-    """
-    def __init__(self, websocket: WebSocket, threshold: int = 20):
-        self.ws = websocket
-        self.buffer = []
-        self.threshold = threshold
-
-    async def push(self, token: str):
-        self.buffer.append(token)
-        current_text = "".join(self.buffer)
-        
-        # Flush if size limit reached or natural pause (punctuation/newline)
-        if len(current_text) >= self.threshold or token in [" ", "\n", ".", ",", "!", "?"]:
-            await self.flush()
-    
-    async def flush(self):
-        if self.buffer:
-            text = "".join(self.buffer)
-            # Check connection state before sending to avoid runtime errors
-            if self.ws.client_state == WebSocketState.CONNECTED:
-                await self.ws.send_text(text)
-            self.buffer = []
-
 # --- Main WebSocket Endpoint ---
 @router.websocket("/ws/chat")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_endpoint(
+    websocket: WebSocket,
+    # Process-wide services, built once per worker in the lifespan (src/main.py)
+    prompt_engine: PromptEngine = Depends(get_prompt_engine),
+    inference_client: InferenceClient = Depends(get_inference_client),
+    rag_engine: RagEngine = Depends(get_rag_engine),
+    cache_manager: CacheManager = Depends(get_cache_manager), # For saving assistant replies
+    limiter: RateLimiter = Depends(get_rate_limiter),
+    safety_mesh: SafetyMesh = Depends(get_safety_mesh), # Phase 3: Input/Policy Guard
+    output_scanner: InputScanner = Depends(get_output_scanner), # Phase 3: Fast Output Guard (ONNX)
+    response_cache: Optional[ResponseCache] = Depends(get_response_cache), # Optional opener cache
+    summarizer: Optional[ConversationSummarizer] = Depends(get_summarizer), # Rolling history compaction
+    accounts: Optional[AccountCache] = Depends(get_accounts), # Cached ban / plan tier lookups
+):
     # 1. Auth Handshake (Query Param or Header Protocol)
     # WebSockets don't allow headers easily in JS, so we use protocols or query params
     token = websocket.query_params.get("token")
@@ -66,26 +63,26 @@ async def websocket_endpoint(websocket: WebSocket):
     
     # Validate Token
     try:
-        user = oauth2_scheme.decode_token(token)
+        user = await oauth2_scheme.decode_token(token)
         if not user:
             raise Exception("Invalid Token")
     except:
         await websocket.close(code=1008)
         return
 
-    # 2. Rate Limit Check
-    limiter = RateLimiter(host="redis")
+    # Bans and plan changes take effect without waiting for the token to expire
+    account = await accounts.get(user["sub"]) if accounts is not None else None
+    if account is not None and not account.active:
+        await websocket.close(code=1008, reason="Account disabled")
+        return
+
+    # 2. Rate Limit Check (connects; messages are limited per turn below)
     try:
-        # Limit: 60 messages per minute per user
-        await limiter.check_limit(f"user:{user['sub']}", 60, 60)
+        await limiter.check_limit(f"connect:{user['sub']}", settings.RATE_LIMIT_CONNECTS_PER_MINUTE, 60)
     except HTTPException:
         await websocket.close(code=1008, reason="Rate Limit Exceeded")
         return
 
-    await websocket.accept()
-
-
-
     await websocket.accept()
     
     # 1. Session Initialization
@@ -96,13 +93,18 @@ async def websocket_endpoint(websocket: WebSocket):
     
     logger.info(f"🔌 WS Connected | ReqID: {request_id} | Session: {session_id}")
 
-    # 2. Instantiate Services (Scoped to Request or Singletons)
-    prompt_engine = PromptEngine()
-    inference_client = InferenceClient()
-    rag_engine = RagEngine()
-    cache_manager = CacheManager(host="redis") # For saving assistant replies
-    safety_mesh = SafetyMesh() # Phase 3: Input/Policy Guard
-    output_scanner = InputScanner() # Phase 3: Fast Output Guard (ONNX)
+    # 2. Per-connection frame coalescer: its deadline timer and adaptive threshold
+    # persist across turns
+    buffer = TokenBuffer(websocket)
+    # Per-connection history mirror: unchanged history is never re-decoded
+    session_history = cache_manager.session(session_id)
+    # Safety check overlapped with lore retrieval, per turn
+    pipeline = TurnPipeline(safety_mesh, rag_engine)
+
+    # The system block is static per character: count its tokens once
+    system_tokens = rag_engine.token_counter.count(
+        await prompt_engine.render_system("llama3_base.j2", character_name=char_id)
+    )
 
     # Metrics
     session_start = time.time()
@@ -118,36 +120,56 @@ async def websocket_endpoint(websocket: WebSocket):
             
             turns_count += 1
             turn_start = time.perf_counter()
+
+            # Re-checked every message: a fresh cache hit is a dict lookup
+            account = await accounts.get(user["sub"]) if accounts is not None else None
+            if account is not None and not account.active:
+                await websocket.send_text("[System]: Account disabled.")
+                await websocket.close(code=1008, reason="Account disabled")
+                break
+            tier = account.tier if account is not None else user.get("tier", "free")
+
+            # Per-message limit by plan tier: one Redis call, floods stopped in-process
+            retry_after = await limiter.check_tier(f"user:{user['sub']}", tier)
+            if retry_after:
+                await websocket.send_text(f"[System]: Rate limit exceeded. Retry in {retry_after:.1f}s.")
+                await websocket.send_text("<<END_OF_TURN>>")
+                continue
             
             # --- B. Phase 3: Safety Shield (Input) ---
-            # Create a localized BackgroundTasks container since WS doesn't inject it
-            bg_tasks = BackgroundTasks()
-            
             # Context for policy engine (e.g., user region from auth token)
             # In prod, extract this from websocket.scope or headers
-            safety_context = {"user_id": session_id, "region": "US", "tier": "free"}
+            tenant = account.tenant_id if account is not None else user.get("tenant_id", "default_tenant")
+            safety_context = {"user_id": session_id, "region": "US", "tier": tier, "tenant": tenant}
             
-            safety_result = await safety_mesh.check_input(raw_data, safety_context, bg_tasks)
-            
-            # Execute audit logs manually (WS workaround)
-            for task in bg_tasks.tasks:
-                await task()
+            # --- C. Phase 2: Memory & Context (RAG) ---
+            # Lore retrieval starts speculatively while the input is scanned
+            # (audit entries are queued; the mesh's background writer batches them).
+            # User Input is added to Redis only once the input is allowed.
+            turn = await pipeline.run(
+                raw_data, safety_context, session_id, char_id,
+                reserved_tokens=system_tokens, session=session_history,
+            )
+            stages = turn["timings"]
+            logger.info(
+                f"📊 [Metrics] ReqID={request_id} Safety={stages.get('safety_ms', 0):.1f}ms "
+                f"Lore={stages.get('lore_ms', 0):.1f}ms Overlap={stages['overlap_ms']:.1f}ms "
+                f"Context={stages.get('context_ms', 0):.1f}ms"
+            )
 
-            if not safety_result["allowed"]:
-                refusal_msg = f"[System]: Request refused. {safety_result['reason']}"
+            if not turn["allowed"]:
+                refusal_msg = f"[System]: Request refused. {turn['reason']}"
                 await websocket.send_text(refusal_msg)
                 await websocket.send_text("<<END_OF_TURN>>")
                 continue # Skip this turn
             
             # Use the SANITIZED text (PII scrubbed) for all downstream logic
-            user_input = safety_result["text"]
-
-            # --- C. Phase 2: Memory & Context (RAG) ---
-            # Fetches Redis history and Qdrant lore, and adds User Input to Redis
-            context_data = await rag_engine.prepare_context(session_id, char_id, user_input)
+            user_input = turn["text"]
+            context_data = turn["context"]
             
             # --- D. Phase 1: Prompt Construction ---
-            # We pass the RAG data into the Jinja2 template
+            # Static persona first, then history turns, then this turn's lore and
+            # input, so consecutive prompts share a prefix for vLLM's prefix cache
             full_prompt = await prompt_engine.build_prompt(
                 template_name="llama3_base.j2", # Or dynamic based on char_id
                 character_name=char_id, # Should fetch real name from DB
@@ -156,57 +178,68 @@ async def websocket_endpoint(websocket: WebSocket):
             )
 
             # --- E. Phase 1: Inference & Streaming ---
-            buffer = TokenBuffer(websocket)
+            # Openers ("hi", "who are you?") may be served from the response cache;
+            # hits are replayed through the same monitor/buffer path as vLLM output
+            cacheable = response_cache is not None and response_cache.eligible(context_data["history"], user_input)
+            if cacheable:
+                # Replies that depend on earlier turns are keyed by this conversation only
+                cache_scope = response_cache.scope(context_data["history"], user_input, context_data.get("summary"))
+            cached_reply = await response_cache.lookup(char_id, user_input, cache_scope) if cacheable else None
+            if cached_reply is not None:
+                token_stream = response_cache.replay(cached_reply)
+            else:
+                token_stream = inference_client.stream_chat(full_prompt, request_id, session_id=session_id)
+
+            # Phase 3: Output Safety (Streaming Scan)
+            # Windows are scored in the background; only a small hold-back tail
+            # waits on the classifier, and a violation cancels the vLLM stream.
+            output_monitor = OutputMonitor(output_scanner)
             
             # Variables for streaming metrics & safety
             first_token_received = False
-            token_count = 0
             full_response_text = ""
-            output_safety_buffer = ""
-            output_violation = False
             
-            # Start Streaming from vLLM
-            async for token in inference_client.stream_chat(full_prompt, request_id):
+            # Start Streaming from vLLM (or the cache replay)
+            async for chunk in output_monitor.stream(token_stream):
                 
-                # 1. Metric: TTFT
+                # 1. Metric: TTFT (as perceived by the client, after hold-back)
                 if not first_token_received:
                     ttft = (time.perf_counter() - turn_start) * 1000
                     logger.info(f"📊 [Metrics] ReqID={request_id} TTFT={ttft:.2f}ms")
                     first_token_received = True
 
-                # 2. Phase 3: Output Safety (Streaming Scan)
-                # Accumulate a small window to check for generated toxicity
-                output_safety_buffer += token
-                if len(output_safety_buffer) > 100: # Check every ~25 tokens
-                    # Fast check (fire and forget await)
-                    scores = await output_scanner.scan(output_safety_buffer)
-                    if scores.get("toxicity", 0) > 0.95:
-                        logger.warning(f"🛡️ [Safety] Output Redacted | ReqID={request_id}")
-                        await websocket.send_text(" ... [Content Filtered by Safety Policy]")
-                        output_violation = True
-                        break # Stop generation loop
-                    
-                    # Keep a rolling window to catch toxicity spanning chunks
-                    output_safety_buffer = output_safety_buffer[-20:]
-
-                # 3. Buffer & Send
-                await buffer.push(token)
-                full_response_text += token
-                token_count += 1
+                # 2. Buffer & Send
+                await buffer.push(chunk)
+                full_response_text += chunk
             
-            # Flush remaining tokens
-            if not output_violation:
-                await buffer.flush()
+            token_count = output_monitor.tokens_in
+            output_violation = output_monitor.violation is not None
+            # Flush remaining (already screened) text before any system message
+            await buffer.flush()
+            if output_violation:
+                logger.warning(f"🛡️ [Safety] Output Redacted | ReqID={request_id}")
+                await websocket.send_text(" ... [Content Filtered by Safety Policy]")
 
             # --- F. Phase 2: Update Memory (Assistant) ---
             # Save the AI's response to Redis history so it remembers next turn
             if full_response_text and not output_violation:
-                await cache_manager.add_message(session_id, "assistant", full_response_text)
+                history, _ = await session_history.add("assistant", full_response_text)
+                if cacheable and cached_reply is None and not full_response_text.startswith(ERROR_PREFIXES):
+                    await response_cache.store(char_id, user_input, full_response_text, cache_scope)
+                # Off the turn's path: folds old turns into the summary if history grew too long
+                # (checked against the mirror's decoded history: no Redis call below the trigger)
+                if summarizer is not None:
+                    summarizer.schedule(session_id, history)
 
             # --- G. Metrics & Finalize ---
             total_time = time.perf_counter() - turn_start
             tps = token_count / total_time if total_time > 0 else 0
             logger.info(f"📊 [Metrics] ReqID={request_id} TPS={tps:.2f} Len={token_count}")
+            frames = buffer.stats()
+            logger.info(
+                f"📊 [Metrics] ReqID={request_id} Frames/s={frames['frames_per_sec']:.1f} "
+                f"Bytes/Frame={frames['bytes_per_frame']:.1f} Threshold={frames['threshold']}"
+            )
             
             await websocket.send_text("<<END_OF_TURN>>")
 
@@ -217,4 +250,6 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"❌ WS Error: {str(e)}", exc_info=True)
         if websocket.client_state == WebSocketState.CONNECTED:
-            await websocket.close(code=1011)
\ No newline at end of file
+            await websocket.close(code=1011)
+    finally:
+        await buffer.close()
\ No newline at end of file
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional, Set
+
+from fastapi import WebSocket
+from starlette.websockets import WebSocketState
+
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+
+class TokenBuffer:
+    """
+    Coalesces small tokens into WebSocket frames (Nagle's algorithm adapted for
+    LLM streaming). One instance per connection.
+
+    A frame is sent when the buffered text reaches `threshold` characters or
+    `max_latency_ms` after the first unsent token, whichever comes first.
+    The threshold adapts to send backpressure: slow sends grow it (fewer,
+    larger frames), fast sends let it decay back towards `min_threshold`.
+    """
+    def __init__(
+        self,
+        websocket: WebSocket,
+        min_threshold: int = settings.STREAM_FLUSH_MIN_CHARS,
+        max_threshold: int = settings.STREAM_FLUSH_MAX_CHARS,
+        max_latency_ms: float = settings.STREAM_FLUSH_MAX_LATENCY_MS,
+        slow_send_ms: float = settings.STREAM_SLOW_SEND_MS,
+    ):
+        self.ws = websocket
+        self.min_threshold = min_threshold
+        self.max_threshold = max(min_threshold, max_threshold)
+        self.threshold = min_threshold
+        self.max_latency = max_latency_ms / 1000
+        self.slow_send = slow_send_ms / 1000
+
+        # OPTIMIZATION: Parts list + running length, joined once per frame
+        self._parts: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Referenced until done: the loop only keeps weak references to tasks
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._send_lock = asyncio.Lock()
+
+        # Metrics
+        self._frames = 0
+        self._bytes = 0
+        self._send_seconds = 0.0
+        self._first_frame_at: Optional[float] = None
+        self._last_frame_at: Optional[float] = None
+
+    async def push(self, token: str):
+        self._parts.append(token)
+        self._size += len(token)
+
+        if self._size >= self.threshold:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_latency, self._on_deadline)
+
+    def _on_deadline(self):
+        self._timer = None
+        if self._parts:
+            task = asyncio.get_running_loop().create_task(self._deadline_flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def _deadline_flush(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"Deadline flush failed: {e}")
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._parts:
+            return
+
+        # Take the text before awaiting: the lock is FIFO, so frames keep token order
+        text = "".join(self._parts)
+        self._parts.clear()
+        self._size = 0
+
+        async with self._send_lock:
+            # Check connection state before sending to avoid runtime errors
+            if self.ws.client_state != WebSocketState.CONNECTED:
+                return
+            start = time.perf_counter()
+            await self.ws.send_text(text)
+            elapsed = time.perf_counter() - start
+
+        self._record(len(text.encode("utf-8")), elapsed)
+        self._adapt(elapsed)
+
+    def _adapt(self, send_seconds: float):
+        if send_seconds > self.slow_send:
+            # Socket is pushing back: coalesce harder
+            self.threshold = min(self.max_threshold, self.threshold * 2)
+        elif self.threshold > self.min_threshold:
+            self.threshold = max(self.min_threshold, int(self.threshold * 0.9))
+
+    def _record(self, nbytes: int, send_seconds: float):
+        now = time.perf_counter()
+        if self._first_frame_at is None:
+            self._first_frame_at = now
+        self._last_frame_at = now
+        self._frames += 1
+        self._bytes += nbytes
+        self._send_seconds += send_seconds
+
+    def stats(self) -> dict:
+        span = (self._last_frame_at - self._first_frame_at) if self._frames > 1 else 0.0
+        return {
+            "frames": self._frames,
+            "bytes": self._bytes,
+            "frames_per_sec": (self._frames - 1) / span if span > 0 else 0.0,
+            "bytes_per_frame": self._bytes / self._frames if self._frames else 0.0,
+            "avg_send_ms": self._send_seconds / self._frames * 1000 if self._frames else 0.0,
+            "threshold": self.threshold,
+        }
+
+    async def close(self):
+        """Cancels the pending deadline and any deadline flush in flight; call when the connection ends."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._parts.clear()
+        self._size = 0
+        tasks = list(self._flush_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,9 +1,10 @@
 from fastapi import Depends, HTTPException, status, Header
+from starlette.requests import HTTPConnection
 from src.auth.jwt_validator import KeycloakValidator
 
 oauth2_scheme = KeycloakValidator()
 
-async def get_current_user(authorization: str = Header(...)):
+async def get_current_user(conn: HTTPConnection, authorization: str = Header(...)):
     """
     Extracts Bearer token, validates it, and returns User context.
     """
@@ -11,16 +12,22 @@ async def get_current_user(authorization: str = Header(...)):
         raise HTTPException(status_code=401, detail="Invalid auth header")
     
     token = authorization.split(" ")[1]
-    payload = oauth2_scheme.decode_token(token)
+    payload = await oauth2_scheme.decode_token(token)
     
     if not payload:
         raise HTTPException(status_code=401, detail="Invalid token")
 
+    # Bans and plan tier come from the DB (read-through cache) when enabled
+    services = getattr(conn.app.state, "services", None)
+    accounts = services.accounts if services is not None else None
+    account = await accounts.get(payload.get("sub")) if accounts is not None else None
+    if account is not None and not account.active:
+        raise HTTPException(status_code=403, detail="Account disabled")
+
     # Construct user context object
-    # In real world, we might query DB here to ensure user wasn't banned recently
     return {
         "user_id": payload.get("sub"),
-        "tenant_id": payload.get("tenant_id", "default_tenant"), # Custom claim mapped in Keycloak
+        "tenant_id": account.tenant_id if account else payload.get("tenant_id", "default_tenant"), # Custom claim mapped in Keycloak
         "roles": payload.get("realm_access", {}).get("roles", []),
-        "tier": payload.get("tier", "free")
+        "tier": account.tier if account else payload.get("tier", "free")
     }
\ No newline at end of file
@@ -1,30 +1,165 @@
-from jose import jwt, JWTError
-from src.core.config import settings
+import asyncio
+import hashlib
 import logging
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+import httpx
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
+from src.core.config import settings
 
 logger = logging.getLogger("auth")
 
 class KeycloakValidator:
-    def __init__(self):
-        # Env vars: KEYCLOAK_URL, REALM_NAME
-        self.jwks_url = f"{settings.KEYCLOAK_URL}/realms/{settings.REALM_NAME}/protocol/openid-connect/certs"
-        self.audience = "persona-api"
-        # In prod, fetch and cache JWKS keys dynamically
-        # For simplicity here, we assume public key or disable sig check for dev flow if needed
-        # self.jwks = requests.get(self.jwks_url).json()
-
-    def decode_token(self, token: str) -> dict:
+    """
+    RS256 validation against the realm's JWKS.
+
+    Signing keys are parsed once and cached by `kid`; a background task
+    refreshes them, and a token with an unknown `kid` (key rotation) triggers
+    one throttled refetch shared by all waiting connects.
+    Verified tokens are remembered (by SHA-256 of the token) until their `exp`,
+    so a reconnect with the same token is a dict lookup instead of an RSA verify.
+    """
+    def __init__(
+        self,
+        jwks_url: Optional[str] = None,
+        audience: str = settings.AUTH_AUDIENCE,
+        verify_signature: bool = settings.AUTH_VERIFY_SIGNATURE,
+        refresh_seconds: float = settings.AUTH_JWKS_REFRESH_SECONDS,
+        min_refetch_seconds: float = settings.AUTH_JWKS_MIN_REFETCH_SECONDS,
+        max_cached_tokens: int = settings.AUTH_TOKEN_CACHE_SIZE,
+    ):
+        self.jwks_url = jwks_url or f"{settings.KEYCLOAK_URL}/realms/{settings.REALM_NAME}/protocol/openid-connect/certs"
+        self.audience = audience
+        # options={"verify_signature": False} is ONLY for internal dev when Keycloak is not reachable
+        self.verify_signature = verify_signature
+        self.refresh_seconds = refresh_seconds
+        self.min_refetch_seconds = min_refetch_seconds
+        self.max_cached_tokens = max_cached_tokens
+
+        self._keys: Dict[str, Key] = {}
+        self._fetched_at = float("-inf")
+        self._fetch_lock = asyncio.Lock()
+        self._verified: "OrderedDict[bytes, Tuple[dict, float]]" = OrderedDict() # digest -> (claims, expires at)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.cache_hits = 0
+        self.verifications = 0
+        self.jwks_fetches = 0
+        self.failures = 0
+
+    @asynccontextmanager
+    async def lifespan(self):
+        """Keeps the JWKS warm: initial fetch plus periodic refresh."""
+        if not self.verify_signature:
+            yield self
+            return
+        self._client = httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0))
+        await self._refresh()
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
         try:
-            # Full validation requires fetching JWKS keys. 
-            # options={"verify_signature": False} used ONLY for internal dev if Keycloak not reachable
-            payload = jwt.decode(
-                token, 
-                "secret-key-if-HS256-or-public-key-if-RS256", 
-                algorithms=["RS256"],
-                audience=self.audience,
-                options={"verify_signature": False} # ⚠️ TODO: Implement JWKS caching for Prod
-            )
-            return payload
-        except JWTError as e:
+            yield self
+        finally:
+            self._refresh_task.cancel()
+            await self._client.aclose()
+            self._client = None
+
+    async def _refresh(self):
+        try:
+            await self._fetch_jwks()
+        except (httpx.HTTPError, ValueError) as e:
+            # Keep the previous keys; the next unknown kid retries sooner
+            logger.warning(f"JWKS refresh failed: {e}")
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            await self._refresh()
+
+    async def _fetch_jwks(self):
+        self.jwks_fetches += 1
+        self._fetched_at = time.monotonic()
+        if self._client is not None:
+            response = await self._client.get(self.jwks_url)
+        else:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(5.0, connect=2.0)) as client:
+                response = await client.get(self.jwks_url)
+        response.raise_for_status()
+
+        keys = {}
+        for data in response.json().get("keys", []):
+            if data.get("use", "sig") != "sig" or data.get("kty") != "RSA" or "kid" not in data:
+                continue
+            keys[data["kid"]] = jwk.construct(data, data.get("alg", "RS256"))
+        self._keys = keys # Swapped whole: readers never see a partial set
+
+    async def _get_key(self, kid: str) -> Optional[Key]:
+        key = self._keys.get(kid)
+        if key is not None:
+            return key
+        # Unknown kid: the realm may have rotated keys. Concurrent connects share one fetch.
+        async with self._fetch_lock:
+            if kid not in self._keys and time.monotonic() - self._fetched_at >= self.min_refetch_seconds:
+                await self._fetch_jwks()
+        return self._keys.get(kid)
+
+    def _remember(self, digest: bytes, claims: dict):
+        now = time.time()
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)) or expires_at <= now:
+            return
+        self._verified[digest] = (claims, expires_at)
+        if len(self._verified) > self.max_cached_tokens:
+            self._verified.popitem(last=False)
+
+    async def decode_token(self, token: str) -> Optional[dict]:
+        """Returns the token's claims, or None if it is invalid or expired."""
+        digest = hashlib.sha256(token.encode("utf-8")).digest()
+        # OPTIMIZATION: Reconnects with an already verified token skip the RSA verify
+        cached = self._verified.get(digest)
+        if cached is not None:
+            claims, expires_at = cached
+            if expires_at > time.time():
+                self._verified.move_to_end(digest)
+                self.cache_hits += 1
+                return claims
+            del self._verified[digest]
+
+        try:
+            if self.verify_signature:
+                kid = jwt.get_unverified_header(token).get("kid")
+                key = await self._get_key(kid) if kid else None
+                if key is None:
+                    raise JWTError(f"Unknown signing key {kid!r}")
+                claims = jwt.decode(token, key, algorithms=["RS256"], audience=self.audience)
+            else:
+                claims = jwt.decode(
+                    token,
+                    "",
+                    algorithms=["RS256"],
+                    audience=self.audience,
+                    options={"verify_signature": False},
+                )
+        except (JWTError, httpx.HTTPError, ValueError) as e:
+            self.failures += 1
             logger.error(f"Token validation failed: {e}")
-            return None
\ No newline at end of file
+            return None
+
+        self.verifications += 1
+        self._remember(digest, claims)
+        return claims
+
+    def stats(self) -> dict:
+        return {
+            "cache_hits": self.cache_hits,
+            "verifications": self.verifications,
+            "jwks_fetches": self.jwks_fetches,
+            "failures": self.failures,
+            "cached_tokens": len(self._verified),
+            "keys": len(self._keys),
+        }
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger("uvicorn")
+
+
+class MicroBatcher:
+    """
+    Dynamic micro-batching scheduler.
+    Coalesces concurrent single-item `submit()` calls from any coroutine (and any
+    event loop) into one `batch_fn(items)` call executed on a dedicated worker thread,
+    so CPU-bound model inference never blocks the event loop.
+
+    A batch is dispatched as soon as `max_batch_size` items are waiting, or
+    `max_wait_ms` after the first item of the batch arrived, whichever comes first.
+    """
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], List[Any]],
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher",
+    ):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.name = name
+
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes: Counter = Counter()
+        self._busy_seconds = 0.0
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    async def submit(self, item: Any) -> Any:
+        """Queues a single item and waits for its slot of the batched result."""
+        if self._closed:
+            raise RuntimeError(f"{self.name} is closed")
+        self._ensure_worker()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.put((item, future, loop))
+        return await future
+
+    def _collect(self) -> list:
+        """Blocks for the first item, then gathers more until size or deadline."""
+        first = self._queue.get()
+        if first is None:
+            return []
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is None:
+                # Shutdown sentinel: finish this batch, then stop on the next loop
+                self._queue.put(None)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if not batch:
+                return
+
+            # Skip requests whose callers already gave up (e.g. websocket closed)
+            batch = [entry for entry in batch if not entry[1].cancelled()]
+            if not batch:
+                continue
+
+            items = [entry[0] for entry in batch]
+            start = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: batch_fn returned {len(results)} results for {len(items)} items")
+                error = None
+            except Exception as e:
+                logger.error(f"{self.name} batch failed: {e}")
+                results, error = [None] * len(items), e
+
+            # Metrics first: a caller that reads stats() right after its result sees this batch
+            self._busy_seconds += time.perf_counter() - start
+            self._batches += 1
+            self._items += len(items)
+            self._batch_sizes[len(items)] += 1
+
+            for (_, future, loop), result in zip(batch, results):
+                try:
+                    if error is not None:
+                        loop.call_soon_threadsafe(_set_exception, future, error)
+                    else:
+                        loop.call_soon_threadsafe(_set_result, future, result)
+                except RuntimeError:
+                    # The caller's loop is closed: nobody is waiting, keep serving the others
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "batches": self._batches,
+            "items": self._items,
+            "avg_batch_size": self._items / self._batches if self._batches else 0.0,
+            "batch_size_histogram": dict(sorted(self._batch_sizes.items())),
+            "busy_seconds": self._busy_seconds,
+        }
+
+    def close(self):
+        """Stops the worker after it drains already-queued items."""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+
+def _set_result(future: asyncio.Future, result: Any):
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, exc: BaseException):
+    if not future.done():
+        future.set_exception(exc)
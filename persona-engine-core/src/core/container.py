@@ -0,0 +1,102 @@
+import logging
+from typing import Any, Optional
+
+import redis.asyncio as redis
+
+from src.core.config import settings
+from src.core.redis_pool import get_redis, close_redis_pools
+from src.core.tokenizer import TokenCounter
+from src.db.account_cache import AccountCache
+from src.memory.cache_manager import CacheManager
+from src.memory.embedding_cache import EmbeddingCache
+from src.memory.rag_engine import RagEngine
+from src.memory.summarizer import ConversationSummarizer
+from src.memory.vector_store import LoreStore
+from src.middleware.rate_limit import RateLimiter
+from src.services.inference_client import InferenceClient
+from src.services.prompt_engine import PromptEngine
+from src.services.response_cache import ResponseCache
+
+logger = logging.getLogger("uvicorn")
+
+
+class ServiceContainer:
+    """
+    Process-wide services, built once per worker by the app lifespan (src/main.py)
+    and handed to handlers through FastAPI dependencies (src/api/deps.py).
+    Heavy models (embedders, reranker) and Redis/Qdrant clients live here
+    instead of being constructed per connection.
+    """
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        cache: CacheManager,
+        limiter: RateLimiter,
+        lore: LoreStore,
+        rag: RagEngine,
+        prompts: PromptEngine,
+        inference: InferenceClient,
+        response_cache: Optional[ResponseCache] = None,
+        summarizer: Optional[ConversationSummarizer] = None,
+        accounts: Optional[AccountCache] = None,
+    ):
+        self.redis = redis_client
+        self.cache = cache
+        self.limiter = limiter
+        self.lore = lore
+        self.rag = rag
+        self.prompts = prompts
+        self.inference = inference
+        self.response_cache = response_cache
+        self.summarizer = summarizer
+        self.accounts = accounts
+        # Phase 3 guards (persona-safety-mesh), attached by the lifespan
+        self.safety_mesh: Optional[Any] = None
+        self.output_scanner: Optional[Any] = None
+
+    @classmethod
+    def create(cls) -> "ServiceContainer":
+        redis_client = get_redis(settings.REDIS_HOST, settings.REDIS_PORT)
+        cache = CacheManager(client=redis_client, token_counter=TokenCounter())
+        lore = LoreStore(
+            host=settings.QDRANT_HOST,
+            port=settings.QDRANT_PORT,
+            embedding_cache=EmbeddingCache(redis_client),
+        )
+        response_cache = None
+        if settings.RESPONSE_CACHE_ENABLED:
+            response_cache = ResponseCache(
+                redis_client,
+                embedder=lore.embed_dense if settings.RESPONSE_CACHE_SEMANTIC else None,
+            )
+        accounts = None
+        if settings.ACCOUNT_LOOKUP_ENABLED:
+            from src.db.session import AsyncSessionLocal # Imports the Postgres driver
+            accounts = AccountCache(AsyncSessionLocal, redis_client)
+        prompts = PromptEngine()
+        inference = InferenceClient()
+        return cls(
+            redis_client=redis_client,
+            cache=cache,
+            limiter=RateLimiter(client=redis_client),
+            lore=lore,
+            rag=RagEngine(cache=cache, lore=lore),
+            prompts=prompts,
+            inference=inference,
+            response_cache=response_cache,
+            summarizer=ConversationSummarizer(cache, inference, prompts) if settings.SUMMARY_ENABLED else None,
+            accounts=accounts,
+        )
+
+    async def aclose(self):
+        if self.safety_mesh is not None:
+            await self.safety_mesh.aclose() # Drains the audit queue
+        if self.accounts is not None:
+            await self.accounts.aclose()
+        if self.summarizer is not None:
+            await self.summarizer.aclose()
+        self.lore.close()
+        await self.lore.client.close()
+        await self.redis.aclose()
+        await close_redis_pools()
+        logger.info("Service container closed.")
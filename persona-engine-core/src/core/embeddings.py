@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Sequence, Tuple
+
+from fastembed import TextEmbedding, SparseTextEmbedding  # OPTIMIZATION: Rust-based embeddings
+from src.core.batching import MicroBatcher
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+MODEL_KINDS = ("dense", "sparse")
+
+# Shared by LoreStore and the safety mesh's jailbreak scanner
+DENSE_MODEL = "intfloat/multilingual-e5-large"
+SPARSE_MODEL = "prithivida/splade-pp-e5-large"
+
+
+class EmbeddingService:
+    """
+    One loaded embedding model per (kind, model name) per process.
+
+    Every subsystem that embeds text (LoreStore, the semantic response cache,
+    the jailbreak scanner) acquires the service instead of loading its own
+    copy; the model is freed when the last holder releases it.
+    Concurrent `embed()` calls from any of them are coalesced by a MicroBatcher
+    into one ONNX call on the service's worker thread, which uses
+    `EMBED_THREADS` intra-op threads.
+    """
+    _registry: Dict[Tuple[str, str], "EmbeddingService"] = {}
+    _registry_lock = threading.Lock()
+
+    def __init__(
+        self,
+        model_name: str,
+        kind: str = "dense",
+        threads: int = settings.EMBED_THREADS,
+        max_batch_size: int = settings.EMBED_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.EMBED_MAX_WAIT_MS,
+    ):
+        if kind not in MODEL_KINDS:
+            raise ValueError(f"Unknown embedding kind '{kind}', expected one of {MODEL_KINDS}")
+        self.model_name = model_name
+        self.kind = kind
+        model_cls = TextEmbedding if kind == "dense" else SparseTextEmbedding
+        # fastembed downloads quantized ONNX models automatically
+        self.model = model_cls(model_name=model_name, threads=threads or None)
+        self.batcher = MicroBatcher(
+            self._embed_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name=f"embed-{kind}",
+        )
+        self.refs = 0
+
+    @classmethod
+    def acquire(cls, model_name: str, kind: str = "dense") -> "EmbeddingService":
+        """Returns the shared service for this model, loading it on first use."""
+        with cls._registry_lock:
+            service = cls._registry.get((kind, model_name))
+            if service is None:
+                logger.info(f"Loading {kind} embedding model: {model_name}")
+                service = cls(model_name, kind)
+                cls._registry[(kind, model_name)] = service
+            service.refs += 1
+            return service
+
+    def release(self):
+        """Drops one reference; the last one unloads the model."""
+        with self._registry_lock:
+            self.refs -= 1
+            if self.refs > 0:
+                return
+            if self._registry.get((self.kind, self.model_name)) is self:
+                del self._registry[(self.kind, self.model_name)]
+        self.batcher.close()
+        self.model = None
+
+    @classmethod
+    def loaded(cls) -> List[str]:
+        with cls._registry_lock:
+            return [f"{kind}:{name}" for kind, name in cls._registry]
+
+    def _embed_batch(self, texts: List[str]) -> list:
+        return list(self.model.embed(texts, batch_size=len(texts)))
+
+    async def embed(self, texts: Sequence[str]) -> list:
+        """One vector per text; batched with concurrent callers from any subsystem."""
+        return list(await asyncio.gather(*(self.batcher.submit(text) for text in texts)))
+
+    def embed_sync(self, texts: Sequence[str]) -> list:
+        """For synchronous callers (startup seeding); runs on the calling thread."""
+        return self._embed_batch(list(texts))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "kind": self.kind, "refs": self.refs, **self.batcher.stats()}
@@ -0,0 +1,29 @@
+import redis.asyncio as redis
+from typing import Dict, Tuple
+from src.core.config import settings
+
+# One connection pool per (host, port) for the whole worker process.
+# Every Redis user (history, rate limits, safety cache) borrows from it.
+_pools: Dict[Tuple[str, int], redis.ConnectionPool] = {}
+
+def get_redis(host: str = None, port: int = None) -> redis.Redis:
+    """
+    Returns a client bound to the shared pool.
+    Responses stay as bytes (decode_responses=False) for orjson.
+    """
+    key = (host or settings.REDIS_HOST, port or settings.REDIS_PORT)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = redis.ConnectionPool(
+            host=key[0],
+            port=key[1],
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            decode_responses=False,
+        )
+        _pools[key] = pool
+    return redis.Redis(connection_pool=pool)
+
+async def close_redis_pools():
+    for pool in _pools.values():
+        await pool.disconnect()
+    _pools.clear()
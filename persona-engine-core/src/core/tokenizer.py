@@ -0,0 +1,60 @@
+import logging
+import os
+from typing import List, Optional, Sequence
+
+from tokenizers import Tokenizer  # OPTIMIZATION: Rust fast tokenizer (ships with fastembed)
+
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+# <|start_header_id|> role <|end_header_id|> "\n\n" ... <|eot_id|> (llama3_turn.j2)
+MESSAGE_OVERHEAD_TOKENS = 5
+
+
+class TokenCounter:
+    """
+    Counts tokens with the served model's tokenizer, so prompt budgets hold for
+    any script (Cyrillic text is ~2-3x more tokens per character than English).
+
+    `source` is a tokenizer.json path or a Hugging Face model id. If it is None
+    or cannot be loaded, counts fall back to a conservative UTF-8 byte estimate.
+    """
+    def __init__(self, source: Optional[str] = settings.TOKENIZER_PATH or settings.MODEL_NAME):
+        self.tokenizer = self._load(source) if source else None
+
+    @staticmethod
+    def _load(source: str) -> Optional[Tokenizer]:
+        try:
+            if os.path.isfile(source):
+                return Tokenizer.from_file(source)
+            return Tokenizer.from_pretrained(source)
+        except Exception as e:
+            logger.warning(f"Tokenizer '{source}' unavailable ({e}); using byte-based token estimates.")
+            return None
+
+    @property
+    def exact(self) -> bool:
+        return self.tokenizer is not None
+
+    @staticmethod
+    def _estimate(text: str) -> int:
+        # ~3 UTF-8 bytes per token over-counts English slightly and stays safe elsewhere
+        return -(-len(text.encode("utf-8")) // 3)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return self._estimate(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count_batch(self, texts: Sequence[str]) -> List[int]:
+        if self.tokenizer is None:
+            return [self._estimate(t) for t in texts]
+        # OPTIMIZATION: encode_batch tokenizes in parallel outside the GIL
+        return [len(e.ids) for e in self.tokenizer.encode_batch(list(texts), add_special_tokens=False)]
+
+    def count_message(self, content: str) -> int:
+        """Tokens one rendered chat message occupies in the prompt."""
+        return self.count(content) + MESSAGE_OVERHEAD_TOKENS
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from sqlalchemy import select
+
+from src.core.config import settings
+from src.db.models import Tenant, User
+
+logger = logging.getLogger("uvicorn")
+
+INVALIDATION_CHANNEL = "accounts:invalidate"
+
+
+class Account:
+    """What the request path needs from the User and Tenant rows."""
+    __slots__ = ("user_id", "tenant_id", "tier", "active")
+
+    def __init__(self, user_id: str, tenant_id: str, tier: str, active: bool):
+        self.user_id = user_id
+        self.tenant_id = tenant_id
+        self.tier = tier
+        self.active = active
+
+
+class AccountCache:
+    """
+    Read-through cache of User/Tenant rows in front of the async SQLAlchemy session.
+
+    Entries live for `ttl_seconds`; unknown users are cached as misses for
+    `negative_ttl_seconds` so tokens for unprovisioned users can't hammer
+    Postgres. Users and tenants are cached separately ("user:{id}",
+    "tenant:{id}"), so a plan change invalidates one tenant entry, not every
+    user of the tenant.
+
+    Writers call invalidate_user / invalidate_tenant after committing; the key
+    is published on INVALIDATION_CHANNEL and every worker drops its copy.
+    A fresh hit is a dict lookup, cheap enough to run on every message.
+
+    Lookups are bounded by `lookup_timeout_seconds`. After a failure or timeout,
+    misses skip the database for `failure_backoff_seconds` and return None
+    (callers fall back to the token claims), so an outage costs one timeout
+    per worker, not one per message.
+    """
+    def __init__(
+        self,
+        session_factory: Callable,
+        redis_client: redis.Redis,
+        ttl_seconds: float = settings.ACCOUNT_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = settings.ACCOUNT_CACHE_NEGATIVE_TTL_SECONDS,
+        max_entries: int = settings.ACCOUNT_CACHE_MAX_ENTRIES,
+        channel: str = INVALIDATION_CHANNEL,
+        lookup_timeout_seconds: float = settings.ACCOUNT_LOOKUP_TIMEOUT_SECONDS,
+        failure_backoff_seconds: float = settings.ACCOUNT_LOOKUP_BACKOFF_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.redis = redis_client
+        self.ttl = ttl_seconds
+        self.negative_ttl = negative_ttl_seconds
+        self.max_entries = max_entries
+        self.channel = channel
+        self.lookup_timeout = lookup_timeout_seconds
+        self.failure_backoff = failure_backoff_seconds
+
+        self._entries: "OrderedDict[str, Tuple[object, float]]" = OrderedDict() # key -> (row values or None, expires at)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._epoch = 0 # Bumped by every invalidation; loads that straddle one are not stored
+        self._listener: Optional[asyncio.Task] = None
+        self._backoff_until = 0.0 # Misses skip the database until then (last lookup failed)
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.queries = 0
+        self.invalidations = 0
+        self.failures = 0
+        self.backoff_skips = 0
+
+    # --- Local entries ---
+    def _get(self, key: str):
+        """Returns (found, value)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def _put(self, key: str, value, epoch: int):
+        if epoch != self._epoch:
+            return
+        ttl = self.ttl if value is not None else self.negative_ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _drop(self, key: str):
+        self._epoch += 1
+        if self._entries.pop(key, None) is not None:
+            self.invalidations += 1
+
+    async def _single_flight(self, key: str, load: Callable[[], Awaitable]):
+        """Concurrent misses for one key share a single query."""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(load())
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # The timeout only stops this caller waiting; the shared query keeps running
+        return await asyncio.wait_for(asyncio.shield(future), self.lookup_timeout)
+
+    # --- Queries ---
+    async def _load_user(self, user_id: str):
+        epoch = self._epoch
+        self.queries += 1
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(User.tenant_id, User.is_active, Tenant.plan_tier)
+                .join(Tenant, Tenant.id == User.tenant_id)
+                .where(User.id == user_id)
+            )
+            row = result.first()
+        if row is None:
+            self._put(f"user:{user_id}", None, epoch)
+            return None
+        tenant_id, is_active, tier = row
+        # The join also warms the tenant entry
+        self._put(f"tenant:{tenant_id}", tier or "free", epoch)
+        self._put(f"user:{user_id}", (tenant_id, bool(is_active)), epoch)
+        return tenant_id, bool(is_active)
+
+    async def _load_tenant(self, tenant_id: str):
+        epoch = self._epoch
+        self.queries += 1
+        async with self.session_factory() as session:
+            tier = await session.scalar(select(Tenant.plan_tier).where(Tenant.id == tenant_id))
+        self._put(f"tenant:{tenant_id}", tier or "free", epoch)
+        return tier or "free"
+
+    async def get(self, user_id: str) -> Optional[Account]:
+        """
+        The user's tenant, plan tier and ban state. None if the user has no row
+        or the database is unreachable (callers fall back to the token claims).
+        """
+        try:
+            found, user = self._get(f"user:{user_id}")
+            if not found:
+                if self._backing_off():
+                    return None
+                user = await self._single_flight(f"user:{user_id}", lambda: self._load_user(user_id))
+            if user is None:
+                return None
+            tenant_id, active = user
+
+            tenant_found, tier = self._get(f"tenant:{tenant_id}")
+            if not tenant_found:
+                if self._backing_off():
+                    return None
+                tier = await self._single_flight(f"tenant:{tenant_id}", lambda: self._load_tenant(tenant_id))
+        except Exception as e:
+            self.failures += 1
+            self._backoff_until = time.monotonic() + self.failure_backoff
+            logger.warning(f"Account lookup failed for {user_id} ({type(e).__name__}: {e}), "
+                           f"skipping the database for {self.failure_backoff}s")
+            return None
+
+        if found and tenant_found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return Account(user_id, tenant_id, tier, active)
+
+    def _backing_off(self) -> bool:
+        if time.monotonic() < self._backoff_until:
+            self.backoff_skips += 1
+            return True
+        return False
+
+    # --- Invalidation ---
+    async def invalidate_user(self, user_id: str):
+        await self._publish(f"user:{user_id}")
+
+    async def invalidate_tenant(self, tenant_id: str):
+        await self._publish(f"tenant:{tenant_id}")
+
+    async def _publish(self, key: str):
+        self._drop(key) # Read-your-writes in this worker, even before the message arrives
+        await self.redis.publish(self.channel, key)
+
+    def start(self):
+        """Starts the pub/sub listener (needs a running loop)."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # Invalidations published while we were not subscribed are lost
+                self.clear()
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._drop(message["data"].decode("utf-8"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Account invalidation listener failed, resubscribing: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.aclose()
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "queries": self.queries,
+            "invalidations": self.invalidations,
+            "failures": self.failures,
+            "backoff_skips": self.backoff_skips,
+        }
+
+    async def aclose(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
@@ -1,24 +1,33 @@
+import logging
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
 from src.api.routes import router
 from src.core.config import settings
-from src.services.inference_client import InferenceClient
-from src.memory.cache_manager import CacheManager
-from src.memory.vector_store import LoreStore
+from src.auth.deps import oauth2_scheme
+from src.core.container import ServiceContainer
+from src.manager import SafetyMesh
+from src.guards.input_scanner import InputScanner
+
+logger = logging.getLogger("uvicorn")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    inference = InferenceClient() # Initialize
-    # Warm up vector store (load models into RAM)
+    # Startup: build every heavy service ONCE per worker (load models into RAM)
     logger.info("Warming up AI models...")
-    _ = LoreStore() 
-    
-    yield
+    services = ServiceContainer.create()
+    services.safety_mesh = SafetyMesh() # Phase 3: Input/Policy Guard
+    services.output_scanner = InputScanner() # Phase 3: Fast Output Guard (ONNX, singleton)
+    app.state.services = services
+    services.safety_mesh.start() # Policy hot reload, off the request path
+    if services.accounts is not None:
+        services.accounts.start() # Pub/sub invalidation of cached users/tenants
+
+    # OPTIMIZATION: Connection pooling and keep-alive for vLLM; JWKS kept warm
+    async with services.inference.lifespan(), oauth2_scheme.lifespan():
+        yield
     
     # Shutdown
-    await inference._client.aclose()
-    # Close Redis/Qdrant if explicit close methods exist (mostly handled by client destuctors)
+    await services.aclose()
     logger.info("System Shutdown complete.")
 
 app = FastAPI(title=settings.PROJECT_NAME, lifespan=lifespan)
@@ -28,4 +37,4 @@ app.include_router(router)
 if __name__ == "__main__":
     import uvicorn
     # OPTIMIZATION: Use 'uvloop' for faster async handling if on Linux/Mac
-    uvicorn.run("src.main:app", host=settings.API_HOST, port=settings.API_PORT, reload=True)
\ No newline at end of file
+    uvicorn.run("src.main:app", host=settings.API_HOST, port=settings.API_PORT, reload=True)
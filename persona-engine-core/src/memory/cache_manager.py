@@ -1,26 +1,213 @@
+import asyncio
 import redis.asyncio as redis
 import orjson # OPTIMIZATION: Faster than json
 from src.core.config import settings
-from typing import List, Dict
+from src.core.redis_pool import get_redis
+from src.core.tokenizer import TokenCounter
+from typing import Any, List, Dict, Optional, Sequence, Tuple
+
+# Bumps the session version (KEYS[3]). A missing key (new session, or expired
+# after idling) is seeded from the server clock in microseconds instead of
+# restarting at 1, so a version number is never reused for different contents
+# and a stale connection mirror can't mistake new history for its own (ABA).
+BUMP_VERSION = """
+local function bump_version(key)
+    if redis.call('EXISTS', key) == 1 then return redis.call('INCR', key) end
+    local now = redis.call('TIME')
+    local seeded = now[1] .. string.format('%06d', tonumber(now[2]))
+    redis.call('SET', key, seeded)
+    return tonumber(seeded)
+end
+"""
+
+# Appends a message, trims, refreshes TTLs and bumps the session version in one
+# round trip. Returns {version} when the caller's mirror was at version - 1
+# (nothing else changed), otherwise {version, history, summary fields}.
+# KEYS: list, summary, session version | ARGV: message, max messages, ttl, known version ("" = no reply)
+APPEND_SCRIPT = BUMP_VERSION + """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('LTRIM', KEYS[1], -tonumber(ARGV[2]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+local version = bump_version(KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[3])
+local known = tonumber(ARGV[4])
+if known == nil or version == known + 1 then return {version} end
+return {version, redis.call('LRANGE', KEYS[1], 0, -1), redis.call('HGETALL', KEYS[2])}
+"""
+
+# Folds the oldest messages into the rolling summary, only if nothing changed
+# since the compactor read them (same list head, same summary version).
+# KEYS: list, summary, session version | ARGV: summary, tokens, expected version, ttl, head...
+FOLD_SCRIPT = BUMP_VERSION + """
+local version = tonumber(redis.call('HGET', KEYS[2], 'version') or '0')
+if version ~= tonumber(ARGV[3]) then return 0 end
+local n = #ARGV - 4
+local head = redis.call('LRANGE', KEYS[1], 0, n - 1)
+if #head ~= n then return 0 end
+for i = 1, n do
+    if head[i] ~= ARGV[i + 4] then return 0 end
+end
+redis.call('LTRIM', KEYS[1], n, -1)
+redis.call('HSET', KEYS[2], 'content', ARGV[1], 'tokens', ARGV[2], 'version', version + 1)
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+bump_version(KEYS[3])
+redis.call('EXPIRE', KEYS[3], ARGV[4])
+return 1
+"""
 
 class CacheManager:
-    def __init__(self, host: str = "localhost", port: int = 6379):
-        self.redis = redis.Redis(host=host, port=port, decode_responses=False) # Keep as bytes for orjson
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        client: Optional[redis.Redis] = None,
+        token_counter: Optional[TokenCounter] = None,
+    ):
+        # OPTIMIZATION: Borrow from the process-wide pool instead of opening a new one
+        self.redis = client or get_redis(host, port) # Keeps bytes for orjson
         self.ttl = 3600 * 24
+        # Messages are stored with their token count, computed once at write time
+        self.token_counter = token_counter or TokenCounter(source=None)
+        self.max_messages = settings.HISTORY_MAX_MESSAGES
+        self._fold = self.redis.register_script(FOLD_SCRIPT)
+        self._append_script = self.redis.register_script(APPEND_SCRIPT)
 
-    async def add_message(self, session_id: str, role: str, content: str):
+    def encode_message(self, role: str, content: str) -> Dict[str, Any]:
+        return {"role": role, "content": content, "tokens": self.token_counter.count_message(content)}
+
+    async def add_message(self, session_id: str, role: str, content: str) -> int:
+        """Appends a message; returns the session's new version."""
+        version, *_ = await self._append(session_id, self.encode_message(role, content))
+        return version
+
+    async def _append(self, session_id: str, message: Dict[str, Any], known_version: Optional[int] = None) -> list:
+        """
+        OPTIMIZATION: One atomic script call (RTT) for append + trim + TTL + version.
+        Also returns [raw history, summary fields] unless known_version is None or
+        the caller's copy is current (known_version == new version - 1).
+        """
         key = f"session:{session_id}"
-        # OPTIMIZATION: Store as bytes immediately
-        msg = orjson.dumps({"role": role, "content": content})
-        
-        async with self.redis.pipeline() as pipe:
-            await pipe.rpush(key, msg)
-            await pipe.ltrim(key, -20, -1) 
-            await pipe.expire(key, self.ttl)
-            await pipe.execute()
-
-    async def get_history(self, session_id: str) -> List[Dict[str, str]]:
+        # Every change bumps the version, so connection mirrors know when to reload.
+        # The summary lives as long as its list.
+        return await self._append_script(
+            keys=[key, f"{key}:summary", f"{key}:ver"],
+            args=[orjson.dumps(message), self.max_messages, self.ttl, "" if known_version is None else known_version],
+        )
+
+    def session(self, session_id: str) -> "SessionHistory":
+        """Per-connection mirror of one session (see SessionHistory)."""
+        return SessionHistory(self, session_id)
+
+    async def get_history(self, session_id: str) -> List[Dict[str, Any]]:
         key = f"session:{session_id}"
         messages = await self.redis.lrange(key, 0, -1)
         # OPTIMIZATION: Bulk decode
-        return [orjson.loads(m) for m in messages]
\ No newline at end of file
+        return [orjson.loads(m) for m in messages]
+
+    async def get_raw_history(self, session_id: str) -> List[bytes]:
+        """Encoded messages, as stored (compaction compares them byte for byte)."""
+        return await self.redis.lrange(f"session:{session_id}", 0, -1)
+
+    async def get_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Rolling summary of folded turns: content, tokens and version."""
+        return self._parse_summary(await self.redis.hgetall(f"session:{session_id}:summary"))
+
+    @staticmethod
+    def _parse_summary(data: Dict[bytes, bytes]) -> Optional[Dict[str, Any]]:
+        if not data:
+            return None
+        return {
+            "content": data[b"content"].decode("utf-8"),
+            "tokens": int(data[b"tokens"]),
+            "version": int(data[b"version"]),
+        }
+
+    async def fold_history(
+        self, session_id: str, folded: Sequence[bytes], summary: str, tokens: int, version: int
+    ) -> bool:
+        """
+        Atomically replaces the oldest `folded` messages with `summary`.
+        Returns False (and changes nothing) if another writer got there first.
+        """
+        key = f"session:{session_id}"
+        result = await self._fold(
+            keys=[key, f"{key}:summary", f"{key}:ver"],
+            args=[summary.encode("utf-8"), tokens, version, self.ttl, *folded],
+        )
+        return bool(result)
+
+
+class SessionHistory:
+    """
+    Write-through mirror of one session's history, owned by a connection.
+
+    Writes (`add`) are one atomic script call that also returns the history;
+    the decoded messages are reused when the version advanced by exactly one
+    (nobody else wrote), otherwise the script sends the fresh list back in the
+    same round trip. Read-only `load()` costs one GET of the session version.
+    Anything else - a second tab, a compaction, TTL expiry - changes the
+    version and triggers one full reload.
+    """
+    def __init__(self, cache: CacheManager, session_id: str):
+        self.cache = cache
+        self.session_id = session_id
+        self._key = f"session:{session_id}"
+        self._messages: List[Dict[str, Any]] = []
+        self._summary: Optional[Dict[str, Any]] = None
+        self._version: Optional[int] = None  # None = never loaded / known stale
+        self._lock = asyncio.Lock()  # Keeps this connection's reads and writes ordered
+
+        # Metrics
+        self.hits = 0
+        self.reloads = 0
+
+    async def _reload(self):
+        # MULTI/EXEC: list, summary and version are read as one snapshot
+        async with self.cache.redis.pipeline(transaction=True) as pipe:
+            pipe.lrange(self._key, 0, -1)
+            pipe.hgetall(f"{self._key}:summary")
+            pipe.get(f"{self._key}:ver")
+            raw, summary, version = await pipe.execute()
+        self._messages = [orjson.loads(m) for m in raw]
+        self._summary = self.cache._parse_summary(summary)
+        self._version = int(version or 0)
+        self.reloads += 1
+
+    async def load(self) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Returns (history, summary); decodes only if another writer changed the session."""
+        async with self._lock:
+            version = await self.cache.redis.get(f"{self._key}:ver")
+            if self._version is not None and int(version or 0) == self._version:
+                self.hits += 1
+            else:
+                await self._reload()
+            return list(self._messages), self._summary
+
+    async def get(self) -> List[Dict[str, Any]]:
+        history, _ = await self.load()
+        return history
+
+    async def add(self, role: str, content: str) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """
+        Appends a message and returns (history, summary) including it, in one
+        round trip; the history is only sent back if this mirror was stale.
+        """
+        message = self.cache.encode_message(role, content)
+        async with self._lock:
+            known = self._version if self._version is not None else -1
+            version, *fresh = await self.cache._append(self.session_id, message, known_version=known)
+            if fresh:
+                raw, summary = fresh
+                self._messages = [orjson.loads(m) for m in raw]
+                self._summary = self.cache._parse_summary(dict(zip(summary[::2], summary[1::2])))
+                self.reloads += 1
+            else:
+                self._messages.append(message)
+                del self._messages[:-self.cache.max_messages]
+                self.hits += 1
+            self._version = version
+            return list(self._messages), self._summary
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "reloads": self.reloads, "messages": len(self._messages)}
@@ -0,0 +1,189 @@
+import asyncio
+import hashlib
+import logging
+import struct
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import redis.asyncio as redis
+
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+# Compact encodings (first byte = format tag)
+DENSE_F16 = b"h"  # float16 values
+DENSE_I8 = b"b"   # float32 scale + int8 values (symmetric quantization)
+SPARSE = b"s"     # uint32 count + uint32 indices + float16 values
+
+SparsePair = Tuple[np.ndarray, np.ndarray]  # (indices, values)
+
+
+def pack_dense(vector: np.ndarray, dtype: str = "float16") -> bytes:
+    vector = np.asarray(vector, dtype=np.float32)
+    if dtype == "int8":
+        scale = float(np.abs(vector).max()) / 127 or 1.0
+        quantized = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        return DENSE_I8 + struct.pack("<f", scale) + quantized.tobytes()
+    return DENSE_F16 + vector.astype(np.float16).tobytes()
+
+
+def unpack_dense(blob: bytes) -> np.ndarray:
+    tag, body = blob[:1], blob[1:]
+    if tag == DENSE_I8:
+        (scale,) = struct.unpack("<f", body[:4])
+        return np.frombuffer(body[4:], dtype=np.int8).astype(np.float32) * scale
+    return np.frombuffer(body, dtype=np.float16).astype(np.float32)
+
+
+def pack_sparse(indices: np.ndarray, values: np.ndarray) -> bytes:
+    indices = np.asarray(indices, dtype=np.uint32)
+    return SPARSE + struct.pack("<I", len(indices)) + indices.tobytes() + np.asarray(values, dtype=np.float16).tobytes()
+
+
+def unpack_sparse(blob: bytes) -> SparsePair:
+    (count,) = struct.unpack("<I", blob[1:5])
+    split = 5 + 4 * count
+    indices = np.frombuffer(blob[5:split], dtype=np.uint32).astype(np.int64)
+    values = np.frombuffer(blob[split:], dtype=np.float16).astype(np.float32)
+    return indices, values
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: in-process LRU (bounded by bytes) in front of a
+    shared Redis tier. Keys combine the model id and a hash of the text, so
+    repeated queries, greetings and re-ingested chunks are never re-embedded.
+    Values are stored compactly (see pack_dense / pack_sparse) in both tiers.
+    Redis is optional at runtime: if it is unreachable, lookups fall back to
+    the local tier plus compute.
+    """
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        max_bytes: int = settings.EMBED_CACHE_MAX_BYTES,
+        ttl_seconds: int = settings.EMBED_CACHE_TTL_SECONDS,
+        dense_dtype: str = settings.EMBED_CACHE_DENSE_DTYPE,
+    ):
+        self.redis = redis_client
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds
+        self.dense_dtype = dense_dtype
+
+        self._local: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+
+        # Metrics
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def key(model_id: str, text: str) -> str:
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        return f"emb:{model_id}:{digest}"
+
+    def _local_put(self, key: str, blob: bytes):
+        old = self._local.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old)
+        self._local[key] = blob
+        self._bytes += len(blob)
+        while self._bytes > self.max_bytes and self._local:
+            _, evicted = self._local.popitem(last=False)
+            self._bytes -= len(evicted)
+            self.evictions += 1
+
+    async def _lookup(self, keys: List[str]) -> Dict[str, bytes]:
+        found: Dict[str, bytes] = {}
+        remote: List[str] = []
+        for key in keys:
+            blob = self._local.get(key)
+            if blob is not None:
+                self._local.move_to_end(key)
+                found[key] = blob
+                self.local_hits += 1
+            else:
+                remote.append(key)
+
+        if remote and self.redis is not None:
+            # OPTIMIZATION: One MGET round trip for the whole batch
+            try:
+                blobs = await self.redis.mget(remote)
+            except redis.RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Embedding cache: Redis lookup failed, computing locally: {e}")
+                return found
+            for key, blob in zip(remote, blobs):
+                if blob is not None:
+                    found[key] = blob
+                    self._local_put(key, blob)
+                    self.redis_hits += 1
+        return found
+
+    async def _store(self, entries: Dict[str, bytes]):
+        for key, blob in entries.items():
+            self._local_put(key, blob)
+        if entries and self.redis is not None:
+            try:
+                async with self.redis.pipeline(transaction=False) as pipe:
+                    for key, blob in entries.items():
+                        pipe.set(key, blob, ex=self.ttl)
+                    await pipe.execute()
+            except redis.RedisError as e:
+                self.redis_errors += 1
+                logger.warning(f"Embedding cache: Redis store failed, kept locally only: {e}")
+
+    async def _get_or_compute(
+        self,
+        model_id: str,
+        texts: Sequence[str],
+        compute: Callable[[List[str]], list],
+        pack: Callable,
+        unpack: Callable,
+    ) -> list:
+        keys = [self.key(model_id, t) for t in texts]
+        found = await self._lookup(list(dict.fromkeys(keys)))
+
+        # Compute each distinct missing text once, off the event loop
+        missing = {k: t for k, t in zip(keys, texts) if k not in found}
+        if missing:
+            self.misses += len(missing)
+            if asyncio.iscoroutinefunction(compute):
+                computed = await compute(list(missing.values())) # e.g. EmbeddingService.embed
+            else:
+                loop = asyncio.get_running_loop()
+                computed = await loop.run_in_executor(None, compute, list(missing.values()))
+            fresh = {k: pack(v) for k, v in zip(missing.keys(), computed)}
+            await self._store(fresh)
+            found.update(fresh)
+
+        return [unpack(found[k]) for k in keys]
+
+    async def get_dense(self, model_id: str, texts: Sequence[str], compute: Callable[[List[str]], list]) -> List[np.ndarray]:
+        """compute(texts) -> list of dense vectors, called only for cache misses."""
+        return await self._get_or_compute(
+            model_id, texts, compute, lambda v: pack_dense(v, self.dense_dtype), unpack_dense
+        )
+
+    async def get_sparse(self, model_id: str, texts: Sequence[str], compute: Callable[[List[str]], list]) -> List[SparsePair]:
+        """compute(texts) -> list of objects with .indices/.values, called only for cache misses."""
+        return await self._get_or_compute(
+            model_id, texts, compute, lambda v: pack_sparse(v.indices, v.values), unpack_sparse
+        )
+
+    def stats(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "hit_rate": (self.local_hits + self.redis_hits) / lookups if lookups else 0.0,
+            "local_bytes": self._bytes,
+            "local_entries": len(self._local),
+            "evictions": self.evictions,
+            "redis_errors": self.redis_errors,
+        }
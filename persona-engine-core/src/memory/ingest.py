@@ -0,0 +1,307 @@
+"""
+Bulk lore ingestion: character bibles (JSONL / markdown) -> Qdrant.
+
+    python -m src.memory.ingest data/elara_bible.md --char-id elara
+    python -m src.memory.ingest data/lore.jsonl --char-id elara --concurrency 8
+
+JSONL lines look like {"text": "...", "char_id": "elara"} (char_id optional).
+Chunks are embedded in batches and upserted by parallel workers through a
+bounded queue. Point IDs are content hashes and progress is checkpointed,
+so an interrupted import can simply be re-run.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import orjson
+
+logger = logging.getLogger("uvicorn")
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+_HEADING = re.compile(r"#{1,6}\s")
+
+
+def chunk_text(text: str, chunk_chars: int = 800, overlap_chars: int = 100) -> List[str]:
+    """
+    Packs sentences into chunks of at most `chunk_chars`; each chunk starts with
+    the trailing sentences (up to `overlap_chars`) of the previous one.
+    """
+    sentences = []
+    for sentence in _SENTENCE_SPLIT.split(text):
+        sentence = sentence.strip()
+        # Hard-split sentences that alone exceed the chunk size
+        while len(sentence) > chunk_chars:
+            sentences.append(sentence[:chunk_chars])
+            sentence = sentence[chunk_chars - overlap_chars:] if overlap_chars < chunk_chars else sentence[chunk_chars:]
+        if sentence:
+            sentences.append(sentence)
+
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for sentence in sentences:
+        if current and size + len(sentence) + 1 > chunk_chars:
+            chunks.append(" ".join(current))
+            # Carry trailing sentences over as overlap
+            carry: List[str] = []
+            carry_size = 0
+            for prev in reversed(current):
+                if carry_size + len(prev) + 1 > overlap_chars:
+                    break
+                carry.insert(0, prev)
+                carry_size += len(prev) + 1
+            # Overlap never pushes a chunk past chunk_chars (e.g. before a hard-split piece)
+            while carry and carry_size + len(sentence) + 1 > chunk_chars:
+                carry_size -= len(carry.pop(0)) + 1
+            current, size = carry, carry_size
+        current.append(sentence)
+        size += len(sentence) + 1
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def iter_blocks(lines: Iterable[str], block_chars: int = 64 * 1024) -> Iterator[str]:
+    """
+    Groups markdown/text lines into blocks for `chunk_text`: every heading
+    starts a new block and whole paragraphs are packed up to `block_chars`, so
+    only about one block is held in memory. A single paragraph longer than
+    that is cut at a line boundary.
+    """
+    block: List[str] = []  # Finished paragraphs
+    block_size = 0
+    paragraph: List[str] = []
+    paragraph_size = 0
+    for line in lines:
+        heading = _HEADING.match(line)
+        if heading or not line.strip():
+            block += paragraph
+            block_size += paragraph_size
+            paragraph, paragraph_size = [], 0
+            if block_size and (heading or block_size >= block_chars):
+                yield "".join(block)
+                block, block_size = [], 0
+            if not heading:
+                if block:
+                    block.append(line)  # Keeps paragraphs apart for the sentence splitter
+                    block_size += len(line)
+                continue
+        elif block_size + paragraph_size + len(line) > block_chars:
+            if block_size:
+                yield "".join(block)  # The current paragraph moves on to the next block
+                block, block_size = [], 0
+            if paragraph_size and paragraph_size + len(line) > block_chars:
+                yield "".join(paragraph)  # One oversized paragraph
+                paragraph, paragraph_size = [], 0
+        paragraph.append(line)
+        paragraph_size += len(line)
+    block += paragraph
+    if "".join(block).strip():
+        yield "".join(block)
+
+
+def iter_documents(path: Path, char_id: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (char_id, text) per JSONL record, or per heading/paragraph block of a
+    markdown/text file (see `iter_blocks`); neither is read into memory whole.
+    """
+    if path.suffix == ".jsonl":
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    record = orjson.loads(line)
+                    yield record.get("char_id", char_id), record["text"]
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for block in iter_blocks(f):
+                yield char_id, block
+
+
+class LoreIngestor:
+    """
+    Streams chunks into `store.add_lore_batch` with `concurrency` parallel
+    workers. At most `2 * concurrency` batches are in memory at once.
+    """
+    def __init__(
+        self,
+        store,
+        batch_size: int = 64,
+        concurrency: int = 4,
+        chunk_chars: int = 800,
+        overlap_chars: int = 100,
+        checkpoint_path: Optional[str] = None,
+    ):
+        self.store = store
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.chunk_chars = chunk_chars
+        self.overlap_chars = overlap_chars
+        self.checkpoint_path = checkpoint_path
+
+        # Progress (batch numbers are assigned in source order)
+        self._done_batches: set = set()
+        self._watermark = 0  # All batches below this number are committed
+        self.chunks_written = 0
+        self.chunks_skipped = 0
+        self.bytes_written = 0
+        self.started_at = 0.0
+        self._error: Optional[BaseException] = None
+
+    # --- Checkpoints ---
+    def _checkpoint_key(self, source: Path) -> dict:
+        return {
+            "source": str(source.resolve()),
+            "batch_size": self.batch_size,
+            "chunk_chars": self.chunk_chars,
+            "overlap_chars": self.overlap_chars,
+        }
+
+    def _load_checkpoint(self, source: Path) -> int:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return 0
+        with open(self.checkpoint_path, "rb") as f:
+            state = orjson.loads(f.read())
+        if state.get("key") != self._checkpoint_key(source):
+            logger.warning("Checkpoint belongs to a different source or chunking; starting over.")
+            return 0
+        return state["batches_done"]
+
+    def _save_checkpoint(self, source: Path):
+        if not self.checkpoint_path:
+            return
+        tmp = f"{self.checkpoint_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(orjson.dumps({"key": self._checkpoint_key(source), "batches_done": self._watermark}))
+        os.replace(tmp, self.checkpoint_path)  # Atomic: never a half-written checkpoint
+
+    def _mark_done(self, batch_no: int, source: Path):
+        self._done_batches.add(batch_no)
+        advanced = False
+        while self._watermark in self._done_batches:
+            self._done_batches.remove(self._watermark)
+            self._watermark += 1
+            advanced = True
+        if advanced:
+            self._save_checkpoint(source)
+
+    # --- Pipeline ---
+    def _iter_batches(self, source: Path, char_id: str) -> Iterator[List[Tuple[str, str]]]:
+        batch: List[Tuple[str, str]] = []
+        for doc_char_id, text in iter_documents(source, char_id):
+            for chunk in chunk_text(text, self.chunk_chars, self.overlap_chars):
+                batch.append((doc_char_id, chunk))
+                if len(batch) == self.batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    async def _worker(self, queue: asyncio.Queue, source: Path):
+        while True:
+            item = await queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is not None:
+                    continue  # Keep draining so the producer never blocks
+                batch_no, batch = item
+                await self.store.add_lore_batch(batch)
+                self.chunks_written += len(batch)
+                self.bytes_written += sum(len(text.encode("utf-8")) for _, text in batch)
+                self._mark_done(batch_no, source)
+            except Exception as e:
+                self._error = e
+            finally:
+                queue.task_done()
+
+    async def ingest(self, source: str, char_id: str) -> dict:
+        source = Path(source)
+        self.started_at = time.perf_counter()
+        resume_from = self._load_checkpoint(source)
+        self._watermark = resume_from
+        self._done_batches.clear()
+        self._error = None
+
+        # OPTIMIZATION: Bounded queue keeps memory flat regardless of source size
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        workers = [asyncio.create_task(self._worker(queue, source)) for _ in range(self.concurrency)]
+        try:
+            for batch_no, batch in enumerate(self._iter_batches(source, char_id)):
+                if batch_no < resume_from:
+                    self.chunks_skipped += len(batch)
+                    continue
+                await queue.put((batch_no, batch))
+                if self._error is not None:
+                    break
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            if self._error is not None:
+                # Committed batches are checkpointed; re-running resumes after them
+                raise self._error
+        finally:
+            for worker in workers:
+                worker.cancel()
+        return self.stats()
+
+    def stats(self) -> dict:
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            "chunks_written": self.chunks_written,
+            "chunks_skipped": self.chunks_skipped,
+            "batches_committed": self._watermark,
+            "elapsed_s": elapsed,
+            "chunks_per_s": self.chunks_written / elapsed if elapsed else 0.0,
+            "mb_per_s": self.bytes_written / 1e6 / elapsed if elapsed else 0.0,
+        }
+
+
+async def _main(args):
+    from src.core.config import settings
+    from src.memory.vector_store import LoreStore
+
+    store = LoreStore(host=args.host or settings.QDRANT_HOST, port=args.port or settings.QDRANT_PORT)
+    ingestor = LoreIngestor(
+        store,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+        chunk_chars=args.chunk_chars,
+        overlap_chars=args.overlap,
+        checkpoint_path=args.checkpoint or f"{args.source}.ingest-checkpoint",
+    )
+
+    async def report():
+        while True:
+            await asyncio.sleep(5)
+            s = ingestor.stats()
+            print(f"   -> {s['chunks_written']} chunks | {s['chunks_per_s']:.1f} chunks/s")
+
+    print(f"📚 Ingesting {args.source} for '{args.char_id}'...")
+    reporter = asyncio.create_task(report())
+    try:
+        stats = await ingestor.ingest(args.source, args.char_id)
+    finally:
+        reporter.cancel()
+    print(
+        f"✅ Done: {stats['chunks_written']} chunks written, {stats['chunks_skipped']} skipped (checkpoint) "
+        f"in {stats['elapsed_s']:.1f}s | {stats['chunks_per_s']:.1f} chunks/s | {stats['mb_per_s']:.2f} MB/s"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk-ingest character lore into Qdrant.")
+    parser.add_argument("source", help="JSONL ({'text', 'char_id'?} per line) or markdown/text file")
+    parser.add_argument("--char-id", required=True, help="Default char_id for records without one")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    parser.add_argument("--overlap", type=int, default=100)
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <source>.ingest-checkpoint)")
+    parser.add_argument("--host")
+    parser.add_argument("--port", type=int)
+    asyncio.run(_main(parser.parse_args()))
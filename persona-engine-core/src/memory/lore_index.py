@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from qdrant_client import models
+
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+# Above this many rows the scan runs in the executor (NumPy releases the GIL)
+_INLINE_ROWS = 1024
+# Rows upcast to float32 per matmul block (NumPy has no fast float16 GEMV)
+_BLOCK_ROWS = 512
+
+# loader(char_id, max_points) -> points with vectors, or None if the character is larger
+Loader = Callable[[str, int], Awaitable[Optional[List[models.Record]]]]
+
+
+def _rrf(rankings: Sequence[np.ndarray]) -> Dict[int, float]:
+    """Reciprocal Rank Fusion, scored like Qdrant's FusionQuery(RRF)."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking):
+            fused[int(row)] = fused.get(int(row), 0.0) + 1.0 / (rank + 2)
+    return fused
+
+
+class CharacterIndex:
+    """
+    One character's lore in contiguous arrays: a dense matrix (float16, or int8
+    with per-row scales) and a sparse inverted index (token -> rows, weights).
+    """
+    def __init__(self, points: Sequence[models.Record], dtype: str = "float16"):
+        self.loaded_at = time.monotonic()
+        self.ids = [point.id for point in points]
+        self.payloads = [point.payload for point in points]
+
+        dense = np.asarray([point.vector["dense"] for point in points], dtype=np.float32).reshape(len(points), -1)
+        dense /= np.maximum(np.linalg.norm(dense, axis=1, keepdims=True), 1e-12)  # Cosine, like the collection
+        self.scales = None
+        if dtype == "int8":
+            self.scales = np.maximum(np.abs(dense).max(axis=1), 1e-12) / 127
+            self.matrix = np.rint(dense / self.scales[:, None]).astype(np.int8)
+        else:
+            self.matrix = np.ascontiguousarray(dense.astype(dtype))
+
+        # Inverted index: postings for token tokens[i] are rows/weights[starts[i]:starts[i + 1]]
+        rows, tokens, weights = [], [], []
+        for row, point in enumerate(points):
+            sparse = point.vector.get("sparse")
+            if sparse is not None and sparse.indices:
+                rows.append(np.full(len(sparse.indices), row, dtype=np.int32))
+                tokens.append(np.asarray(sparse.indices, dtype=np.int64))
+                weights.append(np.asarray(sparse.values, dtype=np.float32))
+        if tokens:
+            all_tokens = np.concatenate(tokens)
+            order = np.argsort(all_tokens, kind="stable")
+            all_tokens = all_tokens[order]
+            self.post_rows = np.concatenate(rows)[order]
+            self.post_weights = np.concatenate(weights)[order]
+            self.tokens, starts = np.unique(all_tokens, return_index=True)
+            self.starts = np.append(starts, len(all_tokens))
+        else:
+            self.tokens = np.empty(0, dtype=np.int64)
+            self.starts = np.zeros(1, dtype=np.int64)
+            self.post_rows = np.empty(0, dtype=np.int32)
+            self.post_weights = np.empty(0, dtype=np.float32)
+
+        self.nbytes = (
+            self.matrix.nbytes
+            + (self.scales.nbytes if self.scales is not None else 0)
+            + self.tokens.nbytes + self.starts.nbytes + self.post_rows.nbytes + self.post_weights.nbytes
+            + sum(len(p.get("text", "")) for p in self.payloads)
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def dense_scores(self, query: Sequence[float]) -> np.ndarray:
+        q = np.asarray(query, dtype=np.float32)
+        q /= np.linalg.norm(q) or 1.0
+        scores = np.concatenate([
+            self.matrix[i:i + _BLOCK_ROWS].astype(np.float32) @ q
+            for i in range(0, len(self), _BLOCK_ROWS)
+        ]) if len(self) else np.empty(0, dtype=np.float32)
+        if self.scales is not None:
+            scores *= self.scales
+        return scores
+
+    def sparse_scores(self, query: models.SparseVector) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        q_tokens = np.asarray(query.indices, dtype=np.int64)
+        q_values = np.asarray(query.values, dtype=np.float32)
+        pos = np.searchsorted(self.tokens, q_tokens)
+        found = pos < len(self.tokens)
+        found[found] = self.tokens[pos[found]] == q_tokens[found]
+        for p, value in zip(pos[found], q_values[found]):
+            start, end = self.starts[p], self.starts[p + 1]
+            # Rows are unique within one posting list, so fancy += is exact
+            scores[self.post_rows[start:end]] += value * self.post_weights[start:end]
+        return scores
+
+    @staticmethod
+    def _top(scores: np.ndarray, limit: int, positive_only: bool = False) -> np.ndarray:
+        candidates = np.flatnonzero(scores > 0) if positive_only else np.arange(len(scores))
+        if len(candidates) > limit:
+            # OPTIMIZATION: O(n) selection, then sort only the k winners
+            candidates = candidates[np.argpartition(-scores[candidates], limit - 1)[:limit]]
+        return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    def search(self, mode: str, dense, sparse, limit: int) -> List[models.ScoredPoint]:
+        if mode == "dense":
+            scores = self.dense_scores(dense)
+            ranked = [(int(r), float(scores[r])) for r in self._top(scores, limit)]
+        elif mode == "sparse":
+            scores = self.sparse_scores(sparse)
+            ranked = [(int(r), float(scores[r])) for r in self._top(scores, limit, positive_only=True)]
+        else:
+            fused = _rrf([
+                self._top(self.dense_scores(dense), limit),
+                self._top(self.sparse_scores(sparse), limit, positive_only=True),
+            ])
+            ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [
+            models.ScoredPoint(id=self.ids[row], version=0, score=score, payload=self.payloads[row])
+            for row, score in ranked
+        ]
+
+
+class LocalLoreIndex:
+    """
+    Hot in-process lore indexes for small characters, loaded lazily from Qdrant
+    and kept in an LRU bounded by `max_bytes`. Characters with more than
+    `max_points` chunks are remembered as large and go to Qdrant.
+    `search()` returns None whenever the caller should fall through to Qdrant.
+
+    Writes through this process invalidate immediately; `ttl_seconds` bounds
+    staleness for writes made elsewhere (other workers, the ingest CLI).
+    """
+    def __init__(
+        self,
+        loader: Loader,
+        max_points: int = settings.LORE_INDEX_MAX_POINTS,
+        max_bytes: int = settings.LORE_INDEX_MAX_BYTES,
+        dtype: str = settings.LORE_INDEX_DTYPE,
+        ttl_seconds: float = settings.LORE_INDEX_TTL_SECONDS,
+    ):
+        self.loader = loader
+        self.max_points = max_points
+        self.max_bytes = max_bytes
+        self.dtype = dtype
+        self.ttl = ttl_seconds
+
+        self._indexes: "OrderedDict[str, CharacterIndex]" = OrderedDict()
+        self._bytes = 0
+        self._large: Dict[str, float] = {}  # char_id -> when it was found too large
+        self._generations: Dict[str, int] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+        # Metrics
+        self.hits = 0
+        self.loads = 0
+        self.fallthroughs = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def invalidate(self, char_id: str):
+        """Called on writes; the next query reloads the character."""
+        self._generations[char_id] = self._generations.get(char_id, 0) + 1
+        self._large.pop(char_id, None)
+        if self._drop(char_id):
+            self.invalidations += 1
+
+    def _drop(self, char_id: str) -> bool:
+        index = self._indexes.pop(char_id, None)
+        if index is None:
+            return False
+        self._bytes -= index.nbytes
+        return True
+
+    def _fresh(self, char_id: str) -> Optional[CharacterIndex]:
+        now = time.monotonic()
+        index = self._indexes.get(char_id)
+        if index is not None and now - index.loaded_at > self.ttl:
+            self._drop(char_id)
+            index = None
+        large_since = self._large.get(char_id)
+        if large_since is not None and now - large_since > self.ttl:
+            del self._large[char_id]
+        return index
+
+    def _install(self, char_id: str, index: CharacterIndex):
+        self._indexes[char_id] = index
+        self._bytes += index.nbytes
+        while self._bytes > self.max_bytes and len(self._indexes) > 1:
+            _, evicted = self._indexes.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    async def _get(self, char_id: str) -> Optional[CharacterIndex]:
+        index = self._fresh(char_id)
+        if index is not None:
+            self._indexes.move_to_end(char_id)
+            return index
+        if char_id in self._large:
+            return None
+
+        lock = self._locks.setdefault(char_id, asyncio.Lock())
+        async with lock:
+            # Concurrent queries for the same character share one load
+            index = self._fresh(char_id)
+            if index is not None or char_id in self._large:
+                return index
+            generation = self._generations.get(char_id, 0)
+            points = await self.loader(char_id, self.max_points)
+            if self._generations.get(char_id, 0) != generation:
+                return None  # A write landed mid-load; let Qdrant answer this one
+            if points is None:
+                self._large[char_id] = time.monotonic()
+                logger.info(f"Lore index: '{char_id}' exceeds {self.max_points} chunks, staying on Qdrant.")
+                return None
+            loop = asyncio.get_running_loop()
+            index = await loop.run_in_executor(None, CharacterIndex, points, self.dtype)
+            if self._generations.get(char_id, 0) != generation:
+                return None
+            self.loads += 1
+            if index.nbytes <= self.max_bytes:
+                self._install(char_id, index)
+            return index
+
+    async def search(self, char_id: str, mode: str, dense, sparse, limit: int) -> Optional[List[models.ScoredPoint]]:
+        index = await self._get(char_id)
+        if index is None:
+            self.fallthroughs += 1
+            return None
+        self.hits += 1
+        if len(index) <= _INLINE_ROWS:
+            return index.search(mode, dense, sparse, limit)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, index.search, mode, dense, sparse, limit)
+
+    def stats(self) -> dict:
+        return {
+            "characters": len(self._indexes),
+            "large_characters": len(self._large),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "loads": self.loads,
+            "fallthroughs": self.fallthroughs,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,58 +1,103 @@
 import asyncio
-from src.memory.cache_manager import CacheManager
+from typing import Awaitable, Optional, Tuple
+from src.core.config import settings
+from src.core.tokenizer import MESSAGE_OVERHEAD_TOKENS, TokenCounter
+from src.memory.cache_manager import CacheManager, SessionHistory
 from src.memory.vector_store import LoreStore
+from src.services.prompt_engine import LORE_PREFIX
 
 class RagEngine:
-    def __init__(self):
-        # In prod, use dependency injection/settings
-        self.cache = CacheManager(host="redis") 
-        self.lore = LoreStore(host="qdrant")
-        
-        # OPTIMIZATION: Budget constants (Llama-3 8k context)
-        self.MAX_CONTEXT_TOKENS = 6000 # Leave 2k for generation
-        self.EST_CHARS_PER_TOKEN = 4   # Rough heuristic (faster than running tokenizer)
-
-    async def prepare_context(self, session_id: str, char_id: str, user_input: str) -> dict:
+    def __init__(
+        self,
+        cache: Optional[CacheManager] = None,
+        lore: Optional[LoreStore] = None,
+        token_counter: Optional[TokenCounter] = None,
+    ):
+        # Shared instances are injected by the ServiceContainer (src/core/container.py)
+        self.cache = cache or CacheManager(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+        self.lore = lore or LoreStore(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+        self.token_counter = token_counter or self.cache.token_counter
+
+        # OPTIMIZATION: Budget from the real context window (vLLM --max-model-len)
+        self.max_model_len = settings.VLLM_MAX_MODEL_LEN
+        self.generation_reserve = settings.GENERATION_RESERVE_TOKENS
+        self.max_lore_tokens = settings.LORE_MAX_TOKENS
+
+    def _fit_lore(self, lore_text: str) -> Tuple[str, int]:
+        """Keeps whole lore lines (best first) within max_lore_tokens."""
+        if not lore_text:
+            return "", 0
+        lines = lore_text.split("\n")
+        used = self.token_counter.count(LORE_PREFIX) + MESSAGE_OVERHEAD_TOKENS
+        kept = []
+        for line, tokens in zip(lines, self.token_counter.count_batch([line + "\n" for line in lines])):
+            if used + tokens > self.max_lore_tokens:
+                break
+            kept.append(line)
+            used += tokens
+        return "\n".join(kept), (used if kept else 0)
+
+    async def retrieve_lore(self, char_id: str, query: str) -> str:
+        """Lore search only: no writes, safe to start before the input is cleared."""
+        return await self.lore.search_lore(char_id, query)
+
+    async def prepare_context(
+        self,
+        session_id: str,
+        char_id: str,
+        user_input: str,
+        reserved_tokens: int = 0,
+        session: Optional[SessionHistory] = None,
+        lore: Optional[Awaitable[str]] = None,
+    ) -> dict:
         """
         Parallel fetch + Token Budgeting.
+        reserved_tokens: prompt tokens outside this context (the system block).
+        session: the connection's history mirror (skips re-decoding unchanged history).
+        lore: an already running retrieve_lore() for this input (speculative retrieval).
         """
+        session = session or self.cache.session(session_id)
+
         # 1. Run fetches in parallel
-        # We start the search task but await them together
-        history_task = asyncio.create_task(self.cache.get_history(session_id))
-        lore_task = asyncio.create_task(self.lore.search_lore(char_id, user_input))
-        
-        # Write user input to cache in background (fire and forget)
-        asyncio.create_task(self.cache.add_message(session_id, "user", user_input))
+        # The user message is appended and the history (including it) read back
+        # in one atomic round trip, concurrently with lore search
+        (history, summary), lore_text = await asyncio.gather(
+            session.add("user", user_input),
+            lore if lore is not None else self.retrieve_lore(char_id, user_input),
+        )
 
-        history, lore_text = await asyncio.gather(history_task, lore_task)
+        # The prompt adds the current input itself
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == user_input:
+            history = history[:-1]
 
         # 2. Token Budgeting Strategy
-        # Priority: System Prompt > Lore > Recent History > Old History
-        
-        budget = self.MAX_CONTEXT_TOKENS
-        
-        # Calculate Lore cost
-        lore_tokens = len(lore_text) / self.EST_CHARS_PER_TOKEN
-        if lore_tokens > 1000:
-            # Truncate lore if it's somehow massive (safety net)
-            lore_text = lore_text[:4000] 
-            budget -= 1000
-        else:
-            budget -= lore_tokens
-
-        # Prune History to fit remaining budget
-        pruned_history = []
-        current_tokens = 0
-        
-        # Iterate backwards (newest first)
-        for msg in reversed(history):
-            msg_len = len(msg['content']) / self.EST_CHARS_PER_TOKEN
-            if current_tokens + msg_len > budget:
+        # Priority: System Prompt > Lore > Summary > Recent History > Old History
+        lore_text, lore_tokens = self._fit_lore(lore_text)
+        summary_tokens = summary["tokens"] if summary else 0
+        fixed_tokens = (
+            reserved_tokens
+            + lore_tokens
+            + summary_tokens
+            + self.token_counter.count_message(user_input)
+            + MESSAGE_OVERHEAD_TOKENS # Assistant header
+        )
+        budget = self.max_model_len - self.generation_reserve - fixed_tokens
+
+        # Prune History to fit remaining budget, newest first.
+        # Counts were stored at write time; older entries are counted here once.
+        start = len(history)
+        used = 0
+        for i in range(len(history) - 1, -1, -1):
+            msg = history[i]
+            tokens = msg.get("tokens") or self.token_counter.count_message(msg["content"])
+            if used + tokens > budget:
                 break
-            pruned_history.insert(0, msg)
-            current_tokens += msg_len
+            used += tokens
+            start = i
 
         return {
-            "history": pruned_history,
-            "lore": lore_text
-        }
\ No newline at end of file
+            "history": history[start:],
+            "lore": lore_text,
+            "summary": summary["content"] if summary else None,
+            "prompt_tokens": fixed_tokens + used,
+        }
@@ -0,0 +1,167 @@
+import logging
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+from flashrank import RerankRequest
+
+from src.core.batching import MicroBatcher
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+# (query, passages) for one search_lore call
+RerankJob = Tuple[str, List[Dict[str, Any]]]
+
+
+class AdaptiveReranker:
+    """
+    Cross-encoder reranking that only runs when it can change the answer.
+
+    - Skipped when retrieval returned no more than `limit` candidates, or when
+      the scores already show a clear winner: the top score leads the
+      runner-up by `skip_margin` (similarity scores) or `rrf_skip_margin`
+      (RRF-fused scores), relative to the top score. RRF scores are rank
+      based, so adjacent ranks alone differ by ~1/3 and need their own margin.
+    - Passages are trimmed to ~`passage_max_tokens` before scoring.
+    - `candidate_count()` sizes retrieval from the measured per-passage cost
+      so a rerank fits the latency budget.
+    - Concurrent requests from different sessions are coalesced by a
+      MicroBatcher into one model call.
+    """
+    def __init__(
+        self,
+        ranker,
+        skip_margin: float = settings.RERANK_SKIP_MARGIN,
+        rrf_skip_margin: float = settings.RERANK_SKIP_MARGIN_RRF,
+        passage_max_tokens: int = settings.RERANK_PASSAGE_MAX_TOKENS,
+        latency_budget_ms: float = settings.RERANK_LATENCY_BUDGET_MS,
+        min_candidates: int = settings.RERANK_MIN_CANDIDATES,
+        max_candidates: int = settings.RERANK_MAX_CANDIDATES,
+        max_batch_size: int = settings.RERANK_MAX_BATCH_SIZE,
+        max_wait_ms: float = settings.RERANK_MAX_WAIT_MS,
+    ):
+        self.ranker = ranker
+        self.skip_margin = skip_margin
+        self.rrf_skip_margin = rrf_skip_margin
+        # Wordpiece tokenizers average ~1.3 tokens per word
+        self.passage_max_words = max(1, int(passage_max_tokens * 0.75))
+        self.latency_budget_ms = latency_budget_ms
+        self.min_candidates = min_candidates
+        self.max_candidates = max_candidates
+        self.batcher = MicroBatcher(
+            self._rerank_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name="reranker"
+        )
+
+        # EWMA of model time per passage (ms); None until the first batch
+        self.passage_ms = None
+
+        # Metrics
+        self.requests = 0
+        self.reranked = 0
+        self.skipped_clear_winner = 0
+        self.skipped_few_candidates = 0
+        self.passages_scored = 0
+
+    def candidate_count(self, limit: int) -> int:
+        """How many candidates to retrieve so reranking stays within budget."""
+        floor = max(limit, self.min_candidates)
+        if not self.passage_ms:
+            return max(floor, self.max_candidates)
+        affordable = int(self.latency_budget_ms / self.passage_ms)
+        return max(floor, min(affordable, self.max_candidates))
+
+    def _clear_winner(self, scores: Sequence[float], fused: bool = False) -> bool:
+        top, runner_up = scores[0], scores[1]
+        if top <= 0:
+            return False
+        return (top - runner_up) / top >= (self.rrf_skip_margin if fused else self.skip_margin)
+
+    def _trim(self, text: str) -> str:
+        words = text.split()
+        if len(words) <= self.passage_max_words:
+            return text
+        return " ".join(words[:self.passage_max_words])
+
+    async def rerank(self, query: str, hits: Sequence[Any], limit: int, fused: bool = False) -> List[str]:
+        """
+        `hits` are retrieval results (with .score and .payload["text"]) in
+        retrieval order; `fused` means their scores come from RRF (hybrid mode).
+        Returns the texts of the best `limit` passages.
+        """
+        self.requests += 1
+        texts = [hit.payload["text"] for hit in hits]
+        if len(hits) <= limit:
+            self.skipped_few_candidates += 1
+            return texts
+        if self._clear_winner([hit.score for hit in hits], fused):
+            self.skipped_clear_winner += 1
+            return texts[:limit]
+
+        passages = [{"id": i, "text": self._trim(text)} for i, text in enumerate(texts)]
+        ranked = await self.batcher.submit((query, passages))
+        self.reranked += 1
+        return [texts[p["id"]] for p in ranked[:limit]]
+
+    # --- Worker thread ---
+    def _rerank_batch(self, jobs: List[RerankJob]) -> List[List[Dict[str, Any]]]:
+        start = time.perf_counter()
+        if getattr(self.ranker, "session", None) is not None and getattr(self.ranker, "llm_model", None) is None:
+            results = self._score_pairwise(jobs)
+        else:
+            # Listwise / custom rankers: one call per request
+            results = [self.ranker.rerank(RerankRequest(query=q, passages=p)) for q, p in jobs]
+
+        passages = sum(len(p) for _, p in jobs)
+        self.passages_scored += passages
+        per_passage = (time.perf_counter() - start) * 1000 / max(1, passages)
+        self.passage_ms = per_passage if self.passage_ms is None else 0.8 * self.passage_ms + 0.2 * per_passage
+        return results
+
+    def _score_pairwise(self, jobs: List[RerankJob]) -> List[List[Dict[str, Any]]]:
+        """
+        OPTIMIZATION: One tokenizer + ONNX pass for the (query, passage) pairs of
+        every queued request (same math as flashrank's Ranker.rerank).
+        """
+        pairs = [[query, p["text"]] for query, passages in jobs for p in passages]
+        encoded = self.ranker.tokenizer.encode_batch(pairs)
+        input_ids = np.array([e.ids for e in encoded], dtype=np.int64)
+        token_type_ids = np.array([e.type_ids for e in encoded], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encoded], dtype=np.int64)
+
+        onnx_input = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if np.any(token_type_ids):
+            onnx_input["token_type_ids"] = token_type_ids
+        logits = self.ranker.session.run(None, onnx_input)[0]
+        if logits.shape[1] == 1:
+            scores = 1 / (1 + np.exp(-logits.flatten()))
+        else:
+            exp_logits = np.exp(logits)
+            scores = exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+
+        results = []
+        offset = 0
+        for _, passages in jobs:
+            scored = [
+                {**p, "score": float(s)} for p, s in zip(passages, scores[offset:offset + len(passages)])
+            ]
+            offset += len(passages)
+            results.append(sorted(scored, key=lambda p: p["score"], reverse=True))
+        return results
+
+    def stats(self) -> dict:
+        skipped = self.skipped_clear_winner + self.skipped_few_candidates
+        return {
+            "requests": self.requests,
+            "reranked": self.reranked,
+            "skipped_clear_winner": self.skipped_clear_winner,
+            "skipped_few_candidates": self.skipped_few_candidates,
+            "skip_rate": skipped / self.requests if self.requests else 0.0,
+            "passages_scored": self.passages_scored,
+            "passage_ms": self.passage_ms or 0.0,
+            "candidates": self.candidate_count(0),
+            "batching": self.batcher.stats(),
+        }
+
+    def close(self):
+        self.batcher.close()
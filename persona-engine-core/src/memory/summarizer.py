@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional
+
+import orjson
+
+from src.core.config import settings
+from src.memory.cache_manager import CacheManager
+from src.services.prompt_engine import SUMMARY_PREFIX
+
+logger = logging.getLogger("uvicorn")
+
+# Compare-and-delete: only the holder's token releases the lock (it may have expired and been re-taken)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class ConversationSummarizer:
+    """
+    Rolling conversation summaries that bound prompt length in long sessions.
+
+    After each turn `schedule()` checks the connection's already-decoded
+    history (SessionHistory.add) against the trigger and, only when it is
+    over, starts a background compaction for the session (at most one per
+    session per process), so turns below the trigger cost no Redis calls. The
+    oldest messages are folded into the session summary by an off-path vLLM
+    call; the newest messages always stay verbatim.
+
+    The fold is committed by CacheManager.fold_history, which applies it only
+    if the list head and summary version are unchanged, so concurrent writers
+    and compactors in other workers can never fold the same turns twice.
+    A short Redis lock (SET NX with a per-holder token, released by
+    compare-and-delete) avoids duplicate vLLM calls across workers.
+    """
+    def __init__(
+        self,
+        cache: CacheManager,
+        inference,
+        prompts,
+        trigger_tokens: int = settings.SUMMARY_TRIGGER_TOKENS,
+        trigger_messages: int = settings.SUMMARY_TRIGGER_MESSAGES,
+        keep_messages: int = settings.SUMMARY_KEEP_MESSAGES,
+        keep_tokens: int = settings.SUMMARY_KEEP_TOKENS,
+        max_tokens: int = settings.SUMMARY_MAX_TOKENS,
+        lock_seconds: int = 120,
+    ):
+        self.cache = cache
+        self.inference = inference
+        self.prompts = prompts
+        self.trigger_tokens = trigger_tokens
+        self.trigger_messages = trigger_messages
+        self.keep_messages = keep_messages
+        self.keep_tokens = keep_tokens
+        self.max_tokens = max_tokens
+        self.lock_seconds = lock_seconds
+
+        self._running: Dict[str, asyncio.Task] = {}
+        self._release_lock = cache.redis.register_script(RELEASE_LOCK_SCRIPT)
+
+        # Metrics
+        self.scheduled = 0
+        self.skipped = 0 # Below the trigger, decided from the caller's history
+        self.compactions = 0
+        self.conflicts = 0
+        self.failures = 0
+        self.messages_folded = 0
+
+    def schedule(self, session_id: str, history: Optional[List[Dict[str, Any]]] = None) -> Optional[asyncio.Task]:
+        """
+        Never blocks the turn: compaction runs as a background task. With the
+        caller's decoded `history`, nothing is started (None) while it is
+        below the trigger.
+        """
+        if history is not None and self._fold_count(history) <= 0:
+            self.skipped += 1
+            return None
+        task = self._running.get(session_id)
+        if task is None:
+            self.scheduled += 1
+            task = asyncio.create_task(self._compact_safely(session_id))
+            self._running[session_id] = task
+            task.add_done_callback(lambda _: self._running.pop(session_id, None))
+        return task
+
+    async def _compact_safely(self, session_id: str):
+        try:
+            await self.compact(session_id)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Summary compaction failed for session {session_id}: {e}")
+
+    def _fold_count(self, history: List[Dict[str, Any]]) -> int:
+        """How many of the oldest messages to fold (0 = below the trigger)."""
+        tokens = [m.get("tokens") or self.cache.token_counter.count_message(m["content"]) for m in history]
+        if sum(tokens) <= self.trigger_tokens and len(history) < self.trigger_messages:
+            return 0
+        keep = 0
+        kept_tokens = 0
+        for count in reversed(tokens):
+            if keep >= self.keep_messages or (keep >= 2 and kept_tokens + count > self.keep_tokens):
+                break
+            keep += 1
+            kept_tokens += count
+        return len(history) - keep
+
+    async def compact(self, session_id: str) -> bool:
+        """Folds old turns into the summary; returns True if a fold was committed."""
+        raw = await self.cache.get_raw_history(session_id)
+        history = [orjson.loads(m) for m in raw]
+        fold = self._fold_count(history)
+        if fold <= 0:
+            return False
+
+        lock_key = f"session:{session_id}:compacting"
+        token = uuid.uuid4().hex.encode()
+        if not await self.cache.redis.set(lock_key, token, nx=True, ex=self.lock_seconds):
+            return False  # Another worker is compacting this session
+        try:
+            previous = await self.cache.get_summary(session_id)
+            prompt = await self.prompts.build_summary_prompt(
+                history[:fold], previous_summary=previous["content"] if previous else ""
+            )
+            text = await self.inference.complete(
+                prompt, f"summary-{uuid.uuid4()}", max_tokens=self.max_tokens, session_id=session_id
+            )
+            text = text.strip()
+            if not text:
+                raise RuntimeError("empty summary")
+            tokens = self.cache.token_counter.count_message(f"{SUMMARY_PREFIX}{text}")
+
+            committed = await self.cache.fold_history(
+                session_id, raw[:fold], text, tokens, previous["version"] if previous else 0
+            )
+        finally:
+            await self._release_lock(keys=[lock_key], args=[token])
+
+        if committed:
+            self.compactions += 1
+            self.messages_folded += fold
+        else:
+            self.conflicts += 1
+        return committed
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._running),
+            "scheduled": self.scheduled,
+            "skipped": self.skipped,
+            "compactions": self.compactions,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+            "messages_folded": self.messages_folded,
+        }
+
+    async def aclose(self):
+        tasks = list(self._running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
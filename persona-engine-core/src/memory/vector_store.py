@@ -1,34 +1,68 @@
 import asyncio
-from typing import List, Dict
-from qdrant_client import QdrantClient, models
-from fastembed import TextEmbedding,SparseTextEmbedding  # OPTIMIZATION: Rust-based embeddings
+import uuid
+from typing import List, Dict, Optional, Sequence, Tuple
+from qdrant_client import AsyncQdrantClient, models
 import logging
-from flashrank import Ranker, RerankRequest
+from flashrank import Ranker
+from src.core.config import settings
+from src.core.embeddings import DENSE_MODEL, SPARSE_MODEL, EmbeddingService
+from src.memory.embedding_cache import EmbeddingCache
+from src.memory.lore_index import LocalLoreIndex
+from src.memory.reranker import AdaptiveReranker
 
 logger = logging.getLogger("uvicorn")
 
+RETRIEVAL_MODES = ("dense", "sparse", "hybrid")
+_POINT_NAMESPACE = uuid.UUID("6f1c2d1e-5b8a-4c1e-9a53-0e6a4b7d2f10")
+
+def lore_point_id(char_id: str, text: str) -> str:
+    """Content-hash point ID: re-ingesting the same chunk overwrites instead of duplicating."""
+    return str(uuid.uuid5(_POINT_NAMESPACE, f"{char_id}\x00{text}"))
+
+def _check_mode(mode: str):
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+
 class LoreStore:
-    def __init__(self, host: str = "localhost", port: int = 6333):
-        # OPTIMIZATION: Connect asynchronously where possible, 
-        # but Qdrant python client is sync by default for search, so we wrap it.
-        self.client = QdrantClient(host=host, port=port)
+    def __init__(self, host: str = "localhost", port: int = 6333, embedding_cache: Optional[EmbeddingCache] = None):
+        # OPTIMIZATION: Native async client; searches no longer occupy executor threads
+        self.client = AsyncQdrantClient(host=host, port=port)
         self.collection_name = "character_lore"
-        
-        # OPTIMIZATION: Load Multilingual model (supports EN & RU)
-        # fastembed downloads quantized ONNX models automatically.
-        self.embedding_model = TextEmbedding(model_name="intfloat/multilingual-e5-large")
+        self._collection_ready = False
+        self._collection_lock = asyncio.Lock()
 
-        # Load Models (Lazy loading recommended in prod, strict here for simplicity)
-        # Dense Model (Semantic)
-        self.dense_model = TextEmbedding(model_name="intfloat/multilingual-e5-large")
+        # Retrieval mode per character ("dense", "sparse" or "hybrid")
+        self.default_mode = settings.LORE_RETRIEVAL_MODE
+        self.retrieval_modes: Dict[str, str] = settings.lore_retrieval_overrides()
+        # Fail at startup on a typo in the env, not with query=None on the first search
+        for mode in (self.default_mode, *self.retrieval_modes.values()):
+            _check_mode(mode)
+        # OPTIMIZATION: Small characters are searched in-process (no network round trip)
+        self.local_index = LocalLoreIndex(self._load_character) if settings.LORE_INDEX_ENABLED else None
+        
+        # OPTIMIZATION: Shared, batched models (one copy per process, also used by the safety mesh)
+        # Dense Model (Semantic, multilingual: supports EN & RU)
+        self.dense = EmbeddingService.acquire(DENSE_MODEL)
         # Sparse Model (Keyword/BM25)
-        self.sparse_model = SparseTextEmbedding(model_name="prithivida/splade-pp-e5-large") 
+        self.sparse = EmbeddingService.acquire(SPARSE_MODEL, kind="sparse")
+        # OPTIMIZATION: LRU + Redis cache, so repeated texts are never re-embedded
+        self.embedding_cache = embedding_cache or EmbeddingCache()
         self.reranker = Ranker(model_name="ms-marco-MiniLM-L-12-v2", cache_dir="/tmp")
-        self._init_collection()
+        # OPTIMIZATION: Skips, trims and batches rerank calls across sessions
+        self.adaptive_reranker = AdaptiveReranker(self.reranker)
 
-    def _init_collection(self):
-        if not self.client.collection_exists(self.collection_name):
-            self.client.create_collection(
+    async def _ensure_collection(self):
+        """Creates the collection on first use (the async client can't do it in __init__)."""
+        if self._collection_ready:
+            return
+        async with self._collection_lock:
+            if not self._collection_ready:
+                await self._init_collection()
+                self._collection_ready = True
+
+    async def _init_collection(self):
+        if not await self.client.collection_exists(self.collection_name):
+            await self.client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config={
                     "dense": models.VectorParams(size=1024, distance=models.Distance.COSINE)
@@ -54,7 +88,7 @@ class LoreStore:
                 )
             )
             # OPTIMIZATION: Create payload index for faster filtering by char_id
-            self.client.create_payload_index(
+            await self.client.create_payload_index(
                 collection_name=self.collection_name,
                 field_name="char_id",
                 field_schema=models.PayloadSchemaType.KEYWORD
@@ -62,66 +96,152 @@ class LoreStore:
 
     async def _get_embeddings(self, text: str):
         """Generate Dense + Sparse vectors."""
-        loop = asyncio.get_running_loop()
-        def compute():
-            dense = list(self.dense_model.embed([text]))[0]
-            sparse = list(self.sparse_model.embed([text]))[0]
-            return dense.tolist(), models.SparseVector(
-                indices=sparse.indices.tolist(),
-                values=sparse.values.tolist()
-            )
-        return await loop.run_in_executor(None, compute)
+        (dense, sparse), = await self._get_embeddings_batch([text])
+        return dense, sparse
+
+    async def _get_embeddings_batch(self, texts: Sequence[str]) -> List[Tuple[List[float], models.SparseVector]]:
+        """Dense + Sparse vectors for many texts; only cache misses reach the models."""
+        dense, sparse = await asyncio.gather(
+            self.embedding_cache.get_dense(DENSE_MODEL, texts, self.dense.embed),
+            self.embedding_cache.get_sparse(SPARSE_MODEL, texts, self.sparse.embed),
+        )
+        return [
+            (d.tolist(), models.SparseVector(indices=idx.tolist(), values=val.tolist()))
+            for d, (idx, val) in zip(dense, sparse)
+        ]
 
+    async def embed_dense(self, text: str) -> List[float]:
+        """Dense vector only (semantic response cache)."""
+        (vector,) = await self.embedding_cache.get_dense(DENSE_MODEL, [text], self.dense.embed)
+        return vector.tolist()
 
     async def add_lore(self, char_id: str, text: str):
-        dense, sparse = await self._get_embeddings(text)
-        point = models.PointStruct(
-            id=models.uuid.uuid4().hex,
-            vector={"dense": dense, "sparse": sparse},
-            payload={"char_id": char_id, "text": text}
-        )
-        self.client.upsert(collection_name=self.collection_name, points=[point])
+        await self.add_lore_batch([(char_id, text)])
 
-    async def search_lore(self, char_id: str, query: str, limit: int = 3) -> str:
+    async def add_lore_batch(self, items: Sequence[Tuple[str, str]]) -> int:
         """
-        Flow: Hybrid Search (Retrieve 10) -> Rerank (Keep Top 3)
+        Embeds (char_id, text) pairs in one batch and upserts them in one request.
+        Point IDs are content hashes, so retries and re-imports are idempotent.
         """
-        dense, sparse = await self._get_embeddings(query)
-        search_filter = models.Filter(
+        vectors = await self._get_embeddings_batch([text for _, text in items])
+        points = [
+            models.PointStruct(
+                id=lore_point_id(char_id, text),
+                vector={"dense": dense, "sparse": sparse},
+                payload={"char_id": char_id, "text": text}
+            )
+            for (char_id, text), (dense, sparse) in zip(items, vectors)
+        ]
+        await self._ensure_collection()
+        await self.client.upsert(collection_name=self.collection_name, points=points, wait=True)
+        if self.local_index is not None:
+            for char_id in {char_id for char_id, _ in items}:
+                self.local_index.invalidate(char_id)
+        return len(points)
+
+    @staticmethod
+    def _char_filter(char_id: str) -> models.Filter:
+        return models.Filter(
             must=[models.FieldCondition(key="char_id", match=models.MatchValue(value=char_id))]
         )
 
-        # 1. RETRIEVE (Fetch more than we need: top_k=10)
-        loop = asyncio.get_running_loop()
-        hits = await loop.run_in_executor(
-            None, 
-            lambda: self.client.search(
+    async def _load_character(self, char_id: str, max_points: int) -> Optional[List[models.Record]]:
+        """All of a character's points with vectors, or None if it has more than max_points."""
+        await self._ensure_collection()
+        search_filter = self._char_filter(char_id)
+        count = await self.client.count(collection_name=self.collection_name, count_filter=search_filter, exact=True)
+        if count.count > max_points:
+            return None
+        points: List[models.Record] = []
+        offset = None
+        while True:
+            page, offset = await self.client.scroll(
                 collection_name=self.collection_name,
-                query_vector=models.NamedVector(name="dense", vector=dense),
+                scroll_filter=search_filter,
+                limit=1000,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            points.extend(page)
+            if offset is None:
+                return points
+
+    def set_retrieval_mode(self, char_id: str, mode: str):
+        _check_mode(mode)
+        self.retrieval_modes[char_id] = mode
+
+    async def _embed_query(self, query: str, mode: str):
+        """Computes only the vectors the retrieval mode needs."""
+        dense = sparse = None
+        if mode in ("dense", "hybrid"):
+            (vector,) = await self.embedding_cache.get_dense(DENSE_MODEL, [query], self.dense.embed)
+            dense = vector.tolist()
+        if mode in ("sparse", "hybrid"):
+            ((indices, values),) = await self.embedding_cache.get_sparse(SPARSE_MODEL, [query], self.sparse.embed)
+            sparse = models.SparseVector(indices=indices.tolist(), values=values.tolist())
+        return dense, sparse
+
+    async def retrieve(self, char_id: str, query: str, limit: int = 10, mode: Optional[str] = None) -> List[models.ScoredPoint]:
+        """
+        Candidate retrieval: in-process for small characters, otherwise in a
+        single Qdrant round trip.
+        Hybrid: dense + sparse prefetch fused server-side with Reciprocal Rank Fusion.
+        """
+        mode = mode or self.retrieval_modes.get(char_id, self.default_mode)
+        dense, sparse = await self._embed_query(query, mode)
+        if self.local_index is not None:
+            hits = await self.local_index.search(char_id, mode, dense, sparse, limit)
+            if hits is not None:
+                return hits
+
+        search_filter = self._char_filter(char_id)
+        await self._ensure_collection()
+
+        if mode == "hybrid":
+            response = await self.client.query_points(
+                collection_name=self.collection_name,
+                prefetch=[
+                    models.Prefetch(query=dense, using="dense", filter=search_filter, limit=limit),
+                    models.Prefetch(query=sparse, using="sparse", filter=search_filter, limit=limit),
+                ],
+                query=models.FusionQuery(fusion=models.Fusion.RRF),
+                limit=limit,
+                with_payload=True
+            )
+        else:
+            response = await self.client.query_points(
+                collection_name=self.collection_name,
+                query=dense if mode == "dense" else sparse,
+                using=mode,
                 query_filter=search_filter,
-                limit=10, # Fetch candidate pool
+                limit=limit,
                 with_payload=True
             )
-        )
-        
+        return response.points
+
+    async def search_lore(self, char_id: str, query: str, limit: int = 3, mode: Optional[str] = None) -> str:
+        """
+        Flow: Hybrid Search (Retrieve N) -> Rerank (Keep Top 3)
+        N comes from the rerank latency budget; reranking is skipped when
+        retrieval already has a clear winner.
+        """
+        # 1. RETRIEVE (Fetch more than we need)
+        mode = mode or self.retrieval_modes.get(char_id, self.default_mode)
+        candidates = self.adaptive_reranker.candidate_count(limit)
+        hits = await self.retrieve(char_id, query, limit=candidates, mode=mode)
+
         if not hits:
             return ""
 
         # 2. RERANK
         # Reranker checks the actual text relevance, fixing "vector drift"
-        passages = [
-            {"id": hit.id, "text": hit.payload["text"], "meta": hit.payload} 
-            for hit in hits
-        ]
-        
-        rerank_request = RerankRequest(query=query, passages=passages)
-        
-        # Run Rerank in executor
-        ranked_results = await loop.run_in_executor(
-            None, 
-            lambda: self.reranker.rerank(rerank_request)
-        )
-        
+        top_results = await self.adaptive_reranker.rerank(query, hits, limit, fused=mode == "hybrid")
+
         # 3. RETURN TOP K
-        top_results = ranked_results[:limit]
-        return "\n".join([f"- {res['text']}" for res in top_results])
\ No newline at end of file
+        return "\n".join([f"- {text}" for text in top_results])
+
+    def close(self):
+        self.adaptive_reranker.close()
+        self.dense.release()
+        self.sparse.release()
@@ -1,27 +1,107 @@
 import time
 import redis.asyncio as redis
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
 from fastapi import HTTPException
 from src.core.config import settings
+from src.core.redis_pool import get_redis
+
+# GCRA (Generic Cell Rate Algorithm) in one atomic call: the key holds the
+# "theoretical arrival time" (TAT, ms). A request is allowed if pushing the TAT
+# one emission interval forward stays within the burst tolerance.
+# Uses the Redis clock, so workers with skewed clocks agree.
+# KEYS: bucket | ARGV: emission interval ms, burst | returns retry-after ms (0 = allowed)
+GCRA_SCRIPT = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local tolerance = interval * tonumber(ARGV[2])
+local tat = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tat < now then tat = now end
+local new_tat = tat + interval
+if new_tat - now > tolerance then
+    return new_tat - now - tolerance
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return 0
+"""
 
 class RateLimiter:
-    def __init__(self, host="redis", port=6379):
-        self.redis = redis.Redis(host=host, port=port, decode_responses=True)
+    """
+    GCRA rate limiter: `limit` requests per `window_seconds` sustained, with
+    bursts of up to `burst` requests. One Redis round trip per check.
+
+    An in-process copy of each bucket (same parameters) rejects floods without
+    touching Redis. It only counts requests Redis allowed, so it can never be
+    stricter than the shared limit.
+    """
+    def __init__(self, host="redis", port=6379, client: Optional[redis.Redis] = None, max_local_keys: int = 10000):
+        self.redis = client or get_redis(host, port)
+        self._gcra = self.redis.register_script(GCRA_SCRIPT)
+        self.tiers: Dict[str, Tuple[int, int]] = settings.rate_limit_tiers()
+        if "free" not in self.tiers:
+            # Unknown tiers fall back to it: fail at startup, not on every message
+            raise ValueError(f"RATE_LIMIT_TIERS needs a 'free' tier, got {sorted(self.tiers)}")
+        self._local: "OrderedDict[str, float]" = OrderedDict() # key -> local TAT (monotonic seconds)
+        self.max_local_keys = max_local_keys
+
+        # Metrics
+        self.allowed = 0
+        self.local_rejects = 0
+        self.redis_rejects = 0
+
+    def _local_check(self, key: str, interval: float, burst: int) -> Tuple[float, float]:
+        """Returns (retry_after, new local TAT) without committing it."""
+        now = time.monotonic()
+        tat = max(self._local.get(key, now), now)
+        new_tat = tat + interval
+        over = new_tat - now - interval * burst
+        return (over if over > 0 else 0.0), new_tat
+
+    def _local_commit(self, key: str, new_tat: float):
+        self._local[key] = new_tat
+        self._local.move_to_end(key)
+        if len(self._local) > self.max_local_keys:
+            self._local.popitem(last=False)
+
+    async def hit(self, key: str, limit: int, window_seconds: float, burst: Optional[int] = None) -> float:
+        """
+        Counts one request. Returns 0.0 if allowed, otherwise the seconds to wait.
+        """
+        burst = burst or limit
+        interval_ms = max(1, int(window_seconds * 1000 / limit))
+        interval = interval_ms / 1000 # Same rounding locally and in Redis
+
+        # OPTIMIZATION: Obvious floods are rejected in-process
+        retry_after, new_tat = self._local_check(key, interval, burst)
+        if retry_after > 0:
+            self.local_rejects += 1
+            return retry_after
+
+        retry_ms = await self._gcra(keys=[f"rate_limit:{key}"], args=[interval_ms, burst])
+        if retry_ms > 0:
+            self.redis_rejects += 1
+            return retry_ms / 1000
+        self._local_commit(key, new_tat)
+        self.allowed += 1
+        return 0.0
 
     async def check_limit(self, key: str, limit: int, window_seconds: int):
         """
-        Returns True if allowed, False if limited.
+        Raises HTTP 429 once `key` exceeds `limit` requests per `window_seconds`.
         """
-        # Simple fixed window for MVP. 
-        # For Enterprise, use Lua script for sliding window.
-        current_window = int(time.time() / window_seconds)
-        redis_key = f"rate_limit:{key}:{current_window}"
-        
-        # Increment
-        current_count = await self.redis.incr(redis_key)
-        
-        # Set expiry on first increment
-        if current_count == 1:
-            await self.redis.expire(redis_key, window_seconds + 5)
-            
-        if current_count > limit:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded")
\ No newline at end of file
+        if await self.hit(key, limit, window_seconds):
+            raise HTTPException(status_code=429, detail="Rate limit exceeded")
+
+    async def check_tier(self, key: str, tier: str) -> float:
+        """Per-message limit for a plan tier (Tenant.plan_tier); returns seconds to wait or 0.0."""
+        per_minute, burst = self.tiers.get(tier) or self.tiers["free"]
+        return await self.hit(key, per_minute, 60, burst)
+
+    def stats(self) -> dict:
+        return {
+            "allowed": self.allowed,
+            "local_rejects": self.local_rejects,
+            "redis_rejects": self.redis_rejects,
+            "local_keys": len(self._local),
+        }
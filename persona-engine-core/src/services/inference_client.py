@@ -1,35 +1,156 @@
+import asyncio
 import httpx
 import json
 import logging
-from typing import AsyncGenerator
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Dict, List, Optional
 from contextlib import asynccontextmanager
 from src.core.config import settings
 
 logger = logging.getLogger("uvicorn")
 
+# In-band error texts yielded instead of tokens (never cache or persist these)
+ERROR_PREFIXES = (" [System Error", " [Error")
+
+
+class BackendUnavailable(Exception):
+    """Raised when a backend fails before producing the first token (safe to fail over)."""
+
+
+class Backend:
+    """One vLLM node: load counters, health state and a circuit breaker."""
+    def __init__(self, url: str, failure_threshold: int, cooldown_seconds: float):
+        self.url = url.rstrip("/")
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        self.outstanding_requests = 0
+        self.outstanding_tokens = 0
+        self.healthy = True              # Last active probe result
+        self.consecutive_failures = 0
+        self.open_until = 0.0            # Breaker is open while now < open_until
+        self.half_open_trial = False     # One trial request in flight after cooldown
+
+        # Metrics
+        self.requests = 0
+        self.failures = 0
+
+    def available(self, now: float) -> bool:
+        if not self.healthy:
+            return False
+        if self.consecutive_failures < self.failure_threshold:
+            return True
+        # Breaker tripped: allow a single trial once the cooldown has passed
+        return now >= self.open_until and not self.half_open_trial
+
+    def load(self) -> tuple:
+        return (self.outstanding_requests, self.outstanding_tokens)
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.half_open_trial = False
+
+    def record_failure(self, now: float):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.half_open_trial = False
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = now + self.cooldown_seconds
+            logger.warning(f"Circuit open for vLLM backend {self.url} ({self.cooldown_seconds}s)")
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "breaker_open": self.consecutive_failures >= self.failure_threshold,
+            "outstanding_requests": self.outstanding_requests,
+            "outstanding_tokens": self.outstanding_tokens,
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
 class InferenceClient:
-    _instance = None
-    _client: httpx.AsyncClient = None
+    """
+    Streams completions from one or more OpenAI-compatible vLLM backends.
 
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(InferenceClient, cls).__new__(cls)
-        return cls._instance
+    Routing: least outstanding (requests, tokens), sticky per session while the
+    sticky backend is not much busier than the least-loaded one, so vLLM
+    prefix-cache hits are kept. Backends are health-probed in the background and
+    guarded by per-backend circuit breakers. Failures before the first token
+    fail over to the next backend; the client never sees them.
+    """
+    def __init__(self, backends: Optional[List[str]] = None):
+        urls = backends or settings.vllm_backends()
+        self.backends: List[Backend] = [
+            Backend(url, settings.VLLM_BREAKER_FAILURES, settings.VLLM_BREAKER_COOLDOWN_SECONDS)
+            for url in urls
+        ]
+        self._client: Optional[httpx.AsyncClient] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._sticky: "OrderedDict[str, Backend]" = OrderedDict()
+        self.max_sticky_sessions = 10000
+        self.sticky_slack = settings.VLLM_STICKY_SLACK
 
-    @classmethod
     @asynccontextmanager
-    async def lifespan(cls):
-        """Manage global HTTP client lifecycle."""
+    async def lifespan(self):
+        """Manage HTTP client and health-probe lifecycle."""
         # OPTIMIZATION: Connection pooling and keep-alive
-        cls._client = httpx.AsyncClient(
-            base_url=settings.VLLM_ENDPOINT,
-            timeout=60.0,
-            limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0, connect=settings.VLLM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(max_keepalive_connections=20 * len(self.backends), max_connections=100 * len(self.backends))
         )
-        yield
-        await cls._client.aclose()
+        self._probe_task = asyncio.create_task(self._probe_loop())
+        try:
+            yield self
+        finally:
+            self._probe_task.cancel()
+            await self._client.aclose()
+
+    # --- Health probing ---
+    async def _probe_loop(self):
+        while True:
+            await asyncio.gather(*(self._probe(b) for b in self.backends))
+            await asyncio.sleep(settings.VLLM_PROBE_INTERVAL_SECONDS)
+
+    async def _probe(self, backend: Backend):
+        try:
+            response = await self._client.get(f"{backend.url}/models", timeout=settings.VLLM_PROBE_TIMEOUT_SECONDS)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy != backend.healthy:
+            logger.warning(f"vLLM backend {backend.url} is now {'healthy' if healthy else 'unhealthy'}")
+        backend.healthy = healthy
 
-    async def stream_chat(self, prompt: str, request_id: str, max_tokens: int = 512) -> AsyncGenerator[str, None]:
+    # --- Routing ---
+    def _pick(self, session_id: Optional[str], exclude: set) -> Optional[Backend]:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not candidates:
+            return None
+        least = min(candidates, key=Backend.load)
+
+        if session_id is not None:
+            sticky = self._sticky.get(session_id)
+            if sticky in candidates and sticky.outstanding_requests <= least.outstanding_requests + self.sticky_slack:
+                self._sticky.move_to_end(session_id)
+                return sticky
+            self._sticky[session_id] = least
+            self._sticky.move_to_end(session_id)
+            if len(self._sticky) > self.max_sticky_sessions:
+                self._sticky.popitem(last=False)
+        return least
+
+    async def stream_chat(
+        self,
+        prompt: str,
+        request_id: str,
+        max_tokens: int = settings.GENERATION_RESERVE_TOKENS,
+        session_id: Optional[str] = None,
+        temperature: float = 0.8, # Slightly higher for RP creativity
+    ) -> AsyncGenerator[str, None]:
         """
         Streams tokens. Supports external cancellation via generator close.
         """
@@ -38,16 +159,75 @@ class InferenceClient:
             "prompt": prompt,
             "max_tokens": max_tokens,
             "stream": True,
-            "temperature": 0.8, # Slightly higher for RP creativity
+            "temperature": temperature,
             "top_p": 0.95,
             "stop": ["<|eot_id|>"],
             # OPTIMIZATION: Tag request for tracing
-            "user_id": request_id 
+            "user_id": request_id
         }
+        # Rough reservation; only used to compare backends against each other
+        reserved_tokens = len(prompt) // 4 + max_tokens
+
+        tried = set()
+        while True:
+            backend = self._pick(session_id, tried)
+            if backend is None:
+                logger.error("Failed to connect to vLLM engine.")
+                yield " [System Error: Engine Offline]"
+                return
+            tried.add(backend)
 
+            if backend.consecutive_failures >= backend.failure_threshold:
+                backend.half_open_trial = True
+            backend.outstanding_requests += 1
+            backend.outstanding_tokens += reserved_tokens
+            backend.requests += 1
+            try:
+                async for token in self._stream_from(backend, payload):
+                    yield token
+                return
+            except BackendUnavailable as e:
+                # Nothing reached the client yet: fail over
+                backend.record_failure(time.monotonic())
+                logger.warning(f"vLLM backend {backend.url} failed before first token ({e}); failing over")
+                if self._sticky.get(session_id) is backend:
+                    del self._sticky[session_id]
+            except httpx.HTTPStatusError as e:
+                # 4xx: the request was rejected (e.g. prompt too long), the backend is healthy
+                backend.record_success()
+                logger.error(f"Inference request rejected: {e}")
+                yield f" [Error: {str(e)}]"
+                return
+            except Exception as e:
+                if isinstance(e, httpx.TransportError):
+                    backend.record_failure(time.monotonic())
+                logger.error(f"Inference error: {e}")
+                yield f" [Error: {str(e)}]"
+                return
+            finally:
+                backend.half_open_trial = False
+                backend.outstanding_requests -= 1
+                backend.outstanding_tokens -= reserved_tokens
+
+    async def complete(
+        self, prompt: str, request_id: str, max_tokens: int, session_id: Optional[str] = None, temperature: float = 0.3
+    ) -> str:
+        """Non-streaming helper for background jobs; raises instead of returning error text."""
+        parts = []
+        async for token in self.stream_chat(prompt, request_id, max_tokens, session_id=session_id, temperature=temperature):
+            parts.append(token)
+        text = "".join(parts)
+        if text.startswith(ERROR_PREFIXES):
+            raise RuntimeError(f"Completion failed: {text.strip()}")
+        return text
+
+    async def _stream_from(self, backend: Backend, payload: dict) -> AsyncGenerator[str, None]:
+        first_token = True
         try:
             # OPTIMIZATION: stream() allows us to disconnect midway if needed
-            async with self._client.stream("POST", "/completions", json=payload) as response:
+            async with self._client.stream("POST", f"{backend.url}/completions", json=payload) as response:
+                if response.status_code >= 500:
+                    raise BackendUnavailable(f"HTTP {response.status_code}")
                 response.raise_for_status()
                 async for line in response.aiter_lines():
                     if line.startswith("data: "):
@@ -58,12 +238,18 @@ class InferenceClient:
                             data = json.loads(data_str)
                             # Handle different vLLM response formats
                             token = data.get("text") or data["choices"][0]["text"]
-                            yield token
                         except (KeyError, json.JSONDecodeError):
                             continue
-        except httpx.ConnectError:
-            logger.error("Failed to connect to vLLM engine.")
-            yield " [System Error: Engine Offline]"
-        except Exception as e:
-            logger.error(f"Inference error: {e}")
-            yield f" [Error: {str(e)}]"
\ No newline at end of file
+                        if first_token:
+                            backend.record_success()
+                            first_token = False
+                        yield token
+            if first_token:
+                backend.record_success()
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.ReadTimeout) as e:
+            if first_token:
+                raise BackendUnavailable(type(e).__name__) from e
+            raise
+
+    def stats(self) -> List[Dict]:
+        return [b.stats() for b in self.backends]
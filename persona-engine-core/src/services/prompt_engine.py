@@ -1,24 +1,109 @@
+from collections import OrderedDict
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pathlib import Path
+from typing import Dict, List, Optional
+
+# Llama-3 generation prompt: the model continues from here
+ASSISTANT_HEADER = "<|start_header_id|>assistant<|end_header_id|>\n\n"
+# Content prefixes of the system turns (RagEngine budgets them too)
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+LORE_PREFIX = "Relevant lore:\n"
 
 class PromptEngine:
-    def __init__(self, template_dir: str = "src/templates"):
+    """
+    Renders prompts ordered from static to dynamic so consecutive turns share a
+    byte-identical prefix (vLLM --enable-prefix-caching):
+
+        system (persona + stable lore) | summary | history turns | retrieved lore | new user turn
+
+    Rendered fragments are cached, so each turn only renders the new messages.
+    """
+    def __init__(self, template_dir: str = "src/templates", max_cached_fragments: int = 4096):
         path = Path(__file__).parent.parent.parent / "src/templates"
         # OPTIMIZATION: Enable async mode
         self.env = Environment(
             loader=FileSystemLoader(path),
             autoescape=select_autoescape(),
-            enable_async=True 
+            enable_async=True
         )
+        # OPTIMIZATION: LRU of rendered fragments keyed by their inputs
+        self._fragments: "OrderedDict[tuple, str]" = OrderedDict()
+        self.max_cached_fragments = max_cached_fragments
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+
+    async def _render_cached(self, template_name: str, **kwargs) -> str:
+        key = (template_name, *sorted(kwargs.items()))
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+            self.fragment_hits += 1
+            return fragment
+
+        self.fragment_misses += 1
+        template = self.env.get_template(template_name)
+        # OPTIMIZATION: render_async yields to event loop
+        fragment = await template.render_async(**kwargs)
+        self._fragments[key] = fragment
+        if len(self._fragments) > self.max_cached_fragments:
+            self._fragments.popitem(last=False)
+        return fragment
+
+    async def render_system(self, template_name: str, character_name: str, persona_lore: str = "") -> str:
+        """The static system block (first part of every prompt for this character)."""
+        return await self._render_cached(template_name, character_name=character_name, persona_lore=persona_lore)
 
-    async def build_prompt(self, template_name: str, **kwargs) -> str:
+    async def build_prompt(
+        self,
+        template_name: str,
+        character_name: str,
+        context_data: Dict,
+        user_input: str,
+        persona_lore: str = "",
+        turn_template: str = "llama3_turn.j2",
+    ) -> str:
         """
-        Renders template asynchronously. 
-        Crucial when 'context_data' becomes large (RAG results).
+        template_name renders the static system block; turn_template renders
+        one message. context_data holds 'history' (list of role/content dicts),
+        'lore' (text retrieved for this turn) and optionally 'summary' (rolling
+        summary of turns folded out of the history).
         """
         try:
-            template = self.env.get_template(template_name)
-            # OPTIMIZATION: render_async yields to event loop
-            return await template.render_async(**kwargs)
+            parts = [await self.render_system(template_name, character_name, persona_lore)]
+
+            # Changes only when old turns are compacted, so it sits before the history
+            summary: Optional[str] = context_data.get("summary")
+            if summary:
+                parts.append(await self._render_cached(turn_template, role="system", content=f"{SUMMARY_PREFIX}{summary}"))
+
+            history: List[Dict[str, str]] = context_data.get("history", [])
+            # The current user message may already have been written to history
+            if history and history[-1].get("role") == "user" and history[-1].get("content") == user_input:
+                history = history[:-1]
+            for msg in history:
+                parts.append(await self._render_cached(turn_template, role=msg["role"], content=msg["content"]))
+
+            # Retrieval results change every turn, so they sit after the history
+            lore: Optional[str] = context_data.get("lore")
+            if lore:
+                parts.append(await self._render_cached(turn_template, role="system", content=f"{LORE_PREFIX}{lore}"))
+
+            parts.append(await self._render_cached(turn_template, role="user", content=user_input))
+            parts.append(ASSISTANT_HEADER)
+            return "".join(parts)
         except Exception as e:
-            raise ValueError(f"Error rendering template {template_name}: {str(e)}")
\ No newline at end of file
+            raise ValueError(f"Error rendering template {template_name}: {str(e)}")
+
+    async def build_summary_prompt(
+        self, messages: List[Dict[str, str]], previous_summary: str = "", template_name: str = "llama3_summary.j2"
+    ) -> str:
+        """Prompt for folding `messages` into the rolling summary (not cached: rendered once)."""
+        template = self.env.get_template(template_name)
+        return await template.render_async(messages=messages, previous_summary=previous_summary)
+
+    def stats(self) -> dict:
+        return {
+            "cached_fragments": len(self._fragments),
+            "fragment_hits": self.fragment_hits,
+            "fragment_misses": self.fragment_misses,
+        }
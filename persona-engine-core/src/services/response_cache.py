@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import re
+import time
+import logging
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+import redis.asyncio as redis
+
+from src.core.config import settings
+
+logger = logging.getLogger("uvicorn")
+
+_PUNCT = re.compile(r"[^\w\s]", re.UNICODE)
+_SPACES = re.compile(r"\s+")
+# Token-sized pieces (leading whitespace + up to 4 chars) for replay
+_REPLAY_CHUNK = re.compile(r"\s*\S{1,4}|\s+")
+
+class ResponseCache:
+    """
+    Semantic cache of full completions for conversation openers.
+
+    Key: char_id + normalized prompt + a digest of the conversation the prompt
+    carries (prior messages and summary; see `scope`), so a reply that depends
+    on one user's earlier turns is only ever served for that same conversation.
+    Openers with no prior history may also fall back to the nearest cached
+    opener by embedding cosine similarity. Entries live in
+    Redis with a TTL; each character keeps at most `max_entries` completions,
+    evicted least-recently-used. Hits are replayed as a token-like stream so
+    they go through the same output monitor / TokenBuffer path as vLLM output.
+
+    Redis layout per character:
+        resp:{char_id}:e:{digest}   completion text (TTL)
+        resp:{char_id}:lru          zset digest -> last access time
+        resp:{char_id}:vec          hash digest -> float16 prompt embedding (openers only)
+    """
+    def __init__(
+        self,
+        redis_client: redis.Redis,
+        embedder: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+        ttl_seconds: int = settings.RESPONSE_CACHE_TTL_SECONDS,
+        max_entries: int = settings.RESPONSE_CACHE_MAX_ENTRIES,
+        similarity_threshold: float = settings.RESPONSE_CACHE_SIMILARITY,
+        max_history_messages: int = settings.RESPONSE_CACHE_MAX_HISTORY,
+        replay_interval_ms: float = settings.RESPONSE_CACHE_REPLAY_INTERVAL_MS,
+    ):
+        self.redis = redis_client
+        self.embedder = embedder
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self.max_history_messages = max_history_messages
+        self.replay_interval = replay_interval_ms / 1000
+
+        # Metrics
+        self.lookups = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.ineligible = 0
+        self.stores = 0
+        self.evictions = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """'Hi!!  Who are you?' -> 'hi who are you'"""
+        return _SPACES.sub(" ", _PUNCT.sub(" ", text.lower())).strip()
+
+    @staticmethod
+    def _digest(normalized: str, scope: str = "") -> str:
+        return hashlib.blake2b(f"{scope}\x00{normalized}".encode(), digest_size=16).hexdigest()
+
+    @staticmethod
+    def _prior(history: List[Dict[str, str]], user_input: str) -> List[Dict[str, str]]:
+        """History before this turn (the current input may already be written to it)."""
+        if history and history[-1].get("role") == "user" and history[-1].get("content") == user_input:
+            return history[:-1]
+        return history
+
+    def eligible(self, history: List[Dict[str, str]], user_input: str) -> bool:
+        """Only openers qualify: short prior history, non-empty input."""
+        if len(self._prior(history, user_input)) > self.max_history_messages or not self.normalize(user_input):
+            self.ineligible += 1
+            return False
+        return True
+
+    def scope(self, history: List[Dict[str, str]], user_input: str, summary: Optional[str] = None) -> str:
+        """
+        Digest of everything user-specific the prompt carries besides the input:
+        prior messages and the rolling summary. "" for a fresh conversation, so
+        true openers are shared across users.
+        """
+        prior = self._prior(history, user_input)
+        if not prior and not summary:
+            return ""
+        h = hashlib.blake2b(digest_size=16)
+        h.update((summary or "").encode())
+        for message in prior:
+            h.update(f"\x00{message.get('role')}\x01{message.get('content')}".encode())
+        return h.hexdigest()
+
+    async def lookup(self, char_id: str, user_input: str, scope: str = "") -> Optional[str]:
+        self.lookups += 1
+        digest = self._digest(self.normalize(user_input), scope)
+        prefix = f"resp:{char_id}"
+
+        cached = await self.redis.get(f"{prefix}:e:{digest}")
+        if cached is not None:
+            self.exact_hits += 1
+            await self.redis.zadd(f"{prefix}:lru", {digest: time.time()})
+            return cached.decode("utf-8")
+
+        if self.embedder is None or scope:
+            return None # Nearest-prompt matching ignores history: openers only
+        match = await self._nearest(prefix, user_input)
+        if match is None:
+            return None
+        cached = await self.redis.get(f"{prefix}:e:{match}")
+        if cached is None:
+            # Entry expired but its vector survived: drop the stale vector
+            await self.redis.hdel(f"{prefix}:vec", match)
+            return None
+        self.semantic_hits += 1
+        await self.redis.zadd(f"{prefix}:lru", {match: time.time()})
+        return cached.decode("utf-8")
+
+    async def _nearest(self, prefix: str, user_input: str) -> Optional[str]:
+        vectors = await self.redis.hgetall(f"{prefix}:vec")
+        if not vectors:
+            return None
+        query = np.asarray(await self.embedder(user_input), dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        digests = list(vectors.keys())
+        matrix = np.frombuffer(b"".join(vectors.values()), dtype=np.float16).reshape(len(digests), -1)
+        scores = matrix.astype(np.float32) @ query
+        best = int(np.argmax(scores))
+        if scores[best] < self.similarity_threshold:
+            return None
+        return digests[best].decode()
+
+    async def store(self, char_id: str, user_input: str, completion: str, scope: str = ""):
+        digest = self._digest(self.normalize(user_input), scope)
+        prefix = f"resp:{char_id}"
+
+        vector = None
+        if self.embedder is not None and not scope:
+            vector = np.asarray(await self.embedder(user_input), dtype=np.float32)
+            vector /= np.linalg.norm(vector) or 1.0
+
+        async with self.redis.pipeline() as pipe:
+            pipe.set(f"{prefix}:e:{digest}", completion.encode("utf-8"), ex=self.ttl)
+            pipe.zadd(f"{prefix}:lru", {digest: time.time()})
+            pipe.expire(f"{prefix}:lru", self.ttl)
+            if vector is not None:
+                pipe.hset(f"{prefix}:vec", digest, vector.astype(np.float16).tobytes())
+                pipe.expire(f"{prefix}:vec", self.ttl)
+            pipe.zcard(f"{prefix}:lru")
+            results = await pipe.execute()
+        self.stores += 1
+
+        overflow = results[-1] - self.max_entries
+        if overflow > 0:
+            evicted = [d for d, _ in await self.redis.zpopmin(f"{prefix}:lru", overflow)]
+            async with self.redis.pipeline() as pipe:
+                pipe.delete(*[f"{prefix}:e:{d.decode()}" for d in evicted])
+                pipe.hdel(f"{prefix}:vec", *evicted)
+                await pipe.execute()
+            self.evictions += len(evicted)
+
+    async def replay(self, completion: str) -> AsyncGenerator[str, None]:
+        """Streams a cached completion in token-sized pieces, like vLLM would."""
+        for piece in _REPLAY_CHUNK.findall(completion):
+            await asyncio.sleep(self.replay_interval)
+            yield piece
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        return {
+            "lookups": self.lookups,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "hit_rate": hits / self.lookups if self.lookups else 0.0,
+            "ineligible": self.ineligible,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Dict, Optional, Tuple
+
+from src.core.config import settings
+from src.memory.cache_manager import SessionHistory
+from src.memory.rag_engine import RagEngine
+
+logger = logging.getLogger("uvicorn")
+
+
+class TurnPipeline:
+    """
+    Input half of a chat turn: safety check, then memory and context.
+
+    The static guard runs first (microseconds) and its sanitized text starts
+    lore retrieval (embedding + Qdrant) speculatively while the neural scan,
+    jailbreak match and policy run, so the two latencies overlap instead of
+    adding up. Retrieval is read-only; the user message is only written to
+    history once the input is allowed. A blocked input cancels the speculative
+    retrieval.
+
+    Stage timings (ms) are returned per turn: `overlap_ms` is how much of the
+    retrieval ran under the safety check.
+    """
+    def __init__(
+        self,
+        safety_mesh,
+        rag_engine: RagEngine,
+        speculative: bool = settings.TURN_SPECULATIVE_RETRIEVAL,
+    ):
+        self.safety_mesh = safety_mesh
+        self.rag_engine = rag_engine
+        self.speculative = speculative
+
+        # Metrics
+        self.turns = 0
+        self.blocked = 0
+        self.speculations = 0
+        self.cancelled = 0 # Speculative retrievals dropped (blocked input or changed text)
+
+    @staticmethod
+    async def _timed(spans: Dict[str, Tuple[float, float]], stage: str, aw: Awaitable):
+        start = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            spans[stage] = (start, time.perf_counter())
+
+    async def _cancel(self, task: Optional[asyncio.Task]):
+        if task is not None and not task.done():
+            task.cancel()
+            self.cancelled += 1
+        if task is not None:
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def run(
+        self,
+        raw_text: str,
+        safety_context: dict,
+        session_id: str,
+        char_id: str,
+        reserved_tokens: int = 0,
+        session: Optional[SessionHistory] = None,
+    ) -> Dict[str, Any]:
+        """
+        Returns {"allowed", "reason", "text" (sanitized), "context" (prepare_context
+        result, None if blocked), "timings"}.
+        """
+        self.turns += 1
+        turn_start = time.perf_counter()
+        spans: Dict[str, Tuple[float, float]] = {}
+
+        # 1. Static stage: decides what the speculative retrieval searches for
+        prechecked = self.safety_mesh.precheck(raw_text)
+        spans["static"] = (turn_start, time.perf_counter())
+        safe_text, static_blocked, _ = prechecked
+
+        lore_task = None
+        if self.speculative and not static_blocked:
+            self.speculations += 1
+            lore_task = asyncio.create_task(
+                self._timed(spans, "lore", self.rag_engine.retrieve_lore(char_id, safe_text))
+            )
+
+        # 2. Neural scan + policy + audit, overlapping the retrieval
+        try:
+            safety = await self._timed(
+                spans, "safety", self.safety_mesh.check_input(raw_text, safety_context, prechecked=prechecked)
+            )
+        except BaseException:
+            await self._cancel(lore_task)
+            raise
+
+        if not safety["allowed"]:
+            self.blocked += 1
+            await self._cancel(lore_task)
+            return self._result(safety, None, spans, turn_start)
+
+        user_input = safety["text"]
+        if lore_task is not None and user_input != safe_text:
+            await self._cancel(lore_task) # Searched for different text: not reusable
+            lore_task = None
+
+        # 3. Memory write + context, only for allowed input
+        context = await self._timed(
+            spans, "context", self.rag_engine.prepare_context(
+                session_id, char_id, user_input,
+                reserved_tokens=reserved_tokens, session=session, lore=lore_task,
+            )
+        )
+        return self._result(safety, context, spans, turn_start)
+
+    @staticmethod
+    def _result(safety: dict, context: Optional[dict], spans: Dict[str, Tuple[float, float]], turn_start: float) -> dict:
+        timings = {f"{stage}_ms": (end - start) * 1000 for stage, (start, end) in spans.items()}
+        timings["total_ms"] = (time.perf_counter() - turn_start) * 1000
+        overlap = 0.0
+        if "lore" in spans and "safety" in spans:
+            (lore_start, lore_end), (safety_start, safety_end) = spans["lore"], spans["safety"]
+            overlap = max(0.0, min(lore_end, safety_end) - max(lore_start, safety_start))
+        timings["overlap_ms"] = overlap * 1000
+        return {
+            "allowed": safety["allowed"],
+            "reason": safety["reason"],
+            "text": safety["text"],
+            "context": context,
+            "timings": timings,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "blocked": self.blocked,
+            "speculations": self.speculations,
+            "cancelled": self.cancelled,
+        }
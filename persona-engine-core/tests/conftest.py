@@ -0,0 +1,80 @@
+import hashlib
+import re
+
+import numpy as np
+import pytest
+import pytest_asyncio
+from qdrant_client import AsyncQdrantClient
+
+import src.core.embeddings as embeddings
+import src.memory.vector_store as vector_store
+
+_WORD = re.compile(r"\w+")
+
+
+def _token_ids(text: str):
+    return sorted({int(hashlib.md5(w.encode()).hexdigest()[:6], 16) for w in _WORD.findall(text.lower())})
+
+
+class FakeSparseVector:
+    def __init__(self, indices, values):
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float32)
+
+
+class FakeDenseModel:
+    """Deterministic bag-of-words vectors: texts sharing words are close."""
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def embed(self, texts, **kwargs):
+        self.calls += 1
+        for text in texts:
+            vec = np.zeros(1024, dtype=np.float32)
+            for token in _token_ids(text):
+                vec[token % 1024] += 1.0
+            norm = np.linalg.norm(vec)
+            yield vec / norm if norm else vec
+
+
+class FakeSparseModel:
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def embed(self, texts, **kwargs):
+        self.calls += 1
+        for text in texts:
+            ids = _token_ids(text)
+            yield FakeSparseVector(ids, [1.0] * len(ids))
+
+
+class FakeRanker:
+    """Scores passages by word overlap with the query."""
+    def __init__(self, *args, **kwargs):
+        self.calls = 0
+
+    def rerank(self, request):
+        self.calls += 1
+        query = set(_WORD.findall(request.query.lower()))
+        ranked = []
+        for passage in request.passages:
+            overlap = len(query & set(_WORD.findall(passage["text"].lower())))
+            ranked.append({**passage, "score": overlap / (len(query) or 1)})
+        return sorted(ranked, key=lambda p: p["score"], reverse=True)
+
+
+@pytest.fixture
+def fake_models(monkeypatch):
+    """LoreStore with deterministic stand-in models and an in-memory Qdrant."""
+    monkeypatch.setattr(embeddings, "TextEmbedding", FakeDenseModel)
+    monkeypatch.setattr(embeddings, "SparseTextEmbedding", FakeSparseModel)
+    monkeypatch.setattr(vector_store, "Ranker", FakeRanker)
+    monkeypatch.setattr(vector_store, "AsyncQdrantClient", lambda **kwargs: AsyncQdrantClient(":memory:"))
+
+
+@pytest_asyncio.fixture
+async def lore_store(fake_models):
+    store = vector_store.LoreStore()
+    yield store
+    store.close()
+    await store.client.close()
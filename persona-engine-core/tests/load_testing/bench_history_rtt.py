@@ -0,0 +1,128 @@
+"""
+Redis round trips per chat turn, compaction check included: legacy history
+path vs the atomic append script.
+
+    python -m tests.load_testing.bench_history_rtt                 # fakeredis + simulated RTT
+    python -m tests.load_testing.bench_history_rtt --redis-url redis://localhost:6379 --rtt-ms 0
+
+Legacy turn:  LRANGE history + HGETALL summary + pipelined user append   (before the prompt)
+              + pipelined assistant append                              (after streaming)
+              + LRANGE for the summarizer's trigger check               (after the turn)
+Atomic turn:  APPEND_SCRIPT(user) returning the history                 (before the prompt)
+              + APPEND_SCRIPT(assistant) returning the history          (after streaming)
+              + trigger check on that history, no Redis call            (after the turn)
+
+Measured: 5 -> 2 round trips per turn, 3 -> 1 before the prompt. The legacy
+path issues its three pre-prompt calls concurrently, so the wall-time gain
+with a uniform simulated RTT comes mostly from the compaction read; the
+pre-prompt saving shows up as fewer in-flight commands per turn, not as
+lower single-turn latency. Turns stay below the summary trigger here (the
+common case); folds are off-path LLM calls either way.
+"""
+import argparse
+import asyncio
+import time
+
+import orjson
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from src.memory.cache_manager import CacheManager
+from src.memory.summarizer import ConversationSummarizer
+
+
+class RoundTripMeter:
+    """Counts round trips and adds a fixed simulated network latency to each."""
+    def __init__(self, client, rtt_ms: float):
+        self.count = 0
+        self.rtt = rtt_ms / 1000
+        execute_command = client.execute_command
+        pipeline_execute = Pipeline.execute
+
+        async def command(*args, **kwargs):
+            self.count += 1
+            await asyncio.sleep(self.rtt)
+            return await execute_command(*args, **kwargs)
+
+        async def pipeline(pipe, *args, **kwargs):
+            self.count += 1
+            await asyncio.sleep(self.rtt)
+            return await pipeline_execute(pipe, *args, **kwargs)
+
+        client.execute_command = command
+        Pipeline.execute = pipeline
+
+
+async def legacy_turn(cache: CacheManager, summarizer, meter: RoundTripMeter, session_id: str, i: int) -> int:
+    """
+    The pre-script path (user append was fire-and-forget, so it raced the read),
+    followed by the compaction check that re-read the whole list every turn.
+    """
+    key = f"session:{session_id}"
+
+    async def append(role, content):
+        async with cache.redis.pipeline() as pipe:
+            pipe.rpush(key, orjson.dumps(cache.encode_message(role, content)))
+            pipe.ltrim(key, -cache.max_messages, -1)
+            pipe.expire(key, cache.ttl)
+            await pipe.execute()
+
+    raw, _, _ = await asyncio.gather(
+        cache.redis.lrange(key, 0, -1), cache.redis.hgetall(f"{key}:summary"), append("user", f"question {i}")
+    )
+    history = [orjson.loads(m) for m in raw]
+    before_prompt = meter.count
+    await append("assistant", f"answer {i}")
+    await summarizer.compact(session_id)  # LRANGE + decode, below the trigger
+    return before_prompt
+
+
+async def atomic_turn(session, summarizer, meter: RoundTripMeter, i: int) -> int:
+    await session.add("user", f"question {i}")
+    before_prompt = meter.count
+    history, _ = await session.add("assistant", f"answer {i}")
+    task = summarizer.schedule(session.session_id, history)
+    if task is not None:
+        await task
+    return before_prompt
+
+
+async def main(args):
+    if args.redis_url:
+        client = redis.from_url(args.redis_url)
+    else:
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis()
+    cache = CacheManager(client=client)
+    # Never folds: measures the per-turn trigger check, not the (off-path) LLM call
+    summarizer = ConversationSummarizer(cache, inference=None, prompts=None, trigger_tokens=10**9, trigger_messages=10**9)
+    session = cache.session("bench:atomic")
+    await session.add("user", "warm up")  # Loads the script
+    await client.delete("session:bench:legacy", "session:bench:atomic", "session:bench:atomic:ver")
+
+    meter = RoundTripMeter(client, args.rtt_ms)
+    for name, run in (
+        ("legacy", lambda i: legacy_turn(cache, summarizer, meter, "bench:legacy", i)),
+        ("atomic", lambda i: atomic_turn(session, summarizer, meter, i)),
+    ):
+        critical = 0
+        elapsed = 0.0
+        for i in range(args.turns):
+            meter.count = 0
+            start = time.perf_counter()
+            critical += await run(i)
+            elapsed += time.perf_counter() - start
+        per_turn = meter.count  # Reset every turn; all turns are alike
+        print(
+            f"{name:>7}: {per_turn} round trips/turn ({critical / args.turns:.0f} before the prompt) | "
+            f"{elapsed / args.turns * 1000:.2f} ms/turn (simulated RTT {args.rtt_ms} ms)"
+        )
+    await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--rtt-ms", type=float, default=0.5)
+    parser.add_argument("--redis-url")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,166 @@
+import asyncio
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.db.account_cache import AccountCache
+from src.db.models import Base, Tenant, User
+
+
+class CountingSessions:
+    """Session factory that counts how often the cache reaches the database."""
+    def __init__(self, factory):
+        self.factory = factory
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self.factory()
+
+
+@pytest_asyncio.fixture
+async def db():
+    pytest.importorskip("aiosqlite")
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with factory() as session:
+        session.add_all([
+            Tenant(id="acme", name="Acme", plan_tier="pro"),
+            User(id="alice", tenant_id="acme", email="alice@acme.test"),
+            User(id="bob", tenant_id="acme", email="bob@acme.test"),
+        ])
+        await session.commit()
+    yield factory
+    await engine.dispose()
+
+
+async def execute(factory, statement):
+    async with factory() as session:
+        await session.execute(statement)
+        await session.commit()
+
+
+async def wait_for(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_read_through_with_negative_caching(db):
+    sessions = CountingSessions(db)
+    accounts = AccountCache(sessions, fakeredis.FakeAsyncRedis())
+
+    results = await asyncio.gather(*(accounts.get("alice") for _ in range(20)))
+    assert {(a.tenant_id, a.tier, a.active) for a in results} == {("acme", "pro", True)}
+    assert sessions.opened == 1  # Concurrent misses share one query
+
+    for _ in range(100):
+        assert (await accounts.get("alice")).tier == "pro"
+        assert await accounts.get("mallory") is None
+    bob = await accounts.get("bob")
+    assert bob.tier == "pro"
+
+    # alice (with tenant), mallory once (negative entry), bob (tenant already cached)
+    assert sessions.opened == 3
+    assert accounts.stats()["hits"] >= 100
+
+
+@pytest.mark.asyncio
+async def test_entries_expire(db):
+    sessions = CountingSessions(db)
+    accounts = AccountCache(sessions, fakeredis.FakeAsyncRedis(), ttl_seconds=0.05, negative_ttl_seconds=0.05)
+
+    await accounts.get("alice")
+    await accounts.get("mallory")
+    await execute(db, update(Tenant).where(Tenant.id == "acme").values(plan_tier="enterprise"))
+    await asyncio.sleep(0.06)
+
+    assert (await accounts.get("alice")).tier == "enterprise"
+    await accounts.get("mallory")
+    assert sessions.opened == 4
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_every_worker(db):
+    shared = fakeredis.FakeAsyncRedis()
+    workers = [AccountCache(db, shared) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    await asyncio.sleep(0.05)  # Let both subscribe
+
+    for worker in workers:
+        assert (await worker.get("alice")).active
+
+    # Ban alice and upgrade the tenant, then notify once from one worker
+    await execute(db, update(User).where(User.id == "alice").values(is_active=False))
+    await execute(db, update(Tenant).where(Tenant.id == "acme").values(plan_tier="enterprise"))
+    await workers[0].invalidate_user("alice")
+    await workers[0].invalidate_tenant("acme")
+    await wait_for(lambda: workers[1].stats()["invalidations"] >= 2)
+
+    for worker in workers:
+        alice = await worker.get("alice")
+        assert not alice.active and alice.tier == "enterprise"
+        assert (await worker.get("bob")).tier == "enterprise"
+
+    for worker in workers:
+        await worker.aclose()
+
+
+@pytest.mark.asyncio
+async def test_database_errors_fall_back_to_claims():
+    def broken():
+        raise ConnectionRefusedError("postgres is down")
+
+    accounts = AccountCache(broken, fakeredis.FakeAsyncRedis())
+    assert await accounts.get("alice") is None
+    assert accounts.stats()["entries"] == 0  # Failures are not cached
+
+
+class HangingSessions:
+    """Database that never answers (e.g. Postgres down, connect timing out)."""
+    def __init__(self):
+        self.opened = 0
+
+    def __call__(self):
+        self.opened += 1
+        return self
+
+    async def __aenter__(self):
+        await asyncio.sleep(3600)
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+@pytest.mark.asyncio
+async def test_outage_costs_one_timeout_then_backs_off():
+    sessions = HangingSessions()
+    accounts = AccountCache(
+        sessions, fakeredis.FakeAsyncRedis(), lookup_timeout_seconds=0.05, failure_backoff_seconds=0.2
+    )
+    loop = asyncio.get_running_loop()
+
+    start = loop.time()
+    assert await accounts.get("alice") is None
+    assert loop.time() - start < 1.0
+
+    # Other users fall back immediately instead of waiting on the database again
+    assert await accounts.get("bob") is None
+    assert sessions.opened == 1
+    assert accounts.stats()["backoff_skips"] == 1
+
+    await asyncio.sleep(0.25)
+    assert await accounts.get("bob") is None
+    assert sessions.opened == 2  # Retried once the backoff expired
+    assert accounts.stats()["failures"] == 2
+    for future in list(accounts._inflight.values()):
+        future.cancel()
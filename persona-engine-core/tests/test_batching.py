@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.core.batching import MicroBatcher
+
+
+class RecordingModel:
+    """Stand-in for a CPU-bound model: records batch sizes and the calling thread."""
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches = []
+        self.threads = set()
+
+    def __call__(self, items):
+        self.threads.add(threading.get_ident())
+        self.batches.append(list(items))
+        time.sleep(self.delay)
+        return [item.upper() for item in items]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submits_are_coalesced():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=32, max_wait_ms=50)
+
+    texts = [f"msg{i}" for i in range(10)]
+    results = await asyncio.gather(*(batcher.submit(t) for t in texts))
+
+    assert results == [t.upper() for t in texts]
+    assert len(model.batches) == 1
+    assert threading.get_ident() not in model.threads
+    stats = batcher.stats()
+    assert stats["items"] == 10
+    assert stats["batch_size_histogram"] == {10: 1}
+    batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_max_batch_size_is_respected():
+    model = RecordingModel()
+    batcher = MicroBatcher(model, max_batch_size=4, max_wait_ms=50)
+
+    await asyncio.gather(*(batcher.submit(f"m{i}") for i in range(10)))
+
+    assert max(len(b) for b in model.batches) <= 4
+    assert sum(len(b) for b in model.batches) == 10
+    batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_event_loop_is_not_blocked_by_inference():
+    batcher = MicroBatcher(RecordingModel(delay=0.2), max_wait_ms=1)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    tick_task = asyncio.create_task(ticker())
+    await batcher.submit("slow")
+    tick_task.cancel()
+
+    assert ticks >= 10
+    batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_batch_failure_propagates_to_every_caller():
+    def broken(items):
+        raise ValueError("onnx exploded")
+
+    batcher = MicroBatcher(broken, max_wait_ms=20)
+    results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"), return_exceptions=True)
+
+    assert all(isinstance(r, ValueError) for r in results)
+    batcher.close()
+
+
+@pytest.mark.asyncio
+async def test_closed_caller_loop_does_not_stop_the_worker():
+    model = RecordingModel(delay=0.05)
+    batcher = MicroBatcher(model, max_wait_ms=1)
+    await batcher.submit("warm")
+
+    # A caller whose loop was closed while its item was queued
+    dead_loop = asyncio.new_event_loop()
+    future = dead_loop.create_future()
+    dead_loop.close()
+    batcher._queue.put(("orphan", future, dead_loop))
+
+    assert await batcher.submit("after") == "AFTER"
+    # Recorded before the result is delivered
+    assert batcher.stats()["items"] == 3
+    batcher.close()
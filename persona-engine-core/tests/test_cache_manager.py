@@ -0,0 +1,130 @@
+import fakeredis
+import orjson
+import pytest
+import redis.asyncio.client
+
+import src.memory.cache_manager as cache_manager_module
+from src.memory.cache_manager import CacheManager
+
+
+class DecodeCounter:
+    def __init__(self):
+        self.loads_calls = 0
+        self.dumps = orjson.dumps
+
+    def loads(self, data):
+        self.loads_calls += 1
+        return orjson.loads(data)
+
+
+@pytest.fixture
+def decodes(monkeypatch):
+    counter = DecodeCounter()
+    monkeypatch.setattr(cache_manager_module, "orjson", counter)
+    return counter
+
+
+class RoundTrips:
+    """Counts client round trips (single commands, pipelines and script calls)."""
+    def __init__(self, client, monkeypatch):
+        self.count = 0
+        execute_command = client.execute_command
+        pipeline_execute = redis.asyncio.client.Pipeline.execute
+
+        async def counted_command(*args, **kwargs):
+            self.count += 1
+            return await execute_command(*args, **kwargs)
+
+        async def counted_pipeline(pipe, *args, **kwargs):
+            self.count += 1
+            return await pipeline_execute(pipe, *args, **kwargs)
+
+        monkeypatch.setattr(client, "execute_command", counted_command)
+        monkeypatch.setattr(redis.asyncio.client.Pipeline, "execute", counted_pipeline)
+
+
+@pytest.mark.asyncio
+async def test_own_writes_are_read_back_without_decoding(decodes):
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis())
+    session = cache.session("s1")
+    await cache.add_message("s1", "user", "hello")
+
+    history, _ = await session.add("user", "question")
+    assert [m["content"] for m in history] == ["hello", "question"]
+    decoded = decodes.loads_calls
+
+    for i in range(5):
+        await session.add("assistant", f"answer {i}")
+        history, _ = await session.add("user", f"question {i}")
+    assert history == await session.get()
+
+    assert decodes.loads_calls == decoded
+    assert history == await cache.get_history("s1")
+    assert session.stats() == {"hits": 11, "reloads": 1, "messages": 12}
+
+
+@pytest.mark.asyncio
+async def test_each_write_is_one_round_trip(monkeypatch):
+    client = fakeredis.FakeAsyncRedis()
+    cache = CacheManager(client=client)
+    session = cache.session("s1")
+    await session.add("user", "warm up")  # Loads the script (EVALSHA miss + SCRIPT LOAD)
+    trips = RoundTrips(client, monkeypatch)
+
+    history, summary = await session.add("user", "hi")
+    assert trips.count == 1
+    assert [m["content"] for m in history] == ["warm up", "hi"] and summary is None
+
+    await session.add("assistant", "hello")
+    assert trips.count == 2
+
+
+@pytest.mark.asyncio
+async def test_two_tabs_on_one_session_stay_consistent():
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis())
+    cache.max_messages = 6
+    tab_a, tab_b = cache.session("shared"), cache.session("shared")
+    await tab_a.get()
+    await tab_b.get()
+
+    for i in range(4):
+        await tab_a.add("user", f"a{i}")
+        assert await tab_b.get() == await cache.get_history("shared")
+        await tab_b.add("user", f"b{i}")
+        assert await tab_a.get() == await cache.get_history("shared")
+
+    # Both mirrors honour the server-side trim
+    assert [m["content"] for m in await tab_a.get()] == ["a1", "b1", "a2", "b2", "a3", "b3"]
+    assert tab_a.stats()["reloads"] > 1 and tab_b.stats()["reloads"] > 1
+
+
+@pytest.mark.asyncio
+async def test_compaction_invalidates_mirrors():
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis())
+    session = cache.session("s1")
+    for i in range(4):
+        await session.add("user", f"m{i}")
+    await session.get()
+
+    raw = await cache.get_raw_history("s1")
+    assert await cache.fold_history("s1", raw[:2], "They said hi twice.", 9, version=0)
+
+    history, summary = await session.load()
+    assert [m["content"] for m in history] == ["m2", "m3"]
+    assert summary["content"] == "They said hi twice."
+
+
+@pytest.mark.asyncio
+async def test_versions_are_not_reused_after_expiry():
+    client = fakeredis.FakeAsyncRedis()
+    cache = CacheManager(client=client)
+    tab_a, tab_b = cache.session("s1"), cache.session("s1")
+    await tab_a.add("user", "old")
+    await tab_a.get()
+
+    # The session idles out, then another tab starts it again with one write
+    await client.delete("session:s1", "session:s1:summary", "session:s1:ver")
+    await tab_b.add("user", "new")
+
+    # Same number of writes as tab_a saw, but a different version: tab_a reloads
+    assert [m["content"] for m in await tab_a.get()] == ["new"]
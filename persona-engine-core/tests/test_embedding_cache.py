@@ -0,0 +1,101 @@
+from types import SimpleNamespace
+
+import fakeredis
+import numpy as np
+import pytest
+
+from src.memory.embedding_cache import (
+    EmbeddingCache, pack_dense, unpack_dense, pack_sparse, unpack_sparse,
+)
+
+
+class CountingModel:
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.calls = []
+
+    def dense(self, texts):
+        self.calls.append(list(texts))
+        rng = [np.random.default_rng(abs(hash(t)) % 2**32) for t in texts]
+        return [r.standard_normal(self.dim).astype(np.float32) for r in rng]
+
+    def sparse(self, texts):
+        self.calls.append(list(texts))
+        return [SimpleNamespace(indices=np.array([3, 70, 2000]), values=np.array([0.5, 1.25, 0.1])) for _ in texts]
+
+
+def test_compact_encodings_round_trip():
+    vector = np.random.default_rng(0).standard_normal(1024).astype(np.float32)
+
+    f16 = pack_dense(vector)
+    assert len(f16) == 1 + 1024 * 2
+    assert np.allclose(unpack_dense(f16), vector, atol=1e-2)
+
+    i8 = pack_dense(vector, "int8")
+    assert len(i8) == 1 + 4 + 1024
+    assert np.corrcoef(unpack_dense(i8), vector)[0, 1] > 0.999
+
+    indices, values = unpack_sparse(pack_sparse(np.array([1, 5, 90000]), np.array([0.25, 0.5, 2.0])))
+    assert indices.tolist() == [1, 5, 90000]
+    assert values.tolist() == [0.25, 0.5, 2.0]
+
+
+@pytest.mark.asyncio
+async def test_only_misses_are_computed_and_redis_tier_is_shared():
+    redis_client = fakeredis.FakeAsyncRedis()
+    model = CountingModel()
+    worker_a = EmbeddingCache(redis_client)
+
+    first = await worker_a.get_dense("e5", ["hi", "hello", "hi"], model.dense)
+    assert model.calls == [["hi", "hello"]]
+    assert np.allclose(first[0], first[2])
+
+    await worker_a.get_dense("e5", ["hi", "who are you"], model.dense)
+    assert model.calls[-1] == ["who are you"]
+    assert worker_a.local_hits == 1
+
+    # A second worker finds everything in Redis and never touches the model
+    worker_b = EmbeddingCache(redis_client)
+    await worker_b.get_dense("e5", ["hi", "hello", "who are you"], model.dense)
+    assert len(model.calls) == 2
+    assert worker_b.redis_hits == 3
+
+
+@pytest.mark.asyncio
+async def test_model_id_is_part_of_the_key():
+    model = CountingModel()
+    cache = EmbeddingCache()
+
+    await cache.get_sparse("splade", ["hi"], model.sparse)
+    await cache.get_dense("e5", ["hi"], model.dense)
+
+    assert len(model.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_local_tier_is_bounded_by_bytes():
+    model = CountingModel(dim=512)
+    cache = EmbeddingCache(max_bytes=10 * (1 + 512 * 2))
+
+    await cache.get_dense("e5", [f"text {i}" for i in range(25)], model.dense)
+
+    stats = cache.stats()
+    assert stats["local_entries"] == 10
+    assert stats["local_bytes"] <= cache.max_bytes
+    assert stats["evictions"] == 15
+
+
+@pytest.mark.asyncio
+async def test_redis_outage_falls_back_to_local_tier_and_compute():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    model = CountingModel()
+    cache = EmbeddingCache(fakeredis.FakeAsyncRedis(server=server))
+
+    first = await cache.get_dense("e5", ["hi", "hello"], model.dense)
+    again = await cache.get_dense("e5", ["hi"], model.dense)
+
+    assert model.calls == [["hi", "hello"]]
+    assert np.allclose(first[0], again[0])
+    assert cache.local_hits == 1
+    assert cache.stats()["redis_errors"] == 2  # First lookup and its store
@@ -0,0 +1,89 @@
+import asyncio
+import tracemalloc
+
+import numpy as np
+import pytest
+
+import src.core.embeddings as embeddings
+from src.core.embeddings import EmbeddingService
+
+WEIGHTS = 16 * 1024 * 1024  # Stand-in for a model's ONNX weights
+
+
+class HeavyModel:
+    """Allocates its 'weights' so tracemalloc sees the footprint of each copy."""
+    instances = 0
+
+    def __init__(self, *args, threads=None, **kwargs):
+        HeavyModel.instances += 1
+        self.threads = threads
+        self.weights = np.ones(WEIGHTS // 4, dtype=np.float32)
+        self.calls = []
+
+    def embed(self, texts, **kwargs):
+        self.calls.append(len(texts))
+        for text in texts:
+            yield self.weights[:8] * len(text)
+
+
+@pytest.fixture
+def heavy_models(monkeypatch):
+    HeavyModel.instances = 0
+    monkeypatch.setattr(embeddings, "TextEmbedding", HeavyModel)
+    monkeypatch.setattr(embeddings, "SparseTextEmbedding", HeavyModel)
+
+
+def test_one_copy_per_model_memory_report(heavy_models):
+    # Before: LoreStore.embedding_model, LoreStore.dense_model and JailbreakScanner.embedder
+    tracemalloc.start()
+    separate = [HeavyModel(), HeavyModel(), HeavyModel()]
+    before, _ = tracemalloc.get_traced_memory()
+    del separate
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    holders = [EmbeddingService.acquire("e5") for _ in range(3)]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    assert len({id(h) for h in holders}) == 1
+    assert after < before / 2, f"embedding model memory: before {before / 2**20:.1f} MiB, after {after / 2**20:.1f} MiB"
+
+    for holder in holders[:2]:
+        holder.release()
+    assert EmbeddingService.loaded() == ["dense:e5"]
+    holders[2].release()
+    assert EmbeddingService.loaded() == []  # Last release unloads
+
+
+def test_models_are_keyed_by_kind_and_name(heavy_models):
+    services = [
+        EmbeddingService.acquire("e5"),
+        EmbeddingService.acquire("e5", kind="sparse"),
+        EmbeddingService.acquire("other"),
+    ]
+    assert HeavyModel.instances == 3
+    for service in services:
+        service.release()
+
+    # ONNX thread budget: 0 leaves onnxruntime's default
+    assert EmbeddingService("e5", threads=2).model.threads == 2
+    assert EmbeddingService("e5", threads=0).model.threads is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_batches(heavy_models):
+    lore = EmbeddingService.acquire("e5")
+    scanner = EmbeddingService.acquire("e5")
+    lore.batcher.max_wait = 0.02
+
+    results = await asyncio.gather(
+        *(lore.embed([f"lore query {i}"]) for i in range(10)),
+        *(scanner.embed([f"jailbreak check {i}"]) for i in range(10)),
+    )
+
+    assert [r[0][0] for r in results[:2]] == [len("lore query 0"), len("lore query 1")]
+    assert sum(lore.model.calls) == 20 and len(lore.model.calls) < 20
+    assert lore.stats()["avg_batch_size"] > 1
+    lore.release()
+    scanner.release()
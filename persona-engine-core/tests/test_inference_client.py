@@ -0,0 +1,145 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from src.services.inference_client import InferenceClient
+
+
+class MockVLLM:
+    """Minimal OpenAI-compatible streaming server (GET /v1/models, POST /v1/completions)."""
+    def __init__(self, name: str, tokens: int = 5, delay: float = 0.0, status: int = 200):
+        self.name = name
+        self.tokens = tokens
+        self.delay = delay
+        self.status = status
+        self.completions = 0
+        self.in_flight = 0
+        self.server = None
+        self.url = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/v1"
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            headers = {}
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                key, _, value = line.decode().partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get("content-length", 0)))
+            method, path, _ = request_line.decode().split(" ")
+
+            if method == "GET" and path.endswith("/models"):
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}")
+            elif self.status != 200:
+                writer.write(f"HTTP/1.1 {self.status} Error\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+            else:
+                self.completions += 1
+                self.in_flight += 1
+                json.loads(body)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+                for i in range(self.tokens):
+                    await asyncio.sleep(self.delay)
+                    chunk = {"choices": [{"text": f"{self.name}{i} "}]}
+                    writer.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    await writer.drain()
+                writer.write(b"data: [DONE]\n\n")
+                self.in_flight -= 1
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+async def collect(client: InferenceClient, session_id=None) -> str:
+    return "".join([t async for t in client.stream_chat("prompt", "req", session_id=session_id)])
+
+
+@pytest_asyncio.fixture
+async def servers():
+    started = [await MockVLLM(name).start() for name in ("a", "b", "c")]
+    yield started
+    for server in started:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_routes_to_least_outstanding_backend(servers):
+    for server in servers:
+        server.delay = 0.02
+    client = InferenceClient([s.url for s in servers])
+    async with client.lifespan():
+        await asyncio.gather(*(collect(client) for _ in range(9)))
+
+    assert [s.completions for s in servers] == [3, 3, 3]
+
+
+@pytest.mark.asyncio
+async def test_session_affinity_keeps_the_same_backend(servers):
+    client = InferenceClient([s.url for s in servers])
+    async with client.lifespan():
+        outputs = [await collect(client, session_id="session-1") for _ in range(5)]
+
+    assert len({o[0] for o in outputs}) == 1
+    assert sorted(s.completions for s in servers) == [0, 0, 5]
+
+
+@pytest.mark.asyncio
+async def test_fails_over_before_first_token(servers):
+    servers[0].status = 503
+    await servers[1].stop()  # connection refused
+    client = InferenceClient([s.url for s in servers])
+    async with client.lifespan():
+        output = await collect(client, session_id="s")
+
+    assert output.startswith("c0")
+    assert client.backends[0].failures == 1
+    assert servers[2].completions == 1
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_skips_failing_backend(servers):
+    servers[0].status = 500
+    client = InferenceClient([s.url for s in servers[:2]])
+    async with client.lifespan():
+        for _ in range(6):
+            await collect(client)
+
+    breaker = client.stats()[0]
+    assert breaker["breaker_open"]
+    # Once open, no more requests are sent to the failing backend
+    assert breaker["failures"] == client.backends[0].failure_threshold
+    assert servers[1].completions == 6
+
+
+@pytest.mark.asyncio
+async def test_rejected_requests_do_not_trip_the_breaker(servers):
+    servers[0].status = 400  # e.g. prompt longer than the context window
+    client = InferenceClient([servers[0].url])
+    async with client.lifespan():
+        outputs = [await collect(client) for _ in range(6)]
+
+    assert all(o.startswith(" [Error:") for o in outputs)
+    breaker = client.stats()[0]
+    assert breaker["failures"] == 0
+    assert not breaker["breaker_open"]
+
+
+@pytest.mark.asyncio
+async def test_health_probe_marks_dead_backend(servers):
+    await servers[2].stop()
+    client = InferenceClient([s.url for s in servers])
+    async with client.lifespan():
+        await asyncio.sleep(0.2)
+        health = [b["healthy"] for b in client.stats()]
+
+    assert health == [True, True, False]
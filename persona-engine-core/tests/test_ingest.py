@@ -0,0 +1,105 @@
+import asyncio
+
+import orjson
+import pytest
+
+from src.memory.ingest import LoreIngestor, chunk_text, iter_blocks, iter_documents
+from src.memory.vector_store import lore_point_id
+
+
+def test_chunks_respect_size_and_overlap():
+    text = " ".join(f"Sentence number {i} about the Obsidian Spire." for i in range(60))
+    chunks = chunk_text(text, chunk_chars=200, overlap_chars=60)
+
+    assert all(len(c) <= 200 for c in chunks)
+    # Each chunk starts with the last sentence of the previous one
+    for prev, nxt in zip(chunks, chunks[1:]):
+        last_sentence = prev.rsplit(". ", 1)[-1]
+        assert nxt.startswith(last_sentence)
+
+    # Sentences longer than a chunk are hard-split; the overlap carry must not overflow
+    long_text = "Short one. " + "x" * 1000 + ". Another short one. " + "y" * 450
+    chunks = chunk_text(long_text, chunk_chars=200, overlap_chars=60)
+    assert max(len(c) for c in chunks) <= 200
+    assert "".join(chunks).count("x") >= 1000
+
+
+def test_markdown_is_read_in_heading_and_paragraph_blocks(tmp_path, monkeypatch):
+    source = tmp_path / "elara_bible.md"
+    sections = []
+    for s in range(5):
+        paragraphs = "\n\n".join(f"Fact {s}.{p}: Elara remembers the Spire." for p in range(40))
+        sections.append(f"## Chapter {s}\n\n{paragraphs}\n")
+    source.write_text("\n".join(sections), encoding="utf-8")
+    monkeypatch.setattr(type(source), "read_text", lambda *a, **k: pytest.fail("read whole"))
+
+    blocks = [text for _, text in iter_documents(source, "elara")]
+    assert [b.startswith("## Chapter") for b in blocks] == [True] * 5  # One block per section
+    assert "".join(blocks) == source.open(encoding="utf-8").read()
+
+    # Long sections are packed paragraph by paragraph up to the block size
+    small = list(iter_blocks(source.open(encoding="utf-8"), block_chars=300))
+    assert max(len(b) for b in small) <= 300 and len(small) > 20
+    assert all(b.rstrip("\n").endswith("Spire.") for b in small)
+    # A single paragraph over the limit is cut at line boundaries
+    assert [len(b) for b in iter_blocks(["x" * 9 + "\n"] * 25, block_chars=100)] == [100, 100, 50]
+
+
+def test_point_ids_are_content_hashes():
+    assert lore_point_id("elara", "She hates spiders.") == lore_point_id("elara", "She hates spiders.")
+    assert lore_point_id("elara", "She hates spiders.") != lore_point_id("mira", "She hates spiders.")
+
+
+def write_bible(path, records: int):
+    with open(path, "wb") as f:
+        for i in range(records):
+            f.write(orjson.dumps({"text": f"Lore fact {i}: Elara remembers event {i}."}) + b"\n")
+
+
+@pytest.mark.asyncio
+async def test_bulk_ingest_is_batched_and_idempotent(lore_store, tmp_path):
+    source = tmp_path / "bible.jsonl"
+    write_bible(source, 100)
+
+    stats = await LoreIngestor(lore_store, batch_size=16, concurrency=3).ingest(str(source), "elara")
+    assert stats["chunks_written"] == 100
+    # 7 batches -> at most 7 model calls, not 100 (concurrent batches may share one)
+    assert lore_store.dense.model.calls <= 7
+
+    # Re-running overwrites the same points instead of duplicating them
+    await LoreIngestor(lore_store, batch_size=16, concurrency=3).ingest(str(source), "elara")
+    assert (await lore_store.client.count(lore_store.collection_name)).count == 100
+
+
+class FlakyStore:
+    def __init__(self, fail_on_batch: int):
+        self.fail_on_batch = fail_on_batch
+        self.calls = 0
+        self.written = []
+
+    async def add_lore_batch(self, batch):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.calls == self.fail_on_batch:
+            raise ConnectionError("qdrant went away")
+        self.written.extend(text for _, text in batch)
+        return len(batch)
+
+
+@pytest.mark.asyncio
+async def test_interrupted_ingest_resumes_from_checkpoint(tmp_path):
+    source = tmp_path / "bible.jsonl"
+    checkpoint = str(tmp_path / "ckpt")
+    write_bible(source, 50)
+
+    store = FlakyStore(fail_on_batch=3)
+    with pytest.raises(ConnectionError):
+        await LoreIngestor(store, batch_size=10, concurrency=1, checkpoint_path=checkpoint).ingest(str(source), "elara")
+    assert len(store.written) == 20
+
+    resumed = LoreIngestor(store, batch_size=10, concurrency=1, checkpoint_path=checkpoint)
+    stats = await resumed.ingest(str(source), "elara")
+
+    assert stats["chunks_skipped"] == 20
+    assert stats["chunks_written"] == 30
+    assert len(set(store.written)) == 50
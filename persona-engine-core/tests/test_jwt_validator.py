@@ -0,0 +1,137 @@
+import asyncio
+import json
+import time
+
+import pytest
+import pytest_asyncio
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from src.auth.jwt_validator import KeycloakValidator
+
+
+def make_key(kid: str):
+    private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public = jwk.construct(pem, "RS256").public_key().to_dict()
+    public.update({"kid": kid, "use": "sig", "alg": "RS256"})
+    return pem, public
+
+
+def sign(pem: bytes, kid: str, **claims) -> str:
+    payload = {"sub": "alice", "aud": "persona-api", "exp": int(time.time()) + 300, **claims}
+    return jwt.encode(payload, pem, algorithm="RS256", headers={"kid": kid})
+
+
+class MockJWKS:
+    """Stand-in for Keycloak's /protocol/openid-connect/certs endpoint."""
+    def __init__(self):
+        self.keys = []
+        self.requests = 0
+        self.server = None
+        self.url = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"http://127.0.0.1:{port}/realms/persona/protocol/openid-connect/certs"
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            while (line := await reader.readline()) not in (b"\r\n", b""):
+                pass
+            self.requests += 1
+            await asyncio.sleep(0.01)
+            body = json.dumps({"keys": self.keys}).encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nConnection: close\r\n"
+                + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def jwks():
+    server = await MockJWKS().start()
+    yield server
+    await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_verifies_and_caches_tokens(jwks):
+    pem, public = make_key("k1")
+    jwks.keys = [public]
+    validator = KeycloakValidator(jwks_url=jwks.url, verify_signature=True)
+
+    async with validator.lifespan():
+        token = sign(pem, "k1")
+        claims = await validator.decode_token(token)
+        assert claims["sub"] == "alice"
+
+        for _ in range(1000):
+            assert await validator.decode_token(token) is claims
+
+    # One RSA verify; every later decode is a cache hit
+    assert validator.verifications == 1 and validator.cache_hits == 1000
+    assert jwks.requests == 1  # Warm-up fetch only
+
+
+@pytest.mark.asyncio
+async def test_rejects_bad_tokens(jwks):
+    pem, public = make_key("k1")
+    other_pem, _ = make_key("k1")
+    jwks.keys = [public]
+    validator = KeycloakValidator(jwks_url=jwks.url, verify_signature=True, min_refetch_seconds=60)
+
+    assert await validator.decode_token(sign(other_pem, "k1")) is None  # Wrong signature
+    assert await validator.decode_token(sign(pem, "k1", aud="someone-else")) is None
+    assert await validator.decode_token(sign(pem, "k1", exp=int(time.time()) - 10)) is None
+    assert await validator.decode_token(sign(pem, "unknown")) is None
+    assert await validator.decode_token(sign(pem, "unknown")) is None
+    assert validator.stats()["cached_tokens"] == 0
+    assert jwks.requests == 1  # Unknown kids refetch at most once per min_refetch_seconds
+
+
+@pytest.mark.asyncio
+async def test_unknown_kid_refetches_once_for_concurrent_connects(jwks):
+    old_pem, old_public = make_key("old")
+    new_pem, new_public = make_key("new")
+    jwks.keys = [old_public]
+    validator = KeycloakValidator(jwks_url=jwks.url, verify_signature=True, min_refetch_seconds=0)
+
+    assert await validator.decode_token(sign(old_pem, "old"))
+    jwks.keys = [old_public, new_public]  # Realm rotates keys
+
+    tokens = [sign(new_pem, "new", sub=f"user-{i}") for i in range(20)]
+    results = await asyncio.gather(*(validator.decode_token(t) for t in tokens))
+
+    assert [r["sub"] for r in results] == [f"user-{i}" for i in range(20)]
+    assert jwks.requests == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_cache_entries_are_dropped(jwks):
+    pem, public = make_key("k1")
+    jwks.keys = [public]
+    validator = KeycloakValidator(jwks_url=jwks.url, verify_signature=True, max_cached_tokens=2)
+
+    exp = int(time.time()) + 1
+    short = sign(pem, "k1", exp=exp)
+    assert await validator.decode_token(short)
+    for i in range(3):
+        assert await validator.decode_token(sign(pem, "k1", sub=f"user-{i}"))
+    assert validator.stats()["cached_tokens"] == 2  # LRU bound
+
+    assert await validator.decode_token(sign(pem, "k1", sub="user-2"))  # Same claims, same token
+    await asyncio.sleep(exp + 1.05 - time.time())  # jose compares whole seconds
+    assert await validator.decode_token(short) is None
@@ -0,0 +1,85 @@
+import pytest
+
+from src.memory.lore_index import LocalLoreIndex
+from tests.test_vector_store import LORE, CallCounter
+
+MORE_LORE = [
+    ("elara", "Elara studied starlight magic under the archmage Voss."),
+    ("elara", "The Obsidian Spire has a library of forbidden spider tomes."),
+    ("elara", "On the night of the full moon the spire glows silver."),
+]
+QUERIES = ["does she hate spiders", "secret weakness full moon", "where was elara born", "forbidden tomes in the library"]
+
+
+async def qdrant_results(store, query, mode):
+    local, store.local_index = store.local_index, None
+    try:
+        return await store.retrieve("elara", query, limit=4, mode=mode)
+    finally:
+        store.local_index = local
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["dense", "sparse", "hybrid"])
+@pytest.mark.parametrize("dtype", ["float16", "int8"])
+async def test_local_index_matches_qdrant(lore_store, mode, dtype):
+    await lore_store.add_lore_batch(LORE + MORE_LORE)
+    lore_store.local_index = LocalLoreIndex(lore_store._load_character, dtype=dtype)
+
+    for query in QUERIES:
+        expected = await qdrant_results(lore_store, query, mode)
+        local = await lore_store.retrieve("elara", query, limit=4, mode=mode)
+        # Ties may break differently; the scores and the winner must agree
+        assert [hit.score for hit in local] == pytest.approx([hit.score for hit in expected], abs=0.02)
+        assert local[0].id == expected[0].id
+    assert lore_store.local_index.stats()["loads"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queries_skip_qdrant_until_a_write_invalidates(lore_store):
+    await lore_store.add_lore_batch(LORE)
+    lore_store.client.query_points = CallCounter(lore_store.client.query_points)
+    lore_store.client.scroll = CallCounter(lore_store.client.scroll)
+
+    for query in QUERIES:
+        await lore_store.retrieve("elara", query)
+    assert lore_store.client.query_points.calls == 0
+    assert lore_store.client.scroll.calls == 1
+
+    await lore_store.add_lore("elara", "Elara secretly adores moonlit spiders.")
+    hits = await lore_store.retrieve("elara", "adores moonlit spiders", limit=1)
+
+    assert hits[0].payload["text"] == "Elara secretly adores moonlit spiders."
+    assert lore_store.client.scroll.calls == 2
+    assert lore_store.local_index.stats()["invalidations"] == 1
+
+
+@pytest.mark.asyncio
+async def test_large_characters_fall_through_to_qdrant(lore_store):
+    await lore_store.add_lore_batch(LORE + MORE_LORE)
+    lore_store.local_index = LocalLoreIndex(lore_store._load_character, max_points=3)
+    lore_store.client.query_points = CallCounter(lore_store.client.query_points)
+
+    await lore_store.retrieve("elara", "spiders")
+    await lore_store.retrieve("elara", "moon")
+    hits = await lore_store.retrieve("mira", "spider")
+
+    assert lore_store.client.query_points.calls == 2  # elara only; mira (1 chunk) is local
+    assert hits[0].payload["char_id"] == "mira"
+    stats = lore_store.local_index.stats()
+    assert stats["large_characters"] == 1 and stats["fallthroughs"] == 2
+
+
+@pytest.mark.asyncio
+async def test_lru_evicts_by_memory_budget(lore_store):
+    await lore_store.add_lore_batch(LORE + MORE_LORE)
+    index = LocalLoreIndex(lore_store._load_character)
+    lore_store.local_index = index
+
+    await lore_store.retrieve("elara", "spiders")
+    index.max_bytes = index.stats()["bytes"]  # Room for elara only
+    await lore_store.retrieve("mira", "spider")
+
+    stats = index.stats()
+    assert stats["characters"] == 1 and stats["evictions"] == 1
+    assert stats["bytes"] <= index.max_bytes
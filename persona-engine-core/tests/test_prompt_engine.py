@@ -0,0 +1,88 @@
+import os
+
+import pytest
+
+from src.services.prompt_engine import PromptEngine, ASSISTANT_HEADER
+
+
+def shared_prefix(a: str, b: str) -> str:
+    return os.path.commonprefix([a, b])
+
+
+@pytest.mark.asyncio
+async def test_consecutive_turns_share_byte_identical_prefix():
+    engine = PromptEngine()
+    history = [
+        {"role": "user", "content": "Who are you?"},
+        {"role": "assistant", "content": "I am Elara of the Obsidian Spire."},
+    ]
+
+    turn1 = await engine.build_prompt(
+        "llama3_base.j2", character_name="elara",
+        context_data={"history": list(history), "lore": "- Elara hates spiders."},
+        user_input="Do you like spiders?",
+    )
+    history += [
+        {"role": "user", "content": "Do you like spiders?"},
+        {"role": "assistant", "content": "Never. One bit me mid-fireball."},
+    ]
+    turn2 = await engine.build_prompt(
+        "llama3_base.j2", character_name="elara",
+        context_data={"history": list(history), "lore": "- Her weakness is the full moon."},
+        user_input="What is your weakness?",
+    )
+
+    # Everything before turn-1's dynamic tail (lore + new input) is reused verbatim
+    static_part = turn1[:turn1.index("<|start_header_id|>system<|end_header_id|>\n\nRelevant lore")]
+    assert static_part.endswith("I am Elara of the Obsidian Spire.<|eot_id|>")
+    assert turn2.startswith(static_part)
+
+    prefix = shared_prefix(turn1, turn2)
+    assert turn1.startswith("<|begin_of_text|><|start_header_id|>system<|end_header_id|>")
+    assert "Name: elara" in prefix
+    # Dynamic parts come after the shared history
+    assert "Relevant lore" not in prefix
+    assert turn2.endswith("What is your weakness?<|eot_id|>" + ASSISTANT_HEADER)
+
+
+@pytest.mark.asyncio
+async def test_history_is_rendered_as_real_turns():
+    engine = PromptEngine()
+    prompt = await engine.build_prompt(
+        "llama3_base.j2", character_name="elara",
+        context_data={"history": [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Hail."}], "lore": ""},
+        user_input="Tell me more",
+    )
+
+    assert "<|start_header_id|>user<|end_header_id|>\n\nHi<|eot_id|>" in prompt
+    assert "<|start_header_id|>assistant<|end_header_id|>\n\nHail.<|eot_id|>" in prompt
+    assert "{'history'" not in prompt
+
+
+@pytest.mark.asyncio
+async def test_only_new_fragments_are_rendered_each_turn():
+    engine = PromptEngine()
+    history = [{"role": "user", "content": f"msg {i}"} for i in range(10)]
+
+    await engine.build_prompt("llama3_base.j2", character_name="elara",
+                              context_data={"history": history, "lore": ""}, user_input="next")
+    misses_after_first = engine.fragment_misses
+
+    history.append({"role": "user", "content": "next"})
+    await engine.build_prompt("llama3_base.j2", character_name="elara",
+                              context_data={"history": history, "lore": ""}, user_input="another")
+
+    # Only the new user turn is rendered; "next" was cached as last turn's input
+    assert engine.fragment_misses - misses_after_first == 1
+
+
+@pytest.mark.asyncio
+async def test_current_input_already_in_history_is_not_duplicated():
+    engine = PromptEngine()
+    prompt = await engine.build_prompt(
+        "llama3_base.j2", character_name="elara",
+        context_data={"history": [{"role": "user", "content": "Hello!"}], "lore": ""},
+        user_input="Hello!",
+    )
+
+    assert prompt.count("Hello!") == 1
@@ -0,0 +1,102 @@
+import fakeredis
+import pytest
+from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+
+from src.core.tokenizer import MESSAGE_OVERHEAD_TOKENS, TokenCounter
+from src.memory.cache_manager import CacheManager
+from src.memory.rag_engine import RagEngine
+
+ENGLISH = "She hates spiders because one bit her when she was casting a fireball. " * 3
+RUSSIAN = "Она ненавидит пауков, потому что один укусил её, когда она колдовала огненный шар."
+
+
+@pytest.fixture(scope="module")
+def tokenizer_path(tmp_path_factory):
+    """Byte-level BPE trained on English only, like a Latin-heavy LLM vocabulary."""
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(vocab_size=400, initial_alphabet=pre_tokenizers.ByteLevel.alphabet())
+    tokenizer.train_from_iterator([ENGLISH] * 50, trainer=trainer)
+    path = tmp_path_factory.mktemp("tok") / "tokenizer.json"
+    tokenizer.save(str(path))
+    return str(path)
+
+
+class StubLore:
+    def __init__(self, text=""):
+        self.text = text
+
+    async def search_lore(self, char_id, query):
+        return self.text
+
+
+class CountingCounter(TokenCounter):
+    def __init__(self, source):
+        super().__init__(source)
+        self.counted = []
+
+    def count(self, text):
+        self.counted.append(text)
+        return super().count(text)
+
+
+def test_counts_come_from_the_tokenizer(tokenizer_path):
+    counter = TokenCounter(tokenizer_path)
+    assert counter.exact
+    assert counter.count(RUSSIAN) == len(counter.tokenizer.encode(RUSSIAN, add_special_tokens=False).ids)
+    assert counter.count_batch([ENGLISH, RUSSIAN]) == [counter.count(ENGLISH), counter.count(RUSSIAN)]
+    # The old len/4 heuristic badly undercounts Cyrillic
+    assert counter.count(RUSSIAN) > 2 * len(RUSSIAN) / 4
+
+    fallback = TokenCounter("/nonexistent/tokenizer.json")
+    assert not fallback.exact
+    assert fallback.count(RUSSIAN) >= len(RUSSIAN) / 2
+
+
+@pytest.mark.asyncio
+async def test_counts_are_stored_at_write_time(tokenizer_path):
+    counter = TokenCounter(tokenizer_path)
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis(), token_counter=counter)
+
+    await cache.add_message("s1", "user", RUSSIAN)
+
+    (msg,) = await cache.get_history("s1")
+    assert msg["tokens"] == counter.count(RUSSIAN) + MESSAGE_OVERHEAD_TOKENS
+
+
+@pytest.mark.asyncio
+async def test_history_is_pruned_to_the_model_context(tokenizer_path):
+    counter = CountingCounter(tokenizer_path)
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis(), token_counter=counter)
+    rag = RagEngine(cache=cache, lore=StubLore("- Elara hates spiders."))
+    rag.max_model_len, rag.generation_reserve = 600, 100
+
+    for i in range(10):
+        await cache.add_message("s1", "user" if i % 2 == 0 else "assistant", f"{i} {RUSSIAN}")
+    counter.counted.clear()
+
+    context = await rag.prepare_context("s1", "elara", "Do you like spiders?", reserved_tokens=50)
+
+    history = context["history"]
+    assert 0 < len(history) < 10
+    assert history[-1]["content"].startswith("9 ")  # Newest turns survive
+    assert [int(m["content"].split()[0]) for m in history] == list(range(10 - len(history), 10))
+    assert context["prompt_tokens"] <= rag.max_model_len - rag.generation_reserve
+    # Stored counts are reused: history messages are never re-tokenized
+    assert not any(RUSSIAN in text for text in counter.counted)
+
+
+@pytest.mark.asyncio
+async def test_lore_is_trimmed_by_whole_lines(tokenizer_path):
+    counter = TokenCounter(tokenizer_path)
+    lines = [f"- {ENGLISH}", f"- {RUSSIAN}", "- Her secret weakness is the full moon."]
+    rag = RagEngine(
+        cache=CacheManager(client=fakeredis.FakeAsyncRedis(), token_counter=counter),
+        lore=StubLore("\n".join(lines)),
+    )
+    rag.max_lore_tokens = counter.count(lines[0]) + 30
+
+    context = await rag.prepare_context("s2", "elara", "hi")
+
+    assert context["lore"] == lines[0]
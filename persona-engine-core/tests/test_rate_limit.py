@@ -0,0 +1,85 @@
+import asyncio
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from src.middleware.rate_limit import RateLimiter
+
+
+class ScriptCalls:
+    def __init__(self, limiter):
+        self.count = 0
+        script = limiter._gcra
+
+        async def counted(*args, **kwargs):
+            self.count += 1
+            return await script(*args, **kwargs)
+
+        limiter._gcra = counted
+
+
+@pytest.mark.asyncio
+async def test_concurrent_workers_never_exceed_the_burst():
+    shared = fakeredis.FakeAsyncRedis()
+    workers = [RateLimiter(client=shared) for _ in range(4)]
+
+    # 40 concurrent messages from one user across 4 workers; 10/min sustained, burst 5
+    results = await asyncio.gather(*(
+        workers[i % 4].hit("user:alice", 10, 60, burst=5) for i in range(40)
+    ))
+
+    assert sum(1 for r in results if r == 0.0) == 5
+    assert all(0 < r <= 6.0 for r in results if r)  # Next slot opens within one interval
+    assert await workers[0].hit("user:bob", 10, 60, burst=5) == 0.0  # Buckets are per key
+
+
+@pytest.mark.asyncio
+async def test_refills_at_the_sustained_rate():
+    limiter = RateLimiter(client=fakeredis.FakeAsyncRedis())
+
+    # 600/min = one every 100 ms, burst 2
+    assert [await limiter.hit("k", 600, 60, burst=2) for _ in range(3)][:2] == [0.0, 0.0]
+    assert await limiter.hit("k", 600, 60, burst=2) > 0
+    await asyncio.sleep(0.12)
+    assert await limiter.hit("k", 600, 60, burst=2) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_floods_are_rejected_without_touching_redis():
+    limiter = RateLimiter(client=fakeredis.FakeAsyncRedis())
+    calls = ScriptCalls(limiter)
+
+    for _ in range(100):
+        await limiter.hit("user:flood", 5, 60, burst=5)
+
+    assert calls.count == 5  # Only the allowed ones went to Redis
+    stats = limiter.stats()
+    assert stats["allowed"] == 5 and stats["local_rejects"] == 95
+
+
+@pytest.mark.asyncio
+async def test_limits_follow_plan_tier():
+    limiter = RateLimiter(client=fakeredis.FakeAsyncRedis())
+    limiter.tiers = {"free": (60, 2), "enterprise": (600, 20)}
+
+    free = [await limiter.check_tier("user:f", "free") for _ in range(5)]
+    enterprise = [await limiter.check_tier("user:e", "enterprise") for _ in range(5)]
+    unknown = [await limiter.check_tier("user:u", "legacy-plan") for _ in range(5)]
+
+    assert free.count(0.0) == 2
+    assert enterprise.count(0.0) == 5
+    assert unknown.count(0.0) == 2  # Unknown tiers get the free limits
+
+    with pytest.raises(HTTPException) as exc:
+        for _ in range(3):
+            await limiter.check_limit("connect:f", 2, 60)
+    assert exc.value.status_code == 429
+
+
+def test_tiers_without_free_fail_at_startup(monkeypatch):
+    from src.core.config import settings
+    monkeypatch.setattr(settings, "RATE_LIMIT_TIERS", "pro:60:10,enterprise:300:30")
+
+    with pytest.raises(ValueError, match="free"):
+        RateLimiter(client=fakeredis.FakeAsyncRedis())
@@ -0,0 +1,126 @@
+import asyncio
+import re
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from src.memory.reranker import AdaptiveReranker
+
+_WORD = re.compile(r"\w+")
+
+
+def hits(*scored):
+    return [SimpleNamespace(score=score, payload={"text": text}) for text, score in scored]
+
+
+def overlap(query, text):
+    return len(set(_WORD.findall(query.lower())) & set(_WORD.findall(text.lower())))
+
+
+class RecordingRanker:
+    def __init__(self):
+        self.requests = []
+
+    def rerank(self, request):
+        self.requests.append(request)
+        scored = [{**p, "score": overlap(request.query, p["text"])} for p in request.passages]
+        return sorted(scored, key=lambda p: p["score"], reverse=True)
+
+
+class FakeOnnxRanker:
+    """Mimics flashrank's pairwise Ranker internals (tokenizer + ONNX session)."""
+    llm_model = None
+
+    def __init__(self):
+        self.runs = []
+        self.tokenizer = SimpleNamespace(encode_batch=self._encode)
+        self.session = SimpleNamespace(run=self._run)
+
+    def _encode(self, pairs):
+        return [SimpleNamespace(ids=[overlap(q, t)], type_ids=[0], attention_mask=[1]) for q, t in pairs]
+
+    def _run(self, _, onnx_input):
+        self.runs.append(len(onnx_input["input_ids"]))
+        return [onnx_input["input_ids"].astype(np.float32)]
+
+
+@pytest.mark.asyncio
+async def test_clear_winner_and_short_lists_skip_the_model():
+    ranker = RecordingRanker()
+    reranker = AdaptiveReranker(ranker, skip_margin=0.3)
+
+    clear = hits(("moon", 1.0), ("spiders", 0.5), ("eclipse", 0.33))
+    assert await reranker.rerank("moon", clear, limit=2) == ["moon", "spiders"]
+    assert await reranker.rerank("moon", hits(("a", 0.5), ("b", 0.5)), limit=3) == ["a", "b"]
+
+    assert ranker.requests == []
+    stats = reranker.stats()
+    assert stats["skipped_clear_winner"] == 1
+    assert stats["skipped_few_candidates"] == 1
+    assert stats["skip_rate"] == 1.0
+    reranker.close()
+
+
+@pytest.mark.asyncio
+async def test_rrf_scores_use_their_own_margin():
+    ranker = RecordingRanker()
+    reranker = AdaptiveReranker(ranker, skip_margin=0.3, rrf_skip_margin=0.4, max_wait_ms=0)
+    rrf = lambda *ranks: sum(1 / (r + 1) for r in ranks)  # Qdrant RRF (k=2), 1-based ranks
+
+    # Adjacent ranks in both lists: a 1/3 gap, not a clear winner for RRF
+    adjacent = hits(("moon", rrf(1, 1)), ("spiders", rrf(2, 2)), ("eclipse", rrf(3, 3)))
+    assert (adjacent[0].score - adjacent[1].score) / adjacent[0].score > 0.3
+    await reranker.rerank("spiders", adjacent, limit=1, fused=True)
+    assert len(ranker.requests) == 1
+
+    # Both retrievers put the top hit first and the runner-up well behind
+    agreed = hits(("moon", rrf(1, 1)), ("spiders", rrf(2, 4)), ("eclipse", rrf(3, 3)))
+    assert await reranker.rerank("spiders", agreed, limit=1, fused=True) == ["moon"]
+    assert len(ranker.requests) == 1
+    reranker.close()
+
+
+@pytest.mark.asyncio
+async def test_close_scores_are_reranked_with_trimmed_passages():
+    ranker = RecordingRanker()
+    reranker = AdaptiveReranker(ranker, skip_margin=0.3, passage_max_tokens=8, max_wait_ms=0)
+    long_text = "the moon " + "filler " * 200
+    candidates = hits(("spiders bite", 0.5), (long_text, 0.49), ("eclipse", 0.48))
+
+    result = await reranker.rerank("the moon", candidates, limit=1)
+
+    assert result == [long_text]  # Full text is returned, only scoring sees the trimmed one
+    (request,) = ranker.requests
+    assert max(len(p["text"].split()) for p in request.passages) == 6
+    assert reranker.stats()["reranked"] == 1
+    reranker.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_model_call():
+    ranker = FakeOnnxRanker()
+    reranker = AdaptiveReranker(ranker, skip_margin=0.9, max_batch_size=8, max_wait_ms=50)
+    queries = ["moon", "spiders", "eclipse", "fireball"]
+    candidates = hits(("moon tower", 0.3), ("spiders nest", 0.3), ("eclipse day", 0.3), ("fireball", 0.3))
+
+    results = await asyncio.gather(*(reranker.rerank(q, candidates, limit=1) for q in queries))
+
+    assert ranker.runs == [16]  # 4 requests x 4 passages in one ONNX pass
+    assert [r[0].split()[0] for r in results] == queries
+    assert reranker.stats()["batching"]["batches"] == 1
+    reranker.close()
+
+
+def test_candidate_count_follows_latency_budget():
+    reranker = AdaptiveReranker(RecordingRanker(), latency_budget_ms=20, min_candidates=4, max_candidates=10)
+
+    assert reranker.candidate_count(3) == 10  # No measurements yet
+    reranker.passage_ms = 4.0
+    assert reranker.candidate_count(3) == 5
+    reranker.passage_ms = 0.5
+    assert reranker.candidate_count(3) == 10
+    reranker.passage_ms = 50.0
+    assert reranker.candidate_count(3) == 4
+    assert reranker.candidate_count(6) == 6  # Never fewer than requested
+    reranker.close()
@@ -0,0 +1,83 @@
+import fakeredis
+import pytest
+
+from src.services.response_cache import ResponseCache
+
+
+def make_cache(**kwargs) -> ResponseCache:
+    kwargs.setdefault("replay_interval_ms", 0)
+    return ResponseCache(fakeredis.FakeAsyncRedis(), **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_normalized_prompt_hits_and_replays_completion():
+    cache = make_cache()
+    await cache.store("elara", "Who are you?", "I am Elara, keeper of the Spire.")
+
+    hit = await cache.lookup("elara", "  who ARE you ")
+    assert hit == "I am Elara, keeper of the Spire."
+    assert await cache.lookup("other_char", "who are you") is None
+
+    pieces = [p async for p in cache.replay(hit)]
+    assert "".join(pieces) == hit
+    assert len(pieces) > 5 and max(len(p.strip()) for p in pieces) <= 4
+    assert cache.stats()["hit_rate"] == 0.5
+
+
+@pytest.mark.asyncio
+async def test_semantic_match_above_threshold():
+    vectors = {"hi": [1.0, 0.0, 0.0], "hello": [0.98, 0.2, 0.0], "tell me about dragons": [0.0, 0.0, 1.0]}
+
+    async def embed(text):
+        return vectors[ResponseCache.normalize(text)]
+
+    cache = make_cache(embedder=embed, similarity_threshold=0.95)
+    await cache.store("elara", "hi", "Greetings, traveller.")
+
+    assert await cache.lookup("elara", "Hello!") == "Greetings, traveller."
+    assert await cache.lookup("elara", "Tell me about dragons") is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_entries_are_bounded_per_character():
+    cache = make_cache(max_entries=3)
+    for i in range(5):
+        await cache.store("elara", f"question {i}", f"answer {i}")
+
+    assert await cache.lookup("elara", "question 0") is None
+    assert await cache.lookup("elara", "question 4") == "answer 4"
+    assert cache.evictions == 2
+    assert await cache.redis.zcard("resp:elara:lru") == 3
+
+
+def test_only_short_histories_are_eligible():
+    cache = make_cache(max_history_messages=2)
+    opener = [{"role": "user", "content": "hi"}]
+    long_history = [{"role": "user", "content": "x"}, {"role": "assistant", "content": "y"}] * 3
+
+    assert cache.eligible([], "hi")
+    assert cache.eligible(opener, "hi")  # current input already written to history
+    assert not cache.eligible(long_history, "hi")
+    assert not cache.eligible([], "?!")
+
+
+@pytest.mark.asyncio
+async def test_replies_depending_on_history_are_not_shared_across_users():
+    async def embed(text):
+        return [1.0, 0.0]
+
+    cache = make_cache(embedder=embed, max_history_messages=2)
+    bob = [{"role": "user", "content": "I'm Bob"}, {"role": "assistant", "content": "Hi Bob!"}]
+    alice = [{"role": "user", "content": "I'm Alice"}, {"role": "assistant", "content": "Hi Alice!"}]
+    question = "What's my name?"
+
+    bob_scope = cache.scope(bob + [{"role": "user", "content": question}], question)
+    await cache.store("elara", question, "You are Bob.", bob_scope)
+
+    assert await cache.lookup("elara", question, cache.scope(alice, question)) is None
+    assert await cache.lookup("elara", question) is None  # Nor to a fresh conversation, even semantically
+    assert await cache.lookup("elara", question, cache.scope(bob, question)) == "You are Bob."
+    # The summary is part of the conversation too
+    assert cache.scope([], question, summary="User is Bob.") not in ("", cache.scope([], question))
+    assert await cache.redis.hlen("resp:elara:vec") == 0
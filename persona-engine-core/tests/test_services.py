@@ -0,0 +1,83 @@
+from collections import Counter
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import Depends, FastAPI, WebSocket
+from fastapi.testclient import TestClient
+from qdrant_client import AsyncQdrantClient
+
+import src.core.embeddings as embeddings
+import src.memory.vector_store as vector_store
+from src.core.tokenizer import TokenCounter
+from src.api.deps import get_cache_manager, get_rag_engine, get_rate_limiter
+from src.core.container import ServiceContainer
+
+constructed = Counter()
+
+
+def counting(name):
+    class FakeModel:
+        def __init__(self, *args, **kwargs):
+            constructed[name] += 1
+    return FakeModel
+
+
+@pytest.fixture
+def app(monkeypatch):
+    constructed.clear()
+    # Heavy models are replaced by constructor counters; Qdrant runs in-memory
+    monkeypatch.setattr(embeddings, "TextEmbedding", counting("TextEmbedding"))
+    monkeypatch.setattr(embeddings, "SparseTextEmbedding", counting("SparseTextEmbedding"))
+    monkeypatch.setattr(vector_store, "Ranker", counting("Ranker"))
+    monkeypatch.setattr(vector_store, "AsyncQdrantClient", lambda **kwargs: AsyncQdrantClient(":memory:"))
+    monkeypatch.setattr(TokenCounter, "_load", staticmethod(lambda source: None))  # No hub download
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.services = ServiceContainer.create()
+        yield
+        await app.state.services.aclose()
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.websocket("/ws")
+    async def ws(
+        websocket: WebSocket,
+        rag=Depends(get_rag_engine),
+        cache=Depends(get_cache_manager),
+        limiter=Depends(get_rate_limiter),
+    ):
+        await websocket.accept()
+        await websocket.send_json({
+            "rag": id(rag),
+            "lore": id(rag.lore),
+            "pools": sorted({id(cache.redis.connection_pool), id(limiter.redis.connection_pool),
+                             id(rag.cache.redis.connection_pool)}),
+        })
+        await websocket.close()
+
+    return app
+
+
+def test_model_instances_stay_constant_as_connections_grow(app):
+    with TestClient(app) as client:
+        after_startup = dict(constructed)
+        assert after_startup  # models were loaded once at startup
+        assert after_startup["TextEmbedding"] == 1  # One shared dense model
+
+        seen = []
+        for _ in range(25):
+            with client.websocket_connect("/ws") as ws:
+                seen.append(ws.receive_json())
+
+        assert dict(constructed) == after_startup
+        assert len({s["rag"] for s in seen}) == 1
+        assert len({s["lore"] for s in seen}) == 1
+
+
+def test_all_redis_users_share_one_pool(app):
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            info = ws.receive_json()
+
+    assert len(info["pools"]) == 1
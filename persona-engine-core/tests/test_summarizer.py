@@ -0,0 +1,182 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from src.memory.cache_manager import CacheManager
+from src.memory.rag_engine import RagEngine
+from src.memory.summarizer import ConversationSummarizer
+from src.services.prompt_engine import PromptEngine, SUMMARY_PREFIX
+
+
+class FakeInference:
+    def __init__(self, reply="Elara told the user about the Spire.", gate=None, fail=False):
+        self.reply = reply
+        self.gate = gate
+        self.fail = fail
+        self.prompts = []
+
+    async def complete(self, prompt, request_id, max_tokens, session_id=None):
+        self.prompts.append(prompt)
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise RuntimeError("engine offline")
+        return f" {self.reply} "
+
+
+class StubLore:
+    async def search_lore(self, char_id, query):
+        return ""
+
+
+def make(redis_client=None, **kwargs):
+    cache = CacheManager(client=redis_client or fakeredis.FakeAsyncRedis())
+    inference = kwargs.pop("inference", None) or FakeInference()
+    kwargs.setdefault("trigger_messages", 8)
+    kwargs.setdefault("keep_messages", 4)
+    return cache, inference, ConversationSummarizer(cache, inference, PromptEngine(), **kwargs)
+
+
+async def fill(cache, session_id, count, start=0):
+    for i in range(start, start + count):
+        await cache.add_message(session_id, "user" if i % 2 == 0 else "assistant", f"message {i}")
+
+
+@pytest.mark.asyncio
+async def test_short_history_is_left_alone():
+    cache, inference, summarizer = make()
+    await fill(cache, "s1", 6)
+
+    assert await summarizer.compact("s1") is False
+    assert inference.prompts == []
+    assert await cache.get_summary("s1") is None
+
+
+@pytest.mark.asyncio
+async def test_old_turns_are_folded_into_the_summary():
+    cache, inference, summarizer = make()
+    await fill(cache, "s1", 10)
+
+    assert await summarizer.compact("s1") is True
+
+    history = await cache.get_history("s1")
+    assert [m["content"] for m in history] == [f"message {i}" for i in range(6, 10)]
+    summary = await cache.get_summary("s1")
+    assert summary["content"] == "Elara told the user about the Spire."
+    assert summary["version"] == 1
+    assert "user: message 0" in inference.prompts[0] and "message 6" not in inference.prompts[0]
+
+    # The next fold merges the previous summary
+    await fill(cache, "s1", 6, start=10)
+    await summarizer.compact("s1")
+    assert "Previous summary:\nElara told the user about the Spire." in inference.prompts[1]
+    assert (await cache.get_summary("s1"))["version"] == 2
+
+
+@pytest.mark.asyncio
+async def test_rag_engine_injects_summary_in_place_of_old_turns():
+    cache, _, summarizer = make()
+    await fill(cache, "s1", 10)
+    await summarizer.compact("s1")
+    rag = RagEngine(cache=cache, lore=StubLore())
+
+    context = await rag.prepare_context("s1", "elara", "And then?")
+    prompt = await PromptEngine().build_prompt("llama3_base.j2", "elara", context, "And then?")
+
+    summary = await cache.get_summary("s1")
+    assert context["summary"] == summary["content"]
+    assert f"{SUMMARY_PREFIX}{summary['content']}" in prompt
+    assert "message 0" not in prompt and "message 9" in prompt
+    assert prompt.index(SUMMARY_PREFIX) < prompt.index("message 6")
+
+
+@pytest.mark.asyncio
+async def test_schedule_never_blocks_and_writes_during_compaction_survive():
+    gate = asyncio.Event()
+    cache, inference, summarizer = make(inference=FakeInference(gate=gate))
+    await fill(cache, "s1", 10)
+
+    task = summarizer.schedule("s1")
+    assert summarizer.schedule("s1") is task  # One compaction per session
+    await asyncio.sleep(0.01)
+    assert not task.done()
+
+    # A turn lands while the summary is being generated
+    await fill(cache, "s1", 2, start=10)
+    gate.set()
+    await task
+
+    history = await cache.get_history("s1")
+    assert [m["content"] for m in history] == [f"message {i}" for i in range(6, 12)]
+    assert summarizer.stats()["compactions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_compactors_fold_once():
+    redis_client = fakeredis.FakeAsyncRedis()
+    gate = asyncio.Event()
+    cache, _, first = make(redis_client, inference=FakeInference(gate=gate))
+    _, _, second = make(redis_client)
+    await fill(cache, "s1", 10)
+
+    running = asyncio.create_task(first.compact("s1"))
+    await asyncio.sleep(0.01)
+    assert await second.compact("s1") is False  # Locked by the first worker
+    gate.set()
+    assert await running is True
+
+    # A compactor holding a stale view (old version / head) cannot commit
+    raw = await cache.get_raw_history("s1")
+    assert await cache.fold_history("s1", raw[:2], "stale", 10, version=0) is False
+    assert len(await cache.get_history("s1")) == 4
+    assert (await cache.get_summary("s1"))["version"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_summary_keeps_history():
+    cache, _, summarizer = make(inference=FakeInference(fail=True))
+    await fill(cache, "s1", 10)
+
+    await summarizer.schedule("s1")
+
+    assert len(await cache.get_history("s1")) == 10
+    assert summarizer.stats()["failures"] == 1
+    assert not await cache.redis.exists("session:s1:compacting")
+
+
+@pytest.mark.asyncio
+async def test_schedule_decides_from_the_mirror_without_reading_redis():
+    cache, inference, summarizer = make()
+    session = cache.session("s1")
+    for i in range(6):
+        history, _ = await session.add("user" if i % 2 == 0 else "assistant", f"message {i}")
+
+    calls = []
+    cache.get_raw_history = lambda *args: calls.append(args)  # Must not be reached below the trigger
+    assert summarizer.schedule("s1", history) is None
+    assert calls == [] and summarizer.stats()["skipped"] == 1
+    del cache.get_raw_history
+
+    for i in range(6, 10):
+        history, _ = await session.add("user" if i % 2 == 0 else "assistant", f"message {i}")
+    task = summarizer.schedule("s1", history)  # Over the trigger: the raw list is read once, to fold
+    assert task is not None
+    await task
+    assert summarizer.stats()["compactions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_taken_by_another_worker_is_not_released():
+    gate = asyncio.Event()
+    cache, _, summarizer = make(inference=FakeInference(gate=gate))
+    await fill(cache, "s1", 10)
+
+    running = asyncio.create_task(summarizer.compact("s1"))
+    await asyncio.sleep(0.01)
+    # The lock expired mid-summary and another worker took it
+    await cache.redis.set("session:s1:compacting", b"other-worker")
+    gate.set()
+    await running
+
+    assert await cache.redis.get("session:s1:compacting") == b"other-worker"
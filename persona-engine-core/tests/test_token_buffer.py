@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from src.api.token_buffer import TokenBuffer
+
+
+class FakeWebSocket:
+    def __init__(self, send_delay: float = 0.0):
+        self.client_state = WebSocketState.CONNECTED
+        self.send_delay = send_delay
+        self.frames = []
+
+    async def send_text(self, text: str):
+        if self.send_delay:
+            await asyncio.sleep(self.send_delay)
+        self.frames.append(text)
+
+
+@pytest.mark.asyncio
+async def test_flushes_on_threshold_not_on_every_space():
+    ws = FakeWebSocket()
+    buffer = TokenBuffer(ws, min_threshold=20, max_latency_ms=1000)
+
+    for token in ["Hello", " ", "there", ",", " ", "traveller", " ", "of", " ", "the", " ", "north"]:
+        await buffer.push(token)
+
+    assert ws.frames == ["Hello there, traveller"]
+    await buffer.flush()
+    assert "".join(ws.frames) == "Hello there, traveller of the north"
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_deadline_flushes_a_partial_frame():
+    ws = FakeWebSocket()
+    buffer = TokenBuffer(ws, min_threshold=1000, max_latency_ms=20)
+
+    await buffer.push("Hi")
+    assert ws.frames == []
+    await asyncio.sleep(0.06)
+
+    assert ws.frames == ["Hi"]
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_threshold_adapts_to_backpressure():
+    ws = FakeWebSocket(send_delay=0.01)
+    buffer = TokenBuffer(ws, min_threshold=8, max_threshold=64, max_latency_ms=1000, slow_send_ms=1)
+
+    for _ in range(20):
+        await buffer.push("abcd")
+    assert buffer.threshold > 8
+
+    ws.send_delay = 0.0
+    for _ in range(200):
+        await buffer.push("abcd")
+    assert buffer.threshold == 8
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_report_frame_sizes():
+    ws = FakeWebSocket()
+    buffer = TokenBuffer(ws, min_threshold=10, max_latency_ms=1000)
+
+    for _ in range(10):
+        await buffer.push("12345")
+    await buffer.flush()
+
+    stats = buffer.stats()
+    assert stats["frames"] == len(ws.frames) == 5
+    assert stats["bytes_per_frame"] == 10
+    assert "".join(ws.frames) == "12345" * 10
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_a_deadline_flush_in_flight():
+    ws = FakeWebSocket(send_delay=10)
+    buffer = TokenBuffer(ws, min_threshold=1000, max_latency_ms=1)
+
+    await buffer.push("Hi")
+    await asyncio.sleep(0.02)
+    (task,) = buffer._flush_tasks  # Held by the buffer while the send is stuck
+    assert not task.done()
+
+    await buffer.close()
+    assert task.cancelled() and not buffer._flush_tasks
+    assert ws.frames == []
@@ -0,0 +1,111 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from src.memory.cache_manager import CacheManager
+from src.memory.rag_engine import RagEngine
+from src.services.turn_pipeline import TurnPipeline
+
+SCAN_SECONDS = 0.15
+LORE_SECONDS = 0.15
+
+
+class SlowMesh:
+    """SafetyMesh stand-in: instant static stage, slow neural scan."""
+    def __init__(self, allow=True):
+        self.allow = allow
+
+    def precheck(self, text):
+        if "badword" in text:
+            return text, True, "Blocked keywords found: ['badword']"
+        return text.replace("555-123-4567", "<PHONE_REDACTED>"), False, None
+
+    async def check_input(self, text, context, prechecked=None):
+        safe_text, blocked, reason = prechecked or self.precheck(text)
+        if blocked:
+            return {"allowed": False, "reason": reason, "text": text}
+        await asyncio.sleep(SCAN_SECONDS)
+        if not self.allow:
+            return {"allowed": False, "reason": "Content flagged as toxic.", "text": safe_text}
+        return {"allowed": True, "reason": "Safe", "text": safe_text}
+
+
+class SlowLore:
+    def __init__(self):
+        self.queries = []
+        self.cancelled = 0
+
+    async def search_lore(self, char_id, query):
+        self.queries.append(query)
+        try:
+            await asyncio.sleep(LORE_SECONDS)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "- Elara hates spiders."
+
+
+def make_pipeline(mesh, speculative=True):
+    cache = CacheManager(client=fakeredis.FakeAsyncRedis())
+    lore = SlowLore()
+    return TurnPipeline(mesh, RagEngine(cache=cache, lore=lore), speculative=speculative), cache, lore
+
+
+@pytest.mark.asyncio
+async def test_retrieval_overlaps_the_safety_check():
+    pipeline, cache, lore = make_pipeline(SlowMesh())
+
+    turn = await pipeline.run("call me at 555-123-4567", {"user_id": "s1"}, "s1", "elara")
+
+    assert turn["allowed"]
+    assert turn["context"]["lore"] == "- Elara hates spiders."
+    # Retrieval searched the statically sanitized text, not the raw input
+    assert lore.queries == ["call me at <PHONE_REDACTED>"]
+    timings = turn["timings"]
+    assert timings["overlap_ms"] > SCAN_SECONDS * 1000 * 0.8
+    assert timings["total_ms"] < (SCAN_SECONDS + LORE_SECONDS) * 1000 * 0.8
+    (msg,) = await cache.get_history("s1")
+    assert msg["content"] == "call me at <PHONE_REDACTED>"
+
+    # Sequential baseline: the latencies add up
+    sequential, _, _ = make_pipeline(SlowMesh(), speculative=False)
+    turn = await sequential.run("hello", {"user_id": "s2"}, "s2", "elara")
+    assert turn["timings"]["overlap_ms"] == 0
+    assert turn["timings"]["total_ms"] >= (SCAN_SECONDS + LORE_SECONDS) * 1000
+
+
+@pytest.mark.asyncio
+async def test_blocked_input_cancels_retrieval_and_writes_nothing():
+    pipeline, cache, lore = make_pipeline(SlowMesh(allow=False))
+
+    turn = await pipeline.run("you are awful", {"user_id": "s1"}, "s1", "elara")
+
+    assert not turn["allowed"]
+    assert turn["reason"] == "Content flagged as toxic."
+    assert turn["context"] is None
+    assert lore.cancelled == 1
+    assert await cache.get_history("s1") == []
+    assert pipeline.stats()["cancelled"] == 1
+
+    # Static blocks never start a retrieval
+    pipeline, cache, lore = make_pipeline(SlowMesh())
+    turn = await pipeline.run("badword", {"user_id": "s1"}, "s1", "elara")
+    assert not turn["allowed"]
+    assert lore.queries == []
+    assert await cache.get_history("s1") == []
+
+
+@pytest.mark.asyncio
+async def test_failed_safety_check_cancels_retrieval():
+    class BrokenMesh(SlowMesh):
+        async def check_input(self, text, context, prechecked=None):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("scanner down")
+
+    pipeline, cache, lore = make_pipeline(BrokenMesh())
+
+    with pytest.raises(RuntimeError):
+        await pipeline.run("hello", {"user_id": "s1"}, "s1", "elara")
+    assert lore.cancelled == 1
+    assert await cache.get_history("s1") == []
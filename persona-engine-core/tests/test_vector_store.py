@@ -0,0 +1,67 @@
+import pytest
+
+LORE = [
+    ("elara", "Elara was born in the Obsidian Spire during the Great Eclipse."),
+    ("elara", "She hates spiders because one bit her when she was casting a fireball."),
+    ("elara", "Her secret weakness is that she cannot lie on a full moon."),
+    ("mira", "Mira keeps a pet spider named Thread."),
+]
+
+
+class CallCounter:
+    def __init__(self, fn):
+        self.fn = fn
+        self.calls = 0
+
+    async def __call__(self, *args, **kwargs):
+        self.calls += 1
+        return await self.fn(*args, **kwargs)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["dense", "sparse", "hybrid"])
+async def test_each_mode_retrieves_relevant_lore_in_one_round_trip(lore_store, mode):
+    await lore_store.add_lore_batch(LORE)
+    lore_store.local_index = None  # Exercise the Qdrant path
+    lore_store.client.query_points = CallCounter(lore_store.client.query_points)
+
+    hits = await lore_store.retrieve("elara", "does she hate spiders", limit=3, mode=mode)
+
+    assert lore_store.client.query_points.calls == 1
+    assert "spiders" in hits[0].payload["text"]
+    assert all(hit.payload["char_id"] == "elara" for hit in hits)
+
+
+@pytest.mark.asyncio
+async def test_mode_is_selectable_per_character(lore_store):
+    await lore_store.add_lore_batch(LORE)
+    lore_store.set_retrieval_mode("mira", "sparse")
+
+    await lore_store.search_lore("mira", "spider")
+    # Sparse-only characters never run the dense model for queries
+    dense_calls = lore_store.dense.model.calls
+    await lore_store.search_lore("mira", "what is the spider called")
+    assert lore_store.dense.model.calls == dense_calls
+
+    with pytest.raises(ValueError):
+        lore_store.set_retrieval_mode("mira", "bm25")
+
+
+@pytest.mark.parametrize("default, overrides", [("hybird", ""), ("hybrid", "elara:dense,mira:bm25")])
+def test_configured_modes_are_validated_at_startup(fake_models, monkeypatch, default, overrides):
+    from src.core.config import settings
+    from src.memory.vector_store import LoreStore
+
+    monkeypatch.setattr(settings, "LORE_RETRIEVAL_MODE", default)
+    monkeypatch.setattr(settings, "LORE_RETRIEVAL_MODE_OVERRIDES", overrides)
+    with pytest.raises(ValueError):
+        LoreStore()
+
+
+@pytest.mark.asyncio
+async def test_search_lore_reranks_and_formats_top_k(lore_store):
+    await lore_store.add_lore_batch(LORE)
+
+    result = await lore_store.search_lore("elara", "secret weakness full moon", limit=1)
+
+    assert result == "- Her secret weakness is that she cannot lie on a full moon."
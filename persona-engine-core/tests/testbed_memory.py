@@ -2,7 +2,7 @@ from src.memory.vector_store import LoreStore
 from src.memory.cache_manager import CacheManager
 import asyncio
 
-def setup_lore():
+async def setup_lore():
     print("📚 Ingesting Lore into Qdrant...")
     store = LoreStore(host="localhost", port=6333)
     
@@ -13,13 +13,14 @@ def setup_lore():
         "Her secret weakness is that she cannot lie on a full moon."
     ]
     
+    # One batched embed + upsert (large bibles: python -m src.memory.ingest)
+    await store.add_lore_batch([(char_id, chunk) for chunk in lore_chunks])
     for chunk in lore_chunks:
-        store.add_lore(char_id, chunk)
         print(f"   -> Ingested: {chunk[:30]}...")
     
     # Test Retrieval
     print("\n🔍 Testing Retrieval:")
-    results = store.search_lore(char_id, "Does she like spiders?")
+    results = await store.search_lore(char_id, "Does she like spiders?")
     print(f"   Query: 'Does she like spiders?'\n   Result: {results}")
 
 async def test_redis():
@@ -30,5 +31,5 @@ async def test_redis():
     print(f"   History: {hist}")
 
 if __name__ == "__main__":
-    setup_lore()
+    asyncio.run(setup_lore())
     asyncio.run(test_redis())
\ No newline at end of file
@@ -1,30 +1,192 @@
+import asyncio
+import gzip
+import hashlib
+import hmac
 import logging
-import orjson
+import os
 import time
 from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import orjson
+from src.core.config import settings
+
+logger = logging.getLogger("safety_mesh")
+
 
-# Configure a specific logger for audit trails
-audit_logger = logging.getLogger("audit_trail")
-audit_logger.setLevel(logging.INFO)
-handler = logging.FileHandler("audit_safety.jsonl") # Rotation needed in prod
-audit_logger.addHandler(handler)
-
-def log_safety_event(
-    user_id: str, 
-    input_text: str, 
-    risk_scores: dict, 
-    decision: str, 
-    latency_ms: float
-):
+class AuditSink:
     """
-    Writes a structured JSON log entry.
+    Asynchronous, batched audit trail for safety decisions.
+
+    `log_event` only enqueues (the turn never touches the disk); a background
+    writer drains the bounded queue in batches - up to `batch_size` entries or
+    whatever arrived within `flush_interval_ms` - and appends them to gzip
+    JSONL segments on a worker thread. Segments rotate after
+    `segment_max_bytes` of uncompressed JSONL and carry the pid, so every
+    worker process writes its own files.
+
+    When the queue is full, "drop" discards the entry and counts it,
+    "block" makes the caller wait for the writer.
+    Inputs are logged as a keyed HMAC-SHA256 digest: stable across processes
+    and restarts (unlike hash()), so entries can be correlated, but not
+    reversible without the key.
     """
-    entry = {
-        "timestamp": datetime.utcnow().isoformat(),
-        "user_id": user_id,
-        "input_hash": hash(input_text), # Don't log full text if sensitive
-        "scores": risk_scores,
-        "decision": decision,
-        "latency_ms": latency_ms
-    }
-    audit_logger.info(orjson.dumps(entry).decode('utf-8'))
\ No newline at end of file
+    def __init__(
+        self,
+        directory: str = settings.AUDIT_DIR,
+        prefix: str = "audit_safety",
+        max_queue: int = settings.AUDIT_MAX_QUEUE,
+        batch_size: int = settings.AUDIT_BATCH_SIZE,
+        flush_interval_ms: float = settings.AUDIT_FLUSH_INTERVAL_MS,
+        segment_max_bytes: int = settings.AUDIT_SEGMENT_MAX_BYTES,
+        backpressure: str = settings.AUDIT_BACKPRESSURE,
+        digest_key: str = settings.AUDIT_DIGEST_KEY,
+    ):
+        if backpressure not in ("drop", "block"):
+            raise ValueError(f"Unknown audit backpressure policy: {backpressure}")
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.segment_max_bytes = segment_max_bytes
+        self.backpressure = backpressure
+        self._digest_key = digest_key.encode("utf-8")
+        if not digest_key:
+            # Unkeyed, the digest is plain SHA-256: short chat inputs can be recovered by dictionary attack
+            logger.warning("AUDIT_DIGEST_KEY is empty: audit input digests are not keyed, set a per-deployment secret")
+
+        self._queue: Optional[asyncio.Queue] = None # Created on first use (needs the running loop)
+        self._writer: Optional[asyncio.Task] = None
+        self._file: Optional[gzip.GzipFile] = None
+        self._segment_bytes = 0
+        self._segment_seq = 0
+
+        # Metrics
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.segments = 0
+        self.write_errors = 0
+        self.lag_ms = 0.0 # Enqueue-to-disk delay of the oldest entry in the last batch
+
+    def digest(self, text: str) -> str:
+        return hmac.new(self._digest_key, text.encode("utf-8"), hashlib.sha256).hexdigest()
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            self._queue = asyncio.Queue(maxsize=self.max_queue)
+            self._writer = asyncio.create_task(self._run())
+
+    async def log_event(
+        self,
+        user_id: str,
+        input_text: str,
+        risk_scores: dict,
+        decision: str,
+        latency_ms: float
+    ) -> bool:
+        """Queues one structured entry; returns False if it was dropped."""
+        entry = {
+            "timestamp": datetime.utcnow().isoformat(),
+            "user_id": user_id,
+            "input_digest": self.digest(input_text), # Don't log full text if sensitive
+            "scores": risk_scores,
+            "decision": decision,
+            "latency_ms": latency_ms
+        }
+        return await self.submit(entry)
+
+    async def submit(self, entry: dict) -> bool:
+        self._ensure_writer()
+        item = (time.monotonic(), entry)
+        if self.backpressure == "block":
+            await self._queue.put(item)
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                return False
+        self.enqueued += 1
+        return True
+
+    # --- Background writer ---
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        closing = False
+        while not closing:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch: List[Tuple[float, dict]] = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None: # aclose(): write what we have and stop
+                    closing = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Tuple[float, dict]]):
+        try:
+            # Odd score values (numpy floats, ...) are stringified rather than failing the batch
+            data = b"".join(orjson.dumps(entry, default=str) + b"\n" for _, entry in batch)
+            # File I/O and compression stay off the event loop
+            await asyncio.to_thread(self._write, data)
+            self.written += len(batch)
+        except Exception as e:
+            # Never let one bad batch stop the writer: later entries would be dropped or block forever
+            self.write_errors += 1
+            logger.error(f"Audit write failed, {len(batch)} entries lost: {e}")
+        self.batches += 1
+        self.lag_ms = (time.monotonic() - batch[0][0]) * 1000
+
+    def _write(self, data: bytes):
+        if self._file is None or self._segment_bytes >= self.segment_max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush() # Sync flush: a crash loses at most the current batch
+        self._segment_bytes += len(data)
+
+    def _rotate(self):
+        if self._file is not None:
+            self._file.close()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._segment_seq += 1
+        stamp = time.strftime("%Y%m%dT%H%M%S", time.gmtime())
+        path = self.directory / f"{self.prefix}-{stamp}-{os.getpid()}-{self._segment_seq:04d}.jsonl.gz"
+        self._file = gzip.open(path, "ab")
+        self._segment_bytes = 0
+        self.segments += 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "lag_ms": self.lag_ms,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "segments": self.segments,
+            "write_errors": self.write_errors,
+        }
+
+    async def aclose(self):
+        """Writes everything still queued, then closes the segment."""
+        if self._writer is not None:
+            await self._queue.put(None) # Queued after every pending entry
+            await self._writer
+            self._writer = None
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
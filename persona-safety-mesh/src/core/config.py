@@ -6,8 +6,41 @@ class Settings(BaseSettings):
     ENABLE_OPA: bool = False # Set to True if OPA server is deployed
     OPA_URL: str = "http://localhost:8181/v1/data/safety/allow"
     
+    # Static guard (keyword blocklists + PII redaction)
+    STATIC_BLOCKLIST_DIR: str = "data/blocklists" # *.txt (relative to persona-safety-mesh/), file name = category
+    STATIC_STREAM_HOLDBACK_CHARS: int = 64 # Streamed text withheld until no match can extend into it
+
+    # Jailbreak similarity (known-prompt corpus)
+    JAILBREAK_ENABLED: bool = True
+    JAILBREAK_CORPUS_PATH: str = "data/jailbreaks/corpus.yaml" # Versioned; relative to persona-safety-mesh/
+    JAILBREAK_THRESHOLD: float = 0.85 # Min cosine similarity to a known jailbreak
+    JAILBREAK_BACKEND: str = "memory" # "memory" (NumPy matrix) or "qdrant" (corpora too large for RAM)
+
     # Thresholds
     TOXICITY_THRESHOLD: float = 0.95 # Only block extreme toxicity
+
+    # Policy engine (compiled YAML decision table)
+    POLICY_DIR: str = "data/policies" # *.yaml (relative to persona-safety-mesh/), applied in name order
+    POLICY_RELOAD_INTERVAL_SECONDS: float = 2.0 # How often files are checked for changes; 0 disables hot reload
+
+    # Input scanner micro-batching
+    SCAN_MAX_BATCH_SIZE: int = 16 # Max texts per ONNX forward pass
+    SCAN_MAX_WAIT_MS: float = 5.0 # Max time the first text waits for batch-mates
+
+    # Streaming output monitor
+    OUTPUT_HOLDBACK_CHARS: int = 48 # Tail withheld even once scored (phrases spanning windows)
+    OUTPUT_WINDOW_MIN_CHARS: int = 40 # Score at a sentence break once this long
+    OUTPUT_WINDOW_MAX_CHARS: int = 200 # Force a window even without a sentence break
+    OUTPUT_WINDOW_OVERLAP_CHARS: int = 60 # Context carried over to catch spanning toxicity
+
+    # Audit trail (async batched writer)
+    AUDIT_DIR: str = "audit" # gzip JSONL segments, one series per worker process
+    AUDIT_MAX_QUEUE: int = 10000 # Entries buffered in memory
+    AUDIT_BATCH_SIZE: int = 256 # Max entries per write
+    AUDIT_FLUSH_INTERVAL_MS: float = 200.0 # Max time an entry waits for batch-mates
+    AUDIT_SEGMENT_MAX_BYTES: int = 64 * 1024 * 1024 # Uncompressed size before rotation
+    AUDIT_BACKPRESSURE: str = "drop" # Queue full: "drop" (counted) or "block" (turn waits)
+    AUDIT_DIGEST_KEY: str = "" # HMAC key for input digests; set per deployment (empty = unkeyed, logged at startup)
     
     class Config:
         env_file = ".env"
@@ -3,6 +3,7 @@ from src.core.config import settings
 import logging
 from optimum.pipelines import pipeline
 from src.core.config import settings
+from src.core.batching import MicroBatcher # Shared with Phase 2 (persona-engine-core)
 from src.memory.cache_manager import CacheManager # Reuse from Phase 2
 import logging
 import orjson
@@ -28,8 +29,25 @@ class InputScanner:
             )
             # Link to Phase 2 Redis
             cls._instance.cache = CacheManager(host="redis") 
+            # OPTIMIZATION: Concurrent scans from every connection share one batched
+            # ONNX forward pass on a dedicated worker thread (event loop stays free)
+            cls._instance.batcher = MicroBatcher(
+                cls._instance._classify_batch,
+                max_batch_size=settings.SCAN_MAX_BATCH_SIZE,
+                max_wait_ms=settings.SCAN_MAX_WAIT_MS,
+                name="input-scanner",
+            )
         return cls._instance
 
+    def _classify_batch(self, texts: list[str]) -> list[dict]:
+        """Runs on the batcher thread. One ONNX call for the whole batch."""
+        results = self.classifier(texts, batch_size=len(texts))
+        return [{item['label']: item['score'] for item in result} for result in results]
+
+    def metrics(self) -> dict:
+        """Queue depth and batch-size distribution of the inference scheduler."""
+        return self.batcher.stats()
+
     def _get_hash(self, text: str) -> str:
         return hashlib.md5(text.encode()).hexdigest()
 
@@ -46,11 +64,10 @@ class InputScanner:
         if cached_result:
             return orjson.loads(cached_result)
 
-        # Run Inference (Sync task in async wrapper)
+        # Run Inference (batched, off the event loop)
         try:
             # Truncate to 512 to prevent DoS via massive context
-            results = self.classifier(text[:512]) 
-            scores = {item['label']: item['score'] for item in results[0]}
+            scores = await self.batcher.submit(text[:512])
             
             # OPTIMIZATION: Cache result for 24 hours
             await self._instance.cache.redis.setex(
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import time
+from typing import AsyncIterator, Optional
+
+from src.core.config import settings
+
+logger = logging.getLogger("safety_mesh")
+
+_END = object()
+_SCORED = object() # Wakes stream(): a window scored clean, more text may be released
+SENTENCE_BREAKS = (".", "!", "?", "\n")
+
+
+class OutputMonitor:
+    """
+    Streaming output guard (one instance per generated turn).
+
+    Sentence-aligned, overlapping windows are scored by a background task, so
+    reading from upstream never waits on the classifier. Text is released once
+    the windows covering it scored clean (and it is more than a small hold-back
+    tail behind the head of the stream), so the client lags by about one
+    window plus one scan. On a violation, or if the scanner fails, the upstream
+    generator (vLLM HTTP stream) is cancelled and the withheld text is never
+    released.
+    """
+    def __init__(
+        self,
+        scanner,
+        threshold: float = settings.TOXICITY_THRESHOLD,
+        holdback_chars: int = settings.OUTPUT_HOLDBACK_CHARS,
+        min_window_chars: int = settings.OUTPUT_WINDOW_MIN_CHARS,
+        max_window_chars: int = settings.OUTPUT_WINDOW_MAX_CHARS,
+        overlap_chars: int = settings.OUTPUT_WINDOW_OVERLAP_CHARS,
+    ):
+        self.scanner = scanner
+        self.threshold = threshold
+        self.holdback_chars = holdback_chars
+        self.min_window_chars = min_window_chars
+        self.max_window_chars = max_window_chars
+        self.overlap_chars = overlap_chars
+
+        self.violation: Optional[dict] = None
+        self._held = ""        # Received but not yet released to the client
+        self._received = 0     # Stream offsets: chars received,
+        self._released = 0     # released to the client,
+        self._scored_upto = 0  # and covered by windows that scored clean
+        self._segment = ""     # Received since the last window was submitted
+        self._overlap = ""     # Tail of the previous window (context for the next)
+        self._windows: asyncio.Queue = asyncio.Queue()
+        self._tokens: asyncio.Queue = asyncio.Queue()
+        self._pump_task: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.tokens_in = 0
+        self.windows_scored = 0
+        self.scan_seconds = 0.0
+
+    async def stream(self, upstream: AsyncIterator[str]) -> AsyncIterator[str]:
+        """Yields safe text chunks from `upstream` while scoring runs concurrently."""
+        self._pump_task = asyncio.create_task(self._pump(upstream))
+        scorer = asyncio.create_task(self._score_windows())
+        try:
+            while self.violation is None:
+                token = await self._tokens.get()
+                if token is _END:
+                    break
+                if token is _SCORED:
+                    released = self._release(self.holdback_chars)
+                else:
+                    self.tokens_in += 1
+                    released = self._feed(token)
+                if released and self.violation is None:
+                    yield released
+
+            if self.violation is None:
+                # End of stream: the tail is only released once fully scored
+                self._submit_window()
+                await self._drain(scorer)
+                tail = self._release(0) if self.violation is None else ""
+                if tail:
+                    yield tail
+        finally:
+            self._pump_task.cancel()
+            scorer.cancel()
+
+    def _feed(self, token: str) -> str:
+        self._held += token
+        self._segment += token
+        self._received += len(token)
+
+        if len(self._segment) >= self.max_window_chars or (
+            len(self._segment) >= self.min_window_chars and token.rstrip(" ").endswith(SENTENCE_BREAKS)
+        ):
+            self._submit_window()
+        return self._release(self.holdback_chars)
+
+    def _release(self, holdback_chars: int) -> str:
+        """Releases the prefix scored clean, except the hold-back tail."""
+        cut = min(self._received - holdback_chars, self._scored_upto) - self._released
+        if cut <= 0:
+            return ""
+        released, self._held = self._held[:cut], self._held[cut:]
+        self._released += cut
+        return released
+
+    def _submit_window(self):
+        if not self._segment.strip():
+            # Nothing to score: whitespace is clean once everything before it is
+            self._windows.put_nowait((None, self._received))
+            self._segment = ""
+            return
+        window = self._overlap + self._segment
+        self._windows.put_nowait((window, self._received))
+        self._overlap = window[-self.overlap_chars:] if self.overlap_chars else ""
+        self._segment = ""
+
+    async def _pump(self, upstream: AsyncIterator[str]):
+        """Reads upstream into a queue so it can be cancelled mid-token."""
+        try:
+            async for token in upstream:
+                self._tokens.put_nowait(token)
+        finally:
+            self._tokens.put_nowait(_END)
+
+    async def _score_windows(self):
+        while True:
+            window, end = await self._windows.get()
+            try:
+                if window is not None:
+                    start = time.perf_counter()
+                    try:
+                        scores = await self.scanner.scan(window)
+                    except Exception as e:
+                        # Fail closed: unscored text is never released
+                        logger.error(f"Output scan failed, withholding the rest of the stream: {e}")
+                        self._on_violation({"error": str(e)})
+                        return
+                    self.scan_seconds += time.perf_counter() - start
+                    self.windows_scored += 1
+                    if scores.get("toxicity", 0) > self.threshold:
+                        self._on_violation(scores)
+                        return
+                self._scored_upto = end
+                self._tokens.put_nowait(_SCORED)
+            finally:
+                self._windows.task_done()
+
+    def _on_violation(self, scores: dict):
+        self.violation = scores
+        self._held = ""
+        # Cancelling the pump closes the upstream HTTP stream, aborting generation
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+        self._tokens.put_nowait(_END)
+
+    async def _drain(self, scorer: asyncio.Task):
+        joined = asyncio.create_task(self._windows.join())
+        await asyncio.wait({joined, scorer}, return_when=asyncio.FIRST_COMPLETED)
+        joined.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "tokens_in": self.tokens_in,
+            "windows_scored": self.windows_scored,
+            "scan_seconds": self.scan_seconds,
+            "violation": self.violation is not None,
+        }
@@ -1,39 +1,217 @@
-from flashtext import KeywordProcessor
+import ahocorasick
 import re
 import logging
+from pathlib import Path
+from typing import Iterable, List, Optional
+from src.core.config import settings
 
 logger = logging.getLogger("safety_mesh")
 
+# Fallback when no blocklist files are deployed
+DEFAULT_BLOCKLIST = ["badword1", "slur_a", "slur_b", "kill_yourself"]
+
+# One alternation, one pass: the group name is the PII type
+PII_PATTERN = re.compile(
+    r'\b(?:'
+    r'(?P<EMAIL>[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,})'
+    r'|(?P<SSN>\d{3}-\d{2}-\d{4})'
+    r'|(?P<PHONE>\d{3}[-.]?\d{3}[-.]?\d{4})'
+    r')\b'
+)
+
+# Every PII type needs a digit or "@": most chat messages skip the regex entirely
+_PII_HINT = re.compile(r'[@\d]')
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+def _lower(text: str) -> str:
+    """Lowercases without changing offsets (a few characters grow when lowercased)."""
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return "".join(c if len(c.lower()) != 1 else c.lower() for c in text)
+
+
+class Span:
+    """A typed match: kind is "KEYWORD" or a PII type; offsets index the scanned text."""
+    __slots__ = ("kind", "start", "end", "value", "category")
+
+    def __init__(self, kind: str, start: int, end: int, value: str, category: Optional[str] = None):
+        self.kind = kind
+        self.start = start
+        self.end = end
+        self.value = value
+        self.category = category # Blocklist name for keywords
+
+    def shifted(self, offset: int) -> "Span":
+        return Span(self.kind, self.start + offset, self.end + offset, self.value, self.category)
+
+    def __repr__(self):
+        return f"Span({self.kind}, {self.start}, {self.end}, {self.value!r})"
+
+
 class StaticGuard:
-    def __init__(self):
-        # 1. FlashText for Blocklist
-        self.keyword_processor = KeywordProcessor()
-        # In prod, load this from a generic_banlist.txt
-        self.keyword_processor.add_keywords_from_list([
-            "badword1", "slur_a", "slur_b", "kill_yourself"
-        ])
-
-        # 2. Regex for PII (Simple, fast patterns)
-        self.pii_patterns = {
-            "EMAIL": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
-            "PHONE": re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
-            "SSN":   re.compile(r'\b\d{3}-\d{2}-\d{4}\b')
-        }
+    """
+    Microsecond-level keyword blocking and PII redaction.
+
+    Blocklists (one term per line, `#` comments; the file name is the category)
+    are compiled into one Aho-Corasick automaton, so a message is scanned once
+    however many terms there are. Keywords match case-insensitively on word
+    boundaries. PII types share one named-group regex, so redaction is a single
+    pass that also reports typed spans.
+    """
+    def __init__(self, blocklist_dir: Optional[str] = None, terms: Optional[Iterable[str]] = None):
+        self.automaton = ahocorasick.Automaton()
+        self.max_term_chars = 0
+        if terms is not None:
+            self._add_terms(terms, "custom")
+        else:
+            directory = Path(blocklist_dir or settings.STATIC_BLOCKLIST_DIR)
+            if not directory.is_absolute():
+                directory = Path(__file__).parent.parent.parent / directory
+            files = sorted(directory.glob("*.txt")) if directory.is_dir() else []
+            for path in files:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._add_terms((line.split("#", 1)[0] for line in f), path.stem)
+            if not files:
+                logger.warning(f"No blocklists in {directory}, using the built-in list")
+                self._add_terms(DEFAULT_BLOCKLIST, "default")
+        self.terms = len(self.automaton)
+        if self.terms:
+            self.automaton.make_automaton()
+        logger.info(f"StaticGuard: {self.terms} blocklist terms")
+
+        self.pii_pattern = PII_PATTERN
+
+    def _add_terms(self, terms: Iterable[str], category: str):
+        for term in terms:
+            term = _lower(term.strip())
+            if term:
+                self.automaton.add_word(term, (term, category))
+                self.max_term_chars = max(self.max_term_chars, len(term))
+
+    # --- Scanning ---
+    def find_keywords(self, text: str, start: int = 0) -> List[Span]:
+        """Whole-word blocklist hits at or after `start` (leftmost-longest, non-overlapping)."""
+        if not self.terms:
+            return []
+        haystack = _lower(text)
+        hits = []
+        for end, (term, category) in self.automaton.iter(haystack, start):
+            begin = end + 1 - len(term)
+            end += 1
+            if (begin > 0 and _is_word_char(text[begin - 1])) or (end < len(text) and _is_word_char(text[end])):
+                continue
+            hits.append((begin, end, category))
+        # Overlapping terms ("kill", "kill_yourself"): leftmost, then longest
+        hits.sort(key=lambda h: (h[0], h[0] - h[1]))
+        spans = []
+        for begin, end, category in hits:
+            if not spans or begin >= spans[-1].end:
+                spans.append(Span("KEYWORD", begin, end, text[begin:end], category))
+        return spans
+
+    def find_pii(self, text: str, start: int = 0) -> List[Span]:
+        if not _PII_HINT.search(text, start):
+            return []
+        return [
+            Span(m.lastgroup, m.start(), m.end(), m.group())
+            for m in self.pii_pattern.finditer(text, start)
+        ]
+
+    def scan(self, text: str) -> List[Span]:
+        """Every keyword and PII span, ordered by offset."""
+        return sorted(self.find_keywords(text) + self.find_pii(text), key=lambda s: s.start)
+
+    @staticmethod
+    def redact(text: str, spans: List[Span]) -> str:
+        """Replaces PII spans with <TYPE_REDACTED> in one pass."""
+        pieces = []
+        cursor = 0
+        for span in spans:
+            if span.kind == "KEYWORD" or span.start < cursor:
+                continue
+            pieces.append(text[cursor:span.start])
+            pieces.append(f"<{span.kind}_REDACTED>")
+            cursor = span.end
+        pieces.append(text[cursor:])
+        return "".join(pieces)
 
     def sanitize(self, text: str) -> tuple[str, bool, str]:
         """
         Returns: (sanitized_text, is_blocked, reason)
         """
-        # 1. Check Blocklist (Circuit Breaker)
-        # extract_keywords is incredibly fast
-        found_keywords = self.keyword_processor.extract_keywords(text)
-        if found_keywords:
-            return text, True, f"Blocked keywords found: {found_keywords[:3]}"
+        # 1. Check Blocklist (Circuit Breaker): one automaton pass
+        keywords = self.find_keywords(text)
+        if keywords:
+            return text, True, f"Blocked keywords found: {[s.value for s in keywords[:3]]}"
 
         # 2. Scrub PII
         # We don't block PII, we redact it so the model is safe to use.
-        sanitized_text = text
-        for pii_type, pattern in self.pii_patterns.items():
-            sanitized_text = pattern.sub(f"<{pii_type}_REDACTED>", sanitized_text)
-        
-        return sanitized_text, False, None
\ No newline at end of file
+        return self.redact(text, self.find_pii(text)), False, None
+
+    def stream(
+        self, holdback_chars: int = settings.STATIC_STREAM_HOLDBACK_CHARS, min_release_chars: int = 16
+    ) -> "StaticStream":
+        """Incremental scanner for streamed output (one per generated turn)."""
+        return StaticStream(self, holdback_chars, min_release_chars)
+
+
+class StaticStream:
+    """
+    Feeds chunks through the StaticGuard engine as they arrive.
+
+    Text is released once no match can still extend into it: a tail of
+    `holdback_chars` (at least the longest blocklist term) is held back, and a
+    match crossing the release point is held whole. Released text is already
+    redacted; `spans` reports every match with offsets into the full stream.
+    Text is released in steps of `min_release_chars`, so token-sized chunks
+    don't rescan the held tail on every feed.
+    """
+    def __init__(self, guard: StaticGuard, holdback_chars: int, min_release_chars: int = 16):
+        self.guard = guard
+        self.holdback_chars = max(holdback_chars, guard.max_term_chars + 1)
+        self.min_release_chars = min_release_chars
+        self.spans: List[Span] = []
+        self.blocked = False
+        self._buffer = ""
+        self._context = ""   # Last released character: word boundaries look behind it
+        self._offset = 0     # Stream offset of _buffer[0]
+
+    def feed(self, chunk: str) -> str:
+        """Adds a chunk; returns the redacted text that is now final (check `blocked` before sending it)."""
+        self._buffer += chunk
+        cut = len(self._buffer) - self.holdback_chars
+        return self._release(cut) if cut >= self.min_release_chars else ""
+
+    def flush(self) -> str:
+        """End of stream: returns the redacted remainder."""
+        return self._release(len(self._buffer))
+
+    def _release(self, cut: int) -> str:
+        if cut <= 0:
+            return ""
+        text = self._context + self._buffer
+        base = len(self._context)
+        spans = sorted(
+            self.guard.find_keywords(text, base) + self.guard.find_pii(text, base), key=lambda s: s.start
+        )
+        cut += base
+        for span in spans:
+            if span.start < cut < span.end:
+                cut = span.start # Still growing: hold the whole match
+                break
+        final = [s for s in spans if s.end <= cut]
+        if cut <= base:
+            return ""
+
+        shift = self._offset - base
+        for span in final:
+            self.spans.append(span.shifted(shift))
+            self.blocked = self.blocked or span.kind == "KEYWORD"
+        released = self.guard.redact(text[:cut], final)[base:]
+        self._context = text[cut - 1]
+        self._buffer = text[cut:]
+        self._offset += cut - base
+        return released
@@ -1,47 +1,74 @@
+import asyncio
 import time
+from typing import Optional
+from src.core.config import settings
 from src.guards.input_scanner import InputScanner
+from src.guards.jailbreak_scanner import JailbreakScanner
 from src.guards.static_guard import StaticGuard
 from src.policy.engine import PolicyEngine
-from src.core.audit import log_safety_event
-from fastapi import BackgroundTasks
+from src.core.audit import AuditSink
 
 class SafetyMesh:
     def __init__(self):
         self.static = StaticGuard()
         self.scanner = InputScanner() # ONNX
         self.policy = PolicyEngine()
+        self.jailbreak = JailbreakScanner() if settings.JAILBREAK_ENABLED else None
+        self.audit = AuditSink()
 
-    async def check_input(self, text: str, context: dict, background_tasks: BackgroundTasks) -> dict:
+    def start(self):
+        """Starts background tasks (policy hot reload); needs a running loop."""
+        self.policy.start()
+
+    def precheck(self, text: str) -> tuple[str, bool, str]:
+        """Static stage only: (sanitized_text, is_blocked, reason). Callers may pass it to check_input."""
+        return self.static.sanitize(text)
+
+    async def check_input(self, text: str, context: dict, prechecked: Optional[tuple] = None) -> dict:
         start_time = time.perf_counter()
         user_id = context.get("user_id", "anon")
         
         # 1. OPTIMIZATION: Static Circuit Breaker (Microseconds)
-        safe_text, is_blocked, reason = self.static.sanitize(text)
+        safe_text, is_blocked, reason = prechecked or self.precheck(text)
         
         if is_blocked:
-            # Audit Log (Async)
-            background_tasks.add_task(
-                log_safety_event, user_id, text, {"static_ban": 1.0}, "BLOCKED_STATIC", 0.1
-            )
+            # Audit Log (Async: queued, written in batches off the turn)
+            await self.audit.log_event(user_id, text, {"static_ban": 1.0}, "BLOCKED_STATIC", 0.1)
             return {"allowed": False, "reason": reason, "text": text}
 
         # 2. Neural Scan (Milliseconds)
-        # We use the sanitized text (PII removed) for the model
-        risk_scores = await self.scanner.scan(safe_text)
-        
+        # We use the sanitized text (PII removed) for the model.
+        # The jailbreak match runs concurrently (shared embedding batcher + in-memory matrix)
+        if self.jailbreak is not None:
+            risk_scores, (is_jailbreak, similarity) = await asyncio.gather(
+                self.scanner.scan(safe_text), self.jailbreak.check(safe_text)
+            )
+            risk_scores = {**risk_scores, "jailbreak": similarity} # Scanner results may be cached: copy
+        else:
+            risk_scores = await self.scanner.scan(safe_text)
+            is_jailbreak = False
+
         # 3. Policy Evaluation
-        allowed, policy_reason = self.policy.evaluate(risk_scores, context)
+        if is_jailbreak:
+            allowed, policy_reason = False, "Request matches a known jailbreak pattern."
+            decision = "BLOCKED_JAILBREAK"
+        else:
+            allowed, policy_reason = self.policy.evaluate(risk_scores, context)
+            decision = "ALLOWED" if allowed else "BLOCKED_MODEL"
         
         # 4. Audit Log (Async)
         latency = (time.perf_counter() - start_time) * 1000
-        decision = "ALLOWED" if allowed else "BLOCKED_MODEL"
         
-        background_tasks.add_task(
-            log_safety_event, user_id, text, risk_scores, decision, latency
-        )
+        await self.audit.log_event(user_id, text, risk_scores, decision, latency)
 
         return {
             "allowed": allowed, 
             "reason": policy_reason, 
             "text": safe_text # Return sanitized text to be sent to LLM
-        }
\ No newline at end of file
+        }
+
+    async def aclose(self):
+        await self.policy.aclose()
+        if self.jailbreak is not None:
+            await self.jailbreak.aclose()
+        await self.audit.aclose()
@@ -1,39 +1,282 @@
-import yaml
+import asyncio
+import itertools
+import logging
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import yaml
 from src.core.config import settings
 
+logger = logging.getLogger("safety_mesh")
+
+# libyaml when available: tenant override files can be long
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+ANY = "*" # Table key for a region/tier/tenant no policy mentions
+DIMENSIONS = ("region", "tier", "tenant")
+SAFE = "Safe"
+MAX_RESOLVED = 65536 # Memoized context -> rules lookups per compiled policy
+
+# (score name, max, reason): blocked when score > max
+Rule = Tuple[str, float, str]
+
+
+class CompiledPolicy:
+    """
+    Every (region, tier, tenant) combination the policy files can tell apart,
+    resolved ahead of time to its ordered rule tuple.
+    """
+    __slots__ = ("table", "known", "files", "_resolved")
+
+    def __init__(self, table: Dict[Tuple[str, str, str], Tuple[Rule, ...]], known: Tuple[frozenset, ...], files: int):
+        self.table = table
+        self.known = known # Values mentioned per dimension; anything else maps to ANY
+        self.files = files
+        self._resolved: Dict[Tuple[str, str, str], Tuple[Rule, ...]] = {} # Context values -> rules
+
+    def key(self, context: Mapping) -> Tuple[str, str, str]:
+        get = context.get
+        regions, tiers, tenants = self.known
+        region, tier, tenant = get("region") or "US", get("tier") or "free", get("tenant") or "default"
+        return (
+            region if region in regions else ANY,
+            tier if tier in tiers else ANY,
+            tenant if tenant in tenants else ANY,
+        )
+
+    def rules(self, context: Mapping) -> Tuple[Rule, ...]:
+        get = context.get
+        raw = (get("region") or "US", get("tier") or "free", get("tenant") or "default")
+        rules = self._resolved.get(raw)
+        if rules is None:
+            if len(self._resolved) >= MAX_RESOLVED:
+                self._resolved.clear() # Bounded: tenant ids are unbounded
+            rules = self._resolved[raw] = self.table[self.key(context)]
+        return rules
+
+
+def _limit(value) -> Optional[float]:
+    """A number, None (no limit) or the name of a setting."""
+    if isinstance(value, str):
+        value = getattr(settings, value)
+    return None if value is None else float(value)
+
+
+def _parse_rules(entries, source: str) -> List[Tuple[str, Optional[float], str]]:
+    rules = []
+    for entry in entries or []:
+        if "score" not in entry or "max" not in entry:
+            raise ValueError(f"{source}: rule needs 'score' and 'max': {entry}")
+        rules.append((entry["score"], _limit(entry["max"]), entry.get("reason") or f"Content flagged as {entry['score']}."))
+    return rules
+
+
+def _parse_match(match, source: str) -> Dict[str, frozenset]:
+    match = match or {}
+    unknown = set(match) - set(DIMENSIONS)
+    if unknown:
+        raise ValueError(f"{source}: unknown match keys {sorted(unknown)}")
+    return {
+        name: frozenset(str(v) for v in (values if isinstance(values, list) else [values]))
+        for name, values in match.items()
+    }
+
+
+def compile_policies(documents: Sequence[Tuple[str, dict]]) -> CompiledPolicy:
+    """
+    Builds the decision table from parsed policy documents, in order.
+
+    Top-level `rules` of every document form the base; `overrides` are then
+    applied in document order. Only values some `match` mentions get their
+    own table entries, so the table stays small however many users there are.
+    """
+    base: List[Tuple[Dict[str, frozenset], list]] = []
+    overrides: List[Tuple[Dict[str, frozenset], list]] = []
+    for source, doc in documents:
+        doc = doc or {}
+        base.append(({}, _parse_rules(doc.get("rules"), source)))
+        for override in doc.get("overrides") or []:
+            overrides.append((_parse_match(override.get("match"), source), _parse_rules(override.get("rules"), source)))
+    layers = base + overrides
+
+    known = tuple(
+        frozenset(itertools.chain.from_iterable(match.get(name, ()) for match, _ in layers))
+        for name in DIMENSIONS
+    )
+    # Per dimension and value: bitmask of the layers that accept it
+    masks = []
+    for d, name in enumerate(DIMENSIONS):
+        unconstrained = sum(1 << i for i, (match, _) in enumerate(layers) if name not in match)
+        by_value = {value: unconstrained for value in known[d]}
+        by_value[ANY] = unconstrained
+        for i, (match, _) in enumerate(layers):
+            for value in match.get(name, ()):
+                by_value[value] |= 1 << i
+        masks.append(by_value)
+
+    table = {}
+    for key in itertools.product(*(sorted(values) + [ANY] for values in known)):
+        limits: Dict[str, Tuple[Optional[float], str]] = {} # Insertion order = check order
+        matching = masks[0][key[0]] & masks[1][key[1]] & masks[2][key[2]]
+        while matching:
+            low = matching & -matching
+            matching ^= low
+            for score, limit, reason in layers[low.bit_length() - 1][1]:
+                limits[score] = (limit, reason)
+        table[key] = tuple((score, limit, reason) for score, (limit, reason) in limits.items() if limit is not None)
+    return CompiledPolicy(table, known, len(documents))
+
+
 class PolicyEngine:
-    def __init__(self):
-        # Load local policy definition
-        policy_path = Path(__file__).parent.parent.parent / "data/policies/standard.yaml"
-        with open(policy_path, 'r') as f:
-            self.rules = yaml.safe_load(f)
+    """
+    Allow/Block decisions from risk scores and the user's context.
+
+    The YAML files in `policy_dir` are compiled into a decision table keyed by
+    (region, tier, tenant), so `evaluate` is a dict lookup plus a few float
+    compares. After `start()`, a background task re-checks the files (one stat
+    per file) every `reload_interval` seconds and recompiles a changed set in a
+    worker thread, off the event loop; the result is swapped in with a single
+    reference assignment, so a decision never sees half a policy. A policy that
+    fails to load is logged and the previous one stays active.
+    """
+    def __init__(
+        self,
+        policy_dir: Optional[str] = None,
+        reload_interval: float = settings.POLICY_RELOAD_INTERVAL_SECONDS,
+    ):
+        directory = Path(policy_dir or settings.POLICY_DIR)
+        if not directory.is_absolute():
+            directory = Path(__file__).parent.parent.parent / directory
+        self.directory = directory
+        self.reload_interval = reload_interval
+        self._signature = None
+        self._watcher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.evaluations = 0
+        self.reloads = 0
+        self.reload_errors = 0
+
+        self.policy: CompiledPolicy = self._load(self._files())
+        logger.info(f"Policies: {self.policy.files} files, {len(self.policy.table)} compiled contexts")
+
+    # --- Loading ---
+    def _files(self) -> List[Path]:
+        return sorted(self.directory.glob("*.yaml"))
+
+    def _stat(self, files: List[Path]):
+        signature = []
+        for path in files:
+            st = os.stat(path)
+            signature.append((path.name, st.st_mtime_ns, st.st_size))
+        return tuple(signature)
+
+    def _load(self, files: List[Path]) -> CompiledPolicy:
+        signature = self._stat(files)
+        documents = []
+        for path in files:
+            with open(path, "r") as f:
+                documents.append((path.name, yaml.load(f, Loader=YAML_LOADER)))
+        policy = compile_policies(documents)
+        self._signature = signature
+        return policy
 
+    def reload(self) -> bool:
+        """Recompiles if any policy file changed; returns True if a new policy was swapped in."""
+        try:
+            files = self._files()
+            if self._stat(files) == self._signature:
+                return False
+            policy = self._load(files)
+        except Exception as e:
+            self.reload_errors += 1
+            # Don't retry the same broken files every interval
+            try:
+                self._signature = self._stat(self._files())
+            except OSError:
+                pass
+            logger.error(f"Policy reload failed, keeping the previous policy: {e}")
+            return False
+        self.policy = policy # Atomic swap: evaluations hold either the old or the new table
+        self.reloads += 1
+        logger.info(f"Policies reloaded: {len(policy.table)} compiled contexts")
+        return True
+
+    def start(self):
+        """Starts the background reload task (needs a running loop)."""
+        if self._watcher is None and self.reload_interval > 0:
+            self._watcher = asyncio.create_task(self._watch())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            # Stat, YAML parse and table compile grow with the policy: keep them off the loop
+            await asyncio.to_thread(self.reload)
+
+    async def aclose(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            await asyncio.gather(self._watcher, return_exceptions=True)
+            self._watcher = None
+
+    # --- Evaluation ---
     def evaluate(self, risk_scores: Dict[str, float], context: Dict) -> tuple[bool, str]:
         """
-        Decides Allow/Block based on Risk Scores + Context (User Region, Tier).
+        Decides Allow/Block based on Risk Scores + Context (User Region, Tier, Tenant).
         Returns: (is_allowed, reason)
         """
-        user_region = context.get("region", "US")
-        user_tier = context.get("tier", "free")
-
-        # 1. Critical Failures (Global)
-        if risk_scores.get("severe_toxicity", 0) > 0.9:
-            return False, "Content flagged as severely toxic."
-
-        # 2. Regional Compliance (e.g., GDPR or stricter regions)
-        if user_region in ["AE", "CN", "SA"]:
-            if risk_scores.get("sexual_explicit", 0) > 0.5:
-                return False, "Content restricted in your region."
-
-        # 3. Enterprise vs Free Tier
-        # Free users have stricter filters to save costs/reputation
-        threshold = settings.TOXICITY_THRESHOLD
-        if user_tier == "enterprise":
-            threshold = 0.99 # Relaxed for trusted enterprise users
-        
-        if risk_scores.get("toxicity", 0) > threshold:
-            return False, "Content flagged as toxic."
-
-        return True, "Safe"
\ No newline at end of file
+        self.evaluations += 1
+        for score, limit, reason in self.policy.rules(context):
+            if risk_scores.get(score, 0) > limit:
+                return False, reason
+        return True, SAFE
+
+    def evaluate_many(
+        self, risk_scores: Mapping[str, np.ndarray], context: Union[Dict, Sequence[Dict]]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Scores a batch at once: `risk_scores` maps each score name to an array
+        with one value per item. `context` is one context for the whole batch
+        or a sequence with one per item.
+        Returns: (allowed bool array, reasons object array)
+        """
+        policy = self.policy
+        columns = {name: np.asarray(values) for name, values in risk_scores.items()}
+        n = len(next(iter(columns.values()))) if columns else (0 if isinstance(context, Mapping) else len(context))
+        self.evaluations += n
+
+        if isinstance(context, Mapping):
+            groups = {policy.key(context): slice(None)}
+        else:
+            keys = [policy.key(c) for c in context]
+            groups = {}
+            for i, key in enumerate(keys):
+                groups.setdefault(key, []).append(i)
+
+        reasons = np.full(n, SAFE, dtype=object)
+        allowed = np.ones(n, dtype=bool)
+        for key, rows in groups.items():
+            rows = rows if isinstance(rows, slice) else np.asarray(rows)
+            open_rows = allowed[rows]
+            for score, limit, reason in policy.table[key]:
+                values = columns.get(score)
+                if values is None:
+                    continue
+                hit = (values[rows] > limit) & open_rows # First violated rule wins
+                if hit.any():
+                    open_rows = open_rows & ~hit
+                    block = np.flatnonzero(hit) if isinstance(rows, slice) else rows[hit]
+                    reasons[block] = reason
+            allowed[rows] = open_rows
+        return allowed, reasons
+
+    def stats(self) -> dict:
+        return {
+            "files": self.policy.files,
+            "contexts": len(self.policy.table),
+            "evaluations": self.evaluations,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
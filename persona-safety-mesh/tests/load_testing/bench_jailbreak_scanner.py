@@ -0,0 +1,55 @@
+"""
+JailbreakScanner in-memory match cost.
+
+    python tests/load_testing/bench_jailbreak_scanner.py
+    python tests/load_testing/bench_jailbreak_scanner.py --prompts 1000 10000 100000 --checks 2000
+
+Times `best_match` (one normalized matrix-vector product + argmax) against
+corpora of random 1024-d vectors, i.e. the per-check cost once the query is
+embedded. Embedding itself is excluded: it is batched with other callers by
+the shared EmbeddingService.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.guards.jailbreak_scanner import JailbreakScanner, _normalize
+
+DIM = 1024
+
+
+class RandomEmbedder:
+    """No model needed: the corpus matrix is replaced before timing."""
+    def embed_sync(self, texts):
+        return np.ones((len(texts), DIM), dtype=np.float32)
+
+    async def embed(self, texts):
+        return self.embed_sync(texts)
+
+
+def main(args):
+    rng = np.random.default_rng(0)
+    scanner = JailbreakScanner(backend="memory", embedder=RandomEmbedder())
+    queries = rng.standard_normal((args.checks, DIM)).astype(np.float32)
+
+    for prompts in args.prompts:
+        scanner.matrix = _normalize(rng.standard_normal((prompts, DIM)).astype(np.float32))
+        best_match = scanner.best_match
+        start = time.perf_counter()
+        for query in queries:
+            best_match(query)
+        elapsed = time.perf_counter() - start
+        print(f"{prompts:>8} prompts | {elapsed / args.checks * 1e6:8.1f} us/check ({args.checks / elapsed:9.0f} checks/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--checks", type=int, default=2000)
+    main(parser.parse_args())
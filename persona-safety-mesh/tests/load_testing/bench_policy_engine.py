@@ -0,0 +1,105 @@
+"""
+PolicyEngine throughput.
+
+    python tests/load_testing/bench_policy_engine.py
+    python tests/load_testing/bench_policy_engine.py --evaluations 1000000 --tenants 1000
+
+Compares the compiled decision table (`evaluate`, one call per message) with
+the previous hard-coded if-chain and with `evaluate_many` over NumPy arrays.
+--tenants adds that many per-tenant override files to show lookup cost does
+not grow with the policy size.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.policy.engine import PolicyEngine
+
+POLICY_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'policies')
+REGIONS = ["US", "DE", "AE", "CN", "SA", "BR"]
+TIERS = ["free", "pro", "enterprise"]
+
+
+def legacy_evaluate(risk_scores, context):
+    if risk_scores.get("severe_toxicity", 0) > 0.9:
+        return False, "Content flagged as severely toxic."
+    if context.get("region", "US") in ["AE", "CN", "SA"]:
+        if risk_scores.get("sexual_explicit", 0) > 0.5:
+            return False, "Content restricted in your region."
+    threshold = 0.99 if context.get("tier", "free") == "enterprise" else 0.95
+    if risk_scores.get("toxicity", 0) > threshold:
+        return False, "Content flagged as toxic."
+    return True, "Safe"
+
+
+def workload(n: int, tenants: int, rng: random.Random):
+    scores = [
+        {"toxicity": rng.random(), "severe_toxicity": rng.random() ** 4, "sexual_explicit": rng.random() ** 2}
+        for _ in range(n)
+    ]
+    contexts = [
+        {"region": rng.choice(REGIONS), "tier": rng.choice(TIERS), "tenant": f"tenant-{rng.randrange(max(tenants, 1) * 2)}"}
+        for _ in range(n)
+    ]
+    return scores, contexts
+
+
+def write_tenant_policies(directory: str, tenants: int, rng: random.Random):
+    shutil.copy(os.path.join(POLICY_DIR, "standard.yaml"), directory)
+    with open(os.path.join(directory, "tenants.yaml"), "w") as f:
+        f.write("overrides:\n")
+        for i in range(tenants):
+            f.write(f"  - match: {{tenant: tenant-{i}}}\n")
+            f.write(f"    rules:\n      - {{score: toxicity, max: {rng.uniform(0.5, 0.99):.2f}}}\n")
+
+
+def rate(n: int, elapsed: float) -> str:
+    return f"{n / elapsed:11.0f} eval/s ({elapsed / n * 1e9:6.0f} ns/eval)"
+
+
+def main(args):
+    rng = random.Random(0)
+    scores, contexts = workload(args.evaluations, args.tenants, rng)
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_tenant_policies(directory, args.tenants, rng)
+        start = time.perf_counter()
+        engine = PolicyEngine(policy_dir=directory)
+        build = time.perf_counter() - start
+    print(f"compiled {len(engine.policy.table)} contexts in {build * 1000:.1f} ms ({args.tenants} tenant overrides)")
+
+    start = time.perf_counter()
+    for s, c in zip(scores, contexts):
+        legacy_evaluate(s, c)
+    print(f"  legacy if-chain   | {rate(len(scores), time.perf_counter() - start)}")
+
+    evaluate = engine.evaluate
+    start = time.perf_counter()
+    for s, c in zip(scores, contexts):
+        evaluate(s, c)
+    print(f"  compiled evaluate | {rate(len(scores), time.perf_counter() - start)}")
+
+    columns = {name: np.array([s[name] for s in scores], dtype=np.float32) for name in scores[0]}
+    start = time.perf_counter()
+    engine.evaluate_many(columns, contexts)
+    print(f"  evaluate_many     | {rate(len(scores), time.perf_counter() - start)} (per-item contexts)")
+
+    start = time.perf_counter()
+    engine.evaluate_many(columns, contexts[0])
+    print(f"  evaluate_many     | {rate(len(scores), time.perf_counter() - start)} (one context)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--evaluations", type=int, default=500_000)
+    parser.add_argument("--tenants", type=int, default=100)
+    main(parser.parse_args())
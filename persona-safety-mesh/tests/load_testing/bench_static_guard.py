@@ -0,0 +1,108 @@
+"""
+StaticGuard throughput on large blocklists.
+
+    python tests/load_testing/bench_static_guard.py
+    python tests/load_testing/bench_static_guard.py --terms 1000 100000 500000 --messages 20000
+
+Compares the fused engine (one Aho-Corasick pass + one PII regex) with the
+previous pipeline (blocklist pass + one re.sub per PII type). The legacy
+blocklist pass uses FlashText when it is installed.
+"""
+import argparse
+import os
+import random
+import re
+import string
+import sys
+import time
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+
+from src.guards.static_guard import StaticGuard
+
+LEGACY_PII = {
+    "EMAIL": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+    "PHONE": re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+    "SSN":   re.compile(r'\b\d{3}-\d{2}-\d{4}\b'),
+}
+
+WORDS = "the dragon sleeps under the mountain while knights wait by the gate and talk about gold".split()
+
+
+def random_terms(n: int, rng: random.Random):
+    return {"".join(rng.choices(string.ascii_lowercase, k=rng.randint(6, 14))) for _ in range(n)}
+
+
+def messages(n: int, rng: random.Random):
+    out = []
+    for i in range(n):
+        words = rng.choices(WORDS, k=rng.randint(8, 60))
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), "mail me at someone@example.org or 555-123-4567")
+        out.append(" ".join(words))
+    return out
+
+
+def legacy_sanitize(keyword_processor, text: str):
+    if keyword_processor is not None and keyword_processor.extract_keywords(text):
+        return text
+    for pii_type, pattern in LEGACY_PII.items():
+        text = pattern.sub(f"<{pii_type}_REDACTED>", text)
+    return text
+
+
+def bench(fn, msgs):
+    start = time.perf_counter()
+    for text in msgs:
+        fn(text)
+    return time.perf_counter() - start
+
+
+def main(args):
+    rng = random.Random(0)
+    msgs = messages(args.messages, rng)
+    megabytes = sum(len(m) for m in msgs) / 1e6
+    try:
+        from flashtext import KeywordProcessor
+    except ImportError:
+        KeywordProcessor = None
+        print("flashtext not installed: legacy column is PII re.sub passes only")
+
+    for n in args.terms:
+        terms = random_terms(n, rng)
+        start = time.perf_counter()
+        guard = StaticGuard(terms=terms)
+        build = time.perf_counter() - start
+
+        keyword_processor = None
+        if KeywordProcessor is not None:
+            keyword_processor = KeywordProcessor()
+            keyword_processor.add_keywords_from_list(list(terms))
+
+        fused = bench(guard.sanitize, msgs)
+        legacy = bench(lambda t: legacy_sanitize(keyword_processor, t), msgs)
+        print(
+            f"{n:>8} terms | build {build:6.2f}s | fused {len(msgs) / fused:9.0f} msg/s "
+            f"({megabytes / fused:6.1f} MB/s, {fused / len(msgs) * 1e6:5.1f} us/msg) | "
+            f"legacy {len(msgs) / legacy:9.0f} msg/s"
+        )
+
+    # Streamed output: same engine, chunked like vLLM tokens
+    guard = StaticGuard(terms=random_terms(100_000, rng))
+    text = " ".join(msgs[:2000])
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+    start = time.perf_counter()
+    stream = guard.stream()
+    for chunk in chunks:
+        stream.feed(chunk)
+    stream.flush()
+    elapsed = time.perf_counter() - start
+    print(f"  stream | {len(chunks) / elapsed:9.0f} chunks/s ({len(text) / elapsed / 1e6:.1f} MB/s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terms", type=int, nargs="+", default=[1000, 100_000, 500_000])
+    parser.add_argument("--messages", type=int, default=20_000)
+    main(parser.parse_args())
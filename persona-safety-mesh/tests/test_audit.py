@@ -0,0 +1,124 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+import orjson
+import pytest
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.core.audit import AuditSink
+
+
+def read_entries(directory):
+    entries = []
+    for path in sorted(directory.glob("*.jsonl.gz")):
+        # Tolerates the open segment (flushed, no gzip trailer yet)
+        data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(path.read_bytes())
+        entries.extend(orjson.loads(line) for line in data.splitlines())
+    return entries
+
+
+async def log(sink: AuditSink, i: int) -> bool:
+    return await sink.log_event(f"user-{i}", f"input {i}", {"toxicity": 0.1}, "ALLOWED", 1.0)
+
+
+@pytest.mark.asyncio
+async def test_batches_by_size_and_drains_on_close(tmp_path):
+    sink = AuditSink(directory=tmp_path, batch_size=10, flush_interval_ms=10_000)
+
+    for i in range(25):
+        assert await log(sink, i)
+    await asyncio.sleep(0.05)
+    assert sink.stats()["written"] == 20  # Two full batches; the rest waits for batch-mates
+    await sink.aclose()
+
+    entries = read_entries(tmp_path)
+    assert [e["user_id"] for e in entries] == [f"user-{i}" for i in range(25)]
+    assert sink.stats()["batches"] == 3
+
+
+@pytest.mark.asyncio
+async def test_flushes_by_time_and_reports_lag(tmp_path):
+    sink = AuditSink(directory=tmp_path, batch_size=100, flush_interval_ms=20)
+
+    await log(sink, 0)
+    await asyncio.sleep(0.1)
+
+    assert len(read_entries(tmp_path)) == 1  # Readable before close (sync flush)
+    assert 15 <= sink.stats()["lag_ms"] < 100
+    await sink.aclose()
+
+
+@pytest.mark.asyncio
+async def test_rotates_compressed_segments(tmp_path):
+    sink = AuditSink(directory=tmp_path, batch_size=5, flush_interval_ms=1, segment_max_bytes=1000)
+
+    for i in range(100):
+        await log(sink, i)
+    await sink.aclose()
+
+    segments = list(tmp_path.glob("*.jsonl.gz"))
+    assert len(segments) == sink.stats()["segments"] > 5
+    assert all(f"-{os.getpid()}-" in p.name for p in segments)
+    assert len(read_entries(tmp_path)) == 100
+
+
+@pytest.mark.asyncio
+async def test_backpressure_policies(tmp_path):
+    def slow_write(data):
+        time.sleep(0.05)
+
+    dropping = AuditSink(directory=tmp_path / "drop", max_queue=5, batch_size=1, flush_interval_ms=1)
+    dropping._write = slow_write
+    results = [await log(dropping, i) for i in range(20)]
+    assert results.count(False) == dropping.stats()["dropped"] > 0
+    await dropping.aclose()
+
+    blocking = AuditSink(directory=tmp_path / "block", max_queue=5, batch_size=5, flush_interval_ms=1, backpressure="block")
+    blocking._write = slow_write
+    start = time.perf_counter()
+    assert all([await log(blocking, i) for i in range(20)])
+    assert time.perf_counter() - start >= 0.05  # Callers waited for the writer
+    await blocking.aclose()
+    assert blocking.stats()["dropped"] == 0 and blocking.stats()["written"] == 20
+
+
+@pytest.mark.asyncio
+async def test_input_digest_is_stable_and_keyed(tmp_path):
+    sink = AuditSink(directory=tmp_path, digest_key="k1", flush_interval_ms=1)
+    await log(sink, 7)
+    await sink.aclose()
+
+    expected = hmac.new(b"k1", b"input 7", hashlib.sha256).hexdigest()
+    [entry] = read_entries(tmp_path)
+    assert entry["input_digest"] == expected
+    assert "input 7" not in orjson.dumps(entry).decode()
+    assert AuditSink(directory=tmp_path, digest_key="k2").digest("input 7") != expected
+
+
+@pytest.mark.asyncio
+async def test_empty_digest_key_is_reported(tmp_path, caplog):
+    with caplog.at_level("WARNING", logger="safety_mesh"):
+        AuditSink(directory=tmp_path, digest_key="")
+    assert "AUDIT_DIGEST_KEY is empty" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_a_bad_batch(tmp_path):
+    sink = AuditSink(directory=tmp_path, digest_key="k", batch_size=1, flush_interval_ms=1)
+
+    # Non-string keys can't be serialized: that batch is lost, the writer keeps going
+    await sink.log_event("user-0", "input 0", {1: 0.5}, "ALLOWED", 1.0)
+    await sink.log_event("user-1", "input 1", {"toxicity": np.float32(0.25)}, "ALLOWED", 1.0)
+    await log(sink, 2)
+    await sink.aclose()
+
+    assert [e["user_id"] for e in read_entries(tmp_path)] == ["user-1", "user-2"]
+    assert sink.stats()["write_errors"] == 1
@@ -0,0 +1,119 @@
+import asyncio
+import sys
+import os
+import time
+
+import pytest
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.guards.output_monitor import OutputMonitor
+
+
+class SlowScanner:
+    """Classifier stand-in: flags any window containing `bad_word`, after `delay` seconds."""
+    def __init__(self, delay: float = 0.0, bad_word: str = "VILE"):
+        self.delay = delay
+        self.bad_word = bad_word
+        self.windows = []
+
+    async def scan(self, text: str) -> dict:
+        self.windows.append(text)
+        await asyncio.sleep(self.delay)
+        return {"toxicity": 0.99 if self.bad_word in text else 0.01}
+
+
+async def fake_vllm(tokens, interval: float = 0.0, state: dict = None):
+    try:
+        for token in tokens:
+            await asyncio.sleep(interval)
+            yield token
+    finally:
+        if state is not None:
+            state["closed"] = True
+
+
+def words(text: str):
+    return [w + " " for w in text.split(" ")]
+
+
+@pytest.mark.asyncio
+async def test_safe_stream_is_passed_through_completely():
+    text = "The dragon sleeps. The knight waits by the gate! Nobody moves tonight. " * 3
+    monitor = OutputMonitor(SlowScanner(), holdback_chars=16, min_window_chars=20)
+
+    out = [chunk async for chunk in monitor.stream(fake_vllm(words(text)))]
+
+    assert "".join(out) == "".join(words(text))
+    assert monitor.violation is None
+    assert monitor.windows_scored >= 3
+
+
+@pytest.mark.asyncio
+async def test_release_lags_by_about_one_window():
+    tokens = words("word " * 60)
+    # Scans keep up with generation: text flows steadily, one window behind
+    monitor = OutputMonitor(SlowScanner(delay=0.002), holdback_chars=10, min_window_chars=10, max_window_chars=20)
+    state = {}
+
+    gaps = []
+    last = time.perf_counter()
+    async for _ in monitor.stream(fake_vllm(tokens, interval=0.001, state=state)):
+        now = time.perf_counter()
+        gaps.append(now - last)
+        last = now
+
+    assert len(gaps) > 10
+    assert max(gaps) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_violation_withholds_text_and_cancels_upstream():
+    state = {}
+    tokens = words("Once upon a time. Then something VILE was said here. " + "more text " * 50)
+    scanner = SlowScanner(delay=0.001)
+    monitor = OutputMonitor(scanner, holdback_chars=48, min_window_chars=10)
+
+    out = "".join([chunk async for chunk in monitor.stream(fake_vllm(tokens, interval=0.005, state=state))])
+
+    assert monitor.violation is not None
+    assert "VILE" not in out
+    assert state.get("closed") is True
+    assert monitor.tokens_in < len(tokens)
+
+
+class FlagEverything:
+    async def scan(self, text: str) -> dict:
+        await asyncio.sleep(0.001)
+        return {"toxicity": 0.99}
+
+
+class BrokenScanner:
+    async def scan(self, text: str) -> dict:
+        raise RuntimeError("onnx session lost")
+
+
+@pytest.mark.asyncio
+async def test_unscored_text_is_never_released_with_default_windows():
+    # Upstream far faster than the classifier, default window/hold-back settings
+    tokens = words("A perfectly ordinary looking sentence that goes on and on " * 20)
+    monitor = OutputMonitor(FlagEverything())
+
+    out = "".join([chunk async for chunk in monitor.stream(fake_vllm(tokens))])
+
+    assert monitor.violation is not None
+    assert out == ""
+
+
+@pytest.mark.asyncio
+async def test_scanner_failure_fails_closed():
+    state = {}
+    tokens = words("Nothing wrong with this text at all. " * 20)
+    monitor = OutputMonitor(BrokenScanner())
+
+    out = "".join([chunk async for chunk in monitor.stream(fake_vllm(tokens, interval=0.001, state=state))])
+
+    assert out == ""
+    assert monitor.violation == {"error": "onnx session lost"}
+    assert state.get("closed") is True
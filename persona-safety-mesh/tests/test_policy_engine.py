@@ -0,0 +1,132 @@
+import asyncio
+import itertools
+import os
+import shutil
+import sys
+
+import numpy as np
+import pytest
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.policy.engine import PolicyEngine
+
+POLICY_DIR = os.path.join(os.path.dirname(__file__), '..', 'data', 'policies')
+
+
+def legacy_evaluate(risk_scores, context):
+    """The hard-coded chain standard.yaml replaces."""
+    if risk_scores.get("severe_toxicity", 0) > 0.9:
+        return False, "Content flagged as severely toxic."
+    if context.get("region", "US") in ["AE", "CN", "SA"]:
+        if risk_scores.get("sexual_explicit", 0) > 0.5:
+            return False, "Content restricted in your region."
+    threshold = 0.99 if context.get("tier", "free") == "enterprise" else 0.95
+    if risk_scores.get("toxicity", 0) > threshold:
+        return False, "Content flagged as toxic."
+    return True, "Safe"
+
+
+def grid():
+    values = [0.0, 0.5, 0.6, 0.9, 0.96, 1.0]
+    contexts = [
+        {"region": r, "tier": t, "tenant": "acme"}
+        for r, t in itertools.product(["US", "AE", "DE", None], ["free", "pro", "enterprise"])
+    ]
+    for severe, sexual, toxic in itertools.product(values, repeat=3):
+        scores = {"severe_toxicity": severe, "sexual_explicit": sexual, "toxicity": toxic}
+        for context in contexts:
+            yield scores, context
+
+
+def write(directory, name, text):
+    path = directory / name
+    path.write_text(text)
+    # Same-second rewrites must still look changed
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_standard_policy_matches_previous_rules():
+    engine = PolicyEngine(reload_interval=0)
+
+    for scores, context in grid():
+        assert engine.evaluate(scores, context) == legacy_evaluate(scores, context), (scores, context)
+    # Unmentioned regions/tiers/tenants share one entry
+    assert engine.policy.key({"region": "FR", "tier": "pro", "tenant": "x"}) == ("*", "*", "*")
+
+
+def test_tenant_overrides_from_extra_files(tmp_path):
+    shutil.copy(os.path.join(POLICY_DIR, "standard.yaml"), tmp_path)
+    # Sorts before standard.yaml: overrides still apply on top of every file's base rules
+    write(tmp_path, "acme.yaml", """
+overrides:
+  - match: {tenant: acme, tier: [free, pro]}
+    rules:
+      - {score: toxicity, max: 0.5, reason: "Acme house rules."}
+      - {score: insult, max: 0.7}
+""")
+    engine = PolicyEngine(policy_dir=tmp_path, reload_interval=0)
+
+    scores = {"toxicity": 0.6}
+    assert engine.evaluate(scores, {"tenant": "acme"}) == (False, "Acme house rules.")
+    assert engine.evaluate(scores, {"tenant": "acme", "tier": "enterprise"}) == (True, "Safe")
+    assert engine.evaluate(scores, {"tenant": "other"}) == (True, "Safe")
+    assert engine.evaluate({"insult": 0.8}, {"tenant": "acme", "tier": "pro"}) == (False, "Content flagged as insult.")
+    # Replaced in place: severe toxicity is still checked first
+    assert engine.evaluate({"toxicity": 1.0, "severe_toxicity": 1.0}, {"tenant": "acme"})[1] == "Content flagged as severely toxic."
+
+
+def test_hot_reload_swaps_policy_and_survives_bad_files(tmp_path):
+    write(tmp_path, "standard.yaml", "rules:\n  - {score: toxicity, max: 0.9}\n")
+    engine = PolicyEngine(policy_dir=tmp_path, reload_interval=0.01)
+    assert engine.evaluate({"toxicity": 0.8}, {})[0]
+
+    write(tmp_path, "standard.yaml", "rules:\n  - {score: toxicity, max: 0.5}\n")
+    assert engine.reload()
+    assert not engine.evaluate({"toxicity": 0.8}, {})[0]
+    assert not engine.reload() # Unchanged files are not recompiled
+
+    write(tmp_path, "standard.yaml", "rules:\n  - {score: toxicity}\n")
+    assert not engine.reload()
+    assert engine.stats()["reload_errors"] == 1
+    assert not engine.evaluate({"toxicity": 0.8}, {})[0] # Previous policy still active
+
+
+@pytest.mark.asyncio
+async def test_reloads_run_in_the_background_not_in_evaluate(tmp_path):
+    write(tmp_path, "standard.yaml", "rules:\n  - {score: toxicity, max: 0.5}\n")
+    engine = PolicyEngine(policy_dir=tmp_path, reload_interval=0.01)
+    write(tmp_path, "standard.yaml", "rules:\n  - {score: toxicity, max: 0.95}\n")
+
+    # Without the watcher, evaluate is a pure lookup however long the interval has passed
+    await asyncio.sleep(0.05)
+    assert not engine.evaluate({"toxicity": 0.8}, {})[0]
+    assert engine.stats()["reloads"] == 0
+
+    engine.start()
+    for _ in range(100):
+        if engine.stats()["reloads"]:
+            break
+        await asyncio.sleep(0.01)
+    assert engine.evaluate({"toxicity": 0.8}, {})[0]
+    await engine.aclose()
+    assert engine._watcher is None
+
+
+def test_evaluate_many_matches_evaluate():
+    engine = PolicyEngine(reload_interval=0)
+    cases = list(grid())
+    names = ["severe_toxicity", "sexual_explicit", "toxicity"]
+    columns = {name: np.array([scores[name] for scores, _ in cases], dtype=np.float32) for name in names}
+
+    allowed, reasons = engine.evaluate_many(columns, [context for _, context in cases])
+    expected = [engine.evaluate(scores, context) for scores, context in cases]
+    assert allowed.tolist() == [a for a, _ in expected]
+    assert reasons.tolist() == [r for _, r in expected]
+
+    # One context for the whole batch
+    allowed, reasons = engine.evaluate_many({"toxicity": np.array([0.1, 0.97, 0.999])}, {"tier": "enterprise"})
+    assert allowed.tolist() == [True, True, False]
+    assert reasons[2] == "Content flagged as toxic."
@@ -0,0 +1,87 @@
+import os
+import re
+import sys
+
+# Add src to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from src.guards.static_guard import StaticGuard
+
+
+def test_loads_blocklist_files(tmp_path):
+    (tmp_path / "slurs.txt").write_text("# comment\nSlur_A\n\nslur_b  # trailing comment\n")
+    (tmp_path / "selfharm.txt").write_text("kill_yourself\n")
+    guard = StaticGuard(blocklist_dir=tmp_path)
+
+    assert guard.terms == 3
+    spans = guard.scan("you SLUR_A, kill_yourself")
+    assert [(s.kind, s.category, s.value) for s in spans] == [
+        ("KEYWORD", "slurs", "SLUR_A"), ("KEYWORD", "selfharm", "kill_yourself")
+    ]
+    assert [(s.start, s.end) for s in spans] == [(4, 10), (12, 25)]
+
+
+def test_keywords_match_whole_words_leftmost_longest():
+    guard = StaticGuard(terms=["kill", "kill_yourself", "ass"])
+
+    assert guard.scan("a classic passage") == []
+    [span] = guard.scan("just kill_yourself.")
+    assert span.value == "kill_yourself"
+    text, blocked, reason = guard.sanitize("Kill the dragon")
+    assert blocked and reason == "Blocked keywords found: ['Kill']"
+
+
+def test_pii_is_typed_and_redacted_in_one_pass():
+    guard = StaticGuard(terms=["badword1"])
+    text = "Mail bob@example.com or call 555-123-4567, SSN 123-45-6789."
+
+    assert [(s.kind, s.value) for s in guard.scan(text)] == [
+        ("EMAIL", "bob@example.com"), ("PHONE", "555-123-4567"), ("SSN", "123-45-6789")
+    ]
+    sanitized, blocked, _ = guard.sanitize(text)
+    assert not blocked
+    assert sanitized == "Mail <EMAIL_REDACTED> or call <PHONE_REDACTED>, SSN <SSN_REDACTED>."
+
+
+def test_matches_the_sequential_implementation():
+    guard = StaticGuard(terms=["badword1"])
+    legacy = {
+        "EMAIL": re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'),
+        "PHONE": re.compile(r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b'),
+        "SSN":   re.compile(r'\b\d{3}-\d{2}-\d{4}\b'),
+    }
+    samples = [
+        "nothing to see", "a.b@c.io and x_y@z.org", "555.123.4567 / 5551234567 / 555-12-3456",
+        "ids 123-45-6789 and 1234567890123", "edge@host.c0m 555-1234",
+    ]
+    for text in samples:
+        expected = text
+        for pii_type, pattern in legacy.items():
+            expected = pattern.sub(f"<{pii_type}_REDACTED>", expected)
+        assert guard.sanitize(text)[0] == expected
+
+
+def test_stream_mode_matches_whole_text_scan():
+    guard = StaticGuard(terms=["slur_a", "kill_yourself"])
+    text = ("Contact me at someone@example.org or 555-123-4567 tomorrow. " * 3) + "Then kill_yourself now."
+
+    for size in (1, 3, 7, 50):
+        stream = guard.stream(holdback_chars=24)
+        out = []
+        for i in range(0, len(text), size):
+            out.append(stream.feed(text[i:i + size]))
+        out.append(stream.flush())
+
+        assert "".join(out) == guard.redact(text, guard.scan(text))
+        assert [(s.kind, s.start, s.end) for s in stream.spans] == [(s.kind, s.start, s.end) for s in guard.scan(text)]
+        assert stream.blocked
+
+
+def test_stream_holds_back_partial_matches():
+    guard = StaticGuard(terms=["kill_yourself"])
+    stream = guard.stream(holdback_chars=0)  # Raised to the longest term
+
+    released = stream.feed("ok then kill_your")
+    assert "kill" not in released and not stream.blocked
+    stream.feed("self and more text to push it out")
+    assert stream.blocked